@@ -18,3 +18,4 @@ from django.contrib import admin
 from xgds_timeseries.models import *
 
 admin.site.register(TimeSeriesExample)
+admin.site.register(TimeSeriesDynamicExample)
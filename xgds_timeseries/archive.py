@@ -0,0 +1,343 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+Columnar archives of the samples of completed flights.
+
+./manage.py archive_timeseries writes the samples of one model and flight to a directory under
+XGDS_TIMESERIES_ARCHIVE_DIR, one .npy file per column: pk, time (int64 microseconds since the epoch, sorted) and
+each channel, plus meta.json.  The TimeSeriesModelManager reads archived flights from these files, memory mapped,
+instead of the database: a time range is found with a binary search on the time column and the channel columns are
+sliced in place.  Saving or deleting a sample of an archived flight, or importing into it, deletes its archive, so
+the flight is read from the database until it is archived again.
+"""
+
+import datetime
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+ARCHIVE_META = 'meta.json'
+ARCHIVE_VERSION = 1
+ARCHIVE_PK = 'pk'
+ARCHIVE_TIME = 'time'
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def get_archive_path(model_name, flight_id):
+    """
+    :return: the directory of the archive of a model and flight, or None if archives are off
+    """
+    if not settings.XGDS_TIMESERIES_ARCHIVE_DIR:
+        return None
+    return os.path.join(settings.XGDS_TIMESERIES_ARCHIVE_DIR, model_name, str(flight_id))
+
+
+def get_epoch_microsecond(the_time):
+    """
+    :param the_time: a timezone aware datetime
+    :return: the integer microseconds since the epoch
+    """
+    delta = the_time - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def get_datetimes(microseconds):
+    """
+    :param microseconds: a numpy int64 array of microseconds since the epoch
+    :return: a list of timezone aware datetimes
+    """
+    return [t.replace(tzinfo=timezone.utc) for t in microseconds.astype('datetime64[us]').astype(object)]
+
+
+def to_python(column):
+    """
+    :param column: a numpy array
+    :return: a list of python values, with None in place of NaN
+    """
+    if column.dtype.kind == 'f':
+        result = column.astype(object)
+        result[np.isnan(column)] = None
+        return result.tolist()
+    return column.tolist()
+
+
+def get_downsample_mask(microseconds, downsample):
+    """
+    Keep the samples in the same seconds as xgds_core.util.downsample_queryset does: those whose second is a
+    multiple of downsample, or for downsample >= 60, those in the first second of every downsample / 60 minutes.
+    :param microseconds: a numpy int64 array of microseconds since the epoch
+    :param downsample: number of seconds to skip between data samples
+    :return: a numpy boolean array
+    """
+    seconds = microseconds // 1000000
+    if downsample < 60:
+        return seconds % 60 % downsample == 0
+    return (seconds % 60 == 0) & ((seconds // 60) % 60 % (downsample // 60) == 0)
+
+
+def get_column_dtype(field, column, dtype=None):
+    """
+    :param field: the model field of a channel
+    :param column: the list of values read from the database
+    :param dtype: the dtype of the channel, see TimeSeriesModel.get_channel_dtypes
+    :return: the numpy dtype to store the channel as: float32 for float32 channels, int64 for integers without
+             nulls, otherwise float64
+    """
+    if dtype == 'float32':
+        return np.float32
+    if field.get_internal_type() in ('FloatField', 'DecimalField') or hasattr(field, 'scale') or None in column:
+        return np.float64
+    return np.int64
+
+
+def write_flight_archive(model, flight_id):
+    """
+    Write the samples of one flight to a new archive, replacing any old one.  The files are written to a temporary
+    directory which is renamed into place, so readers never see a partial archive.
+    :param model: a TimeSeriesModel subclass which is not dynamic and whose channels are all numeric
+    :param flight_id: the id of the flight
+    :return: the number of samples archived
+    """
+    if model.dynamic:
+        raise ValueError('%s is dynamic and cannot be archived' % model.get_model_name())
+    channel_names = model.get_channel_names()
+    if len(model.objects.get_statistics_field_names(channel_names)) != len(channel_names):
+        raise ValueError('Only models with numeric channels can be archived')
+    path = get_archive_path(model.get_model_name(), flight_id)
+    if path is None:
+        raise ValueError('Set XGDS_TIMESERIES_ARCHIVE_DIR to archive flights')
+
+    time_field_name = model.get_time_field_name()
+    fields = ['pk', time_field_name] + list(channel_names)
+    rows = model.objects.filter(flight_id=flight_id).order_by(time_field_name, 'pk').values_list(*fields)
+    columns = [[] for f in fields]
+    for row in rows.iterator():
+        for column, value in zip(columns, row):
+            column.append(value)
+    if not columns[0]:
+        raise ValueError('%s has no samples for flight %s' % (model.get_model_name(), flight_id))
+
+    temporary_path = '%s.tmp' % path
+    if os.path.exists(temporary_path):
+        shutil.rmtree(temporary_path)
+    os.makedirs(temporary_path)
+    np.save(os.path.join(temporary_path, '%s.npy' % ARCHIVE_PK), np.array(columns[0], dtype=np.int64))
+    np.save(os.path.join(temporary_path, '%s.npy' % ARCHIVE_TIME),
+            np.array([get_epoch_microsecond(t) for t in columns[1]], dtype=np.int64))
+    channel_dtypes = model.get_channel_dtypes()
+    dtypes = {}
+    for name, column in zip(channel_names, columns[2:]):
+        dtype = get_column_dtype(model._meta.get_field(name), column, channel_dtypes.get(name))
+        data = np.array([np.nan if v is None else v for v in column], dtype=dtype)
+        np.save(os.path.join(temporary_path, '%s.npy' % name), data)
+        dtypes[name] = np.dtype(dtype).name
+    meta = {'version': ARCHIVE_VERSION,
+            'model_name': model.get_model_name(),
+            'flight_id': flight_id,
+            'time_field_name': time_field_name,
+            'row_count': len(columns[0]),
+            'channels': dtypes,
+            'archived': timezone.now().isoformat()}
+    with open(os.path.join(temporary_path, ARCHIVE_META), 'w') as meta_file:
+        json.dump(meta, meta_file)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(temporary_path, path)
+    forget_archive(path)
+    return len(columns[0])
+
+
+def delete_flight_archive(model, flight_id):
+    """
+    Delete the archive of a flight, so it is read from the database again
+    :return: True if there was an archive
+    """
+    path = get_archive_path(model.get_model_name(), flight_id)
+    if path is None or not os.path.exists(path):
+        return False
+    forget_archive(path)
+    shutil.rmtree(path)
+    return True
+
+
+class FlightArchive(object):
+    """
+    The memory mapped columns of the archive of one model and flight
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, ARCHIVE_META)) as meta_file:
+            self.meta = json.load(meta_file)
+        self.path = path
+        self.columns = {}
+        self.times = self.get_column(ARCHIVE_TIME)
+
+    def get_column(self, name):
+        """
+        :param name: pk, time or the name of a channel
+        :return: the memory mapped numpy array of the column
+        """
+        column = self.columns.get(name)
+        if column is None:
+            if name not in (ARCHIVE_PK, ARCHIVE_TIME) and name not in self.meta['channels']:
+                raise KeyError('%s is not archived' % name)
+            column = np.load(os.path.join(self.path, '%s.npy' % name), mmap_mode='r')
+            self.columns[name] = column
+        return column
+
+    def get_range(self, start_time=None, end_time=None):
+        """
+        :param start_time: The start time, timezone aware, inclusive
+        :param end_time: The end time, timezone aware, inclusive
+        :return: the slice of the samples in the time range, found by binary search
+        """
+        start = 0
+        end = len(self.times)
+        if start_time is not None:
+            start = int(np.searchsorted(self.times, get_epoch_microsecond(start_time), side='left'))
+        if end_time is not None:
+            end = int(np.searchsorted(self.times, get_epoch_microsecond(end_time), side='right'))
+        return slice(start, max(start, end))
+
+
+ARCHIVES = {}
+ARCHIVES_LOCK = threading.Lock()
+
+
+def forget_archive(path):
+    with ARCHIVES_LOCK:
+        ARCHIVES.pop(path, None)
+
+
+def get_flight_archive(model_name, flight_id):
+    """
+    :return: the FlightArchive of a model and flight, or None if the flight is not archived
+    """
+    path = get_archive_path(model_name, flight_id)
+    if path is None:
+        return None
+    try:
+        modified = os.stat(os.path.join(path, ARCHIVE_META)).st_mtime
+    except OSError:
+        return None
+    with ARCHIVES_LOCK:
+        entry = ARCHIVES.get(path)
+        if entry is None or entry[0] != modified:
+            entry = (modified, FlightArchive(path))
+            ARCHIVES[path] = entry
+        return entry[1]
+
+
+class ArchiveValues(object):
+    """
+    The values of archived flights in a time range, which iterate as the dictionaries get_values returns.
+    The binary format reads the columns with get_columns, which are slices of the memory mapped files when
+    there is only one flight and no downsampling.
+    """
+
+    def __init__(self, archives, time_field_name, channel_names, start_time=None, end_time=None, downsample=0):
+        self.time_field_name = time_field_name
+        self.channel_names = list(channel_names)
+        parts = []
+        for archive in archives:
+            selection = archive.get_range(start_time, end_time)
+            if downsample:
+                times = archive.times[selection]
+                selection = np.arange(selection.start, selection.stop)[get_downsample_mask(times, downsample)]
+            parts.append((archive, selection))
+        self.parts = parts
+        self.order = None
+        if len(parts) > 1:
+            # flights may overlap in time; order the concatenated samples by time
+            self.order = np.argsort(self.get_column(ARCHIVE_TIME), kind='mergesort')
+
+    def get_column(self, name):
+        """
+        :param name: pk, time or the name of a channel
+        :return: a numpy array of the column for the selected samples
+        """
+        if len(self.parts) == 1:
+            archive, selection = self.parts[0]
+            return archive.get_column(name)[selection]
+        column = np.concatenate([archive.get_column(name)[selection] for archive, selection in self.parts])
+        if self.order is not None:
+            column = column[self.order]
+        return column
+
+    def get_columns(self, dtype='float64', channel_dtypes=None):
+        """
+        :param dtype: float32 or float64, the type of the channel columns, or None to use channel_dtypes
+        :param channel_dtypes: a dictionary of channel name to dtype; float32 channels are float32, others float64
+        :return: a list of (name, numpy array) tuples like views.get_value_columns
+        """
+        channel_dtypes = channel_dtypes or {}
+        columns = [('pk', self.get_column(ARCHIVE_PK)),
+                   (self.time_field_name, self.get_column(ARCHIVE_TIME) // 1000)]
+        for name in self.channel_names:
+            column_dtype = dtype or ('float32' if channel_dtypes.get(name) == 'float32' else 'float64')
+            columns.append((name, self.get_column(name).astype(column_dtype, copy=False)))
+        return columns
+
+    def __len__(self):
+        if not self.parts:
+            return 0
+        return len(self.get_column(ARCHIVE_TIME))
+
+    def __iter__(self):
+        chunk_size = settings.XGDS_TIMESERIES_STREAM_CHUNK_SIZE
+        pks = self.get_column(ARCHIVE_PK)
+        times = self.get_column(ARCHIVE_TIME)
+        channels = [(name, self.get_column(name)) for name in self.channel_names]
+        for start in range(0, len(times), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            keys = ['pk', self.time_field_name]
+            columns = [pks[chunk].tolist(), get_datetimes(times[chunk])]
+            for name, column in channels:
+                keys.append(name)
+                columns.append(to_python(column[chunk]))
+            for row in zip(*columns):
+                yield dict(zip(keys, row))
+
+    def get_min_max(self):
+        """
+        :return: the same dictionary as TimeSeriesModelManager.get_min_max, or None if there are no samples
+        """
+        pks = self.get_column(ARCHIVE_PK)
+        if not len(pks):
+            return None
+        times = self.get_column(ARCHIVE_TIME)
+        result = {'pk': {'min': int(pks.min()), 'max': int(pks.max())},
+                  self.time_field_name: {'min': get_datetimes(times[:1])[0], 'max': get_datetimes(times[-1:])[0]}}
+        for name in self.channel_names:
+            column = self.get_column(name).astype(np.float64, copy=False)
+            present = column[~np.isnan(column)]
+            if not len(present):
+                result[name] = {'min': None, 'max': None, 'count': 0, 'mean': None, 'stddev': None}
+                continue
+            convert = int if self.get_column(name).dtype.kind == 'i' else float
+            result[name] = {'min': convert(present.min()),
+                            'max': convert(present.max()),
+                            'count': len(present),
+                            'mean': float(present.mean()),
+                            'stddev': float(present.std())}
+        return result
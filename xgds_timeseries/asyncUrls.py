@@ -0,0 +1,45 @@
+#__BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#__END_LICENSE__
+
+# The async endpoints, for ASGI servers with Django 4.2 or later, ie re_path(r'^async/', include('xgds_timeseries.asyncUrls'))
+# Python 3 only: include it only where the async views can be imported.
+
+from django.urls import re_path
+
+from django.conf import settings
+
+import xgds_timeseries.async_views as views
+
+urlpatterns = [re_path(r'^classes/metadata/json$', views.get_time_series_classes_metadata_json, {'skip_example': True},
+                       'timeseries_async_classes_metadata_json'),
+               re_path(r'^min_max/json$', views.get_min_max_json, {}, 'timeseries_async_min_max_json'),
+               re_path(r'^values/json$', views.get_values_json, {'packed': False}, 'timeseries_async_values_json'),
+               re_path(r'^values/list/json$', views.get_values_json, {}, 'timeseries_async_values_list_json'),
+               re_path(r'^values/stream/json$', views.get_values_json, {'packed': False, 'stream': True}, 'timeseries_async_values_stream_json'),
+               re_path(r'^values/list/stream/json$', views.get_values_json, {'stream': True}, 'timeseries_async_values_list_stream_json'),
+               re_path(r'^values/flight/json$', views.get_flight_values_json, {'packed': False}, 'timeseries_async_flight_values_json'),
+               re_path(r'^values/flight/list/json$', views.get_flight_values_json, {}, 'timeseries_async_flight_values_list_json'),
+               re_path(r'^values/flight/stream/json$', views.get_flight_values_json, {'packed': False, 'stream': True}, 'timeseries_async_flight_values_stream_json'),
+               re_path(r'^values/flight/list/stream/json$', views.get_flight_values_json, {'stream': True}, 'timeseries_async_flight_values_list_stream_json'),
+               re_path(r'^values/flight/time/json$', views.get_flight_values_time_json, {'packed': False}, 'timeseries_async_flight_time_values_json'),
+               re_path(r'^values/flight/time/list/json$', views.get_flight_values_time_json, {}, 'timeseries_async_flight_values_time_list_json'),
+               re_path(r'^values/flight/time/downsample/json$', views.get_flight_values_time_json, {'packed': False, 'downsample': settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS}, 'timeseries_async_flight_time_values_downsample_json'),
+               re_path(r'^values/flight/times/json$', views.get_flight_values_times_json, {'packed': False}, 'timeseries_async_flight_times_values_json'),
+               re_path(r'^values/flight/times/list/json$', views.get_flight_values_times_json, {}, 'timeseries_async_flight_times_values_list_json'),
+               re_path(r'^values/models/time/json$', views.get_models_values_time_json, {'packed': False}, 'timeseries_async_models_time_values_json'),
+               re_path(r'^values/models/time/list/json$', views.get_models_values_time_json, {}, 'timeseries_async_models_time_values_list_json'),
+               re_path(r'^channel_descriptions/json$', views.get_channel_descriptions_json, {}, 'timeseries_async_channel_descriptions_json'),
+               ]
@@ -0,0 +1,234 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+Async variants of the value, at time, min/max and metadata endpoints, for ASGI servers with Django 4.2 or later,
+the first to stream the async content these views return.  Include xgds_timeseries.asyncUrls to serve them.  This module uses Python 3 syntax and is only imported by
+xgds_timeseries.asyncUrls, so the rest of the package stays Python 2 compatible; its tests are in tests_async.py.
+
+Each request runs the synchronous view in a bounded pool of XGDS_TIMESERIES_ASYNC_WORKERS threads, so a slow whole
+flight query holds one worker while the event loop keeps handing the cheap scrub requests to the others.
+Django's database connections belong to their thread, so a streaming response is read in the worker which ran its
+view, and passed to the event loop a chunk at a time.
+
+When the client disconnects and the server cancels the view (Django 5.0 and later), or stops reading a stream, the
+running query is cancelled on PostgreSQL and SQLite and the stream stops reading.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import threading
+
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connections
+from django.http import StreamingHttpResponse
+
+from xgds_timeseries import views
+
+if django.VERSION < (4, 2):
+    raise ImproperlyConfigured('xgds_timeseries.async_views needs Django 4.2 or later')
+
+EXECUTOR = None
+EXECUTOR_LOCK = threading.Lock()
+STREAM_END = object()
+# seconds a worker waits for room in a stream's buffer before it checks whether the stream was cancelled
+STREAM_WAIT = 1.0
+
+
+def get_executor():
+    """
+    :return: the thread pool which runs the views, created on first use
+    """
+    global EXECUTOR
+    with EXECUTOR_LOCK:
+        if EXECUTOR is None:
+            EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=settings.XGDS_TIMESERIES_ASYNC_WORKERS,
+                                                             thread_name_prefix='xgds_timeseries_async')
+        return EXECUTOR
+
+
+def cancel_query(connection):
+    """
+    Cancel the query a database connection of another thread is running, if the backend allows it
+    :param connection: the Django connection of the worker thread
+    :return: True if the query was cancelled
+    """
+    raw = connection.connection
+    if raw is None:
+        return False
+    if connection.vendor == 'postgresql':
+        # psycopg sends the cancel request on its own socket, so this is safe from another thread
+        raw.cancel()
+        return True
+    if connection.vendor == 'sqlite':
+        raw.interrupt()
+        return True
+    return False
+
+
+def resolve(future, result=None, exception=None):
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class ViewCall(object):
+    """
+    One call of a synchronous view in a worker thread, which the event loop can cancel
+    """
+
+    def __init__(self, view, request, args, kwargs):
+        self.view = view
+        self.request = request
+        self.args = args
+        self.kwargs = kwargs
+        self.connections = []
+        self.cancelled = False
+        self.finished = False
+        # held while cancelling, so a query of the worker's next request is never cancelled
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        """
+        Stop the call and cancel its running query, from the event loop
+        """
+        with self.lock:
+            if self.cancelled or self.finished:
+                return
+            self.cancelled = True
+            for connection in self.connections:
+                cancel_query(connection)
+
+    def finish(self):
+        with self.lock:
+            self.finished = True
+        close_old_connections()
+
+    def put(self, loop, queue, item):
+        """
+        Add an item to the stream's buffer, waiting for room
+        :return: False if the stream was cancelled
+        """
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=STREAM_WAIT)
+                return True
+            except concurrent.futures.TimeoutError:
+                if self.cancelled:
+                    future.cancel()
+                    return False
+
+    def run(self, loop, response_future, queue):
+        """
+        In the worker thread, call the view and hand its response to the event loop, then read a streaming response
+        into the queue
+        """
+        close_old_connections()
+        with self.lock:
+            self.connections = connections.all()
+        try:
+            response = self.view(self.request, *self.args, **self.kwargs)
+        except BaseException as e:
+            self.finish()
+            loop.call_soon_threadsafe(resolve, response_future, None, e)
+            return
+        if not getattr(response, 'streaming', False):
+            self.finish()
+            loop.call_soon_threadsafe(resolve, response_future, response)
+            return
+
+        loop.call_soon_threadsafe(resolve, response_future, response)
+        end = STREAM_END
+        try:
+            for chunk in response.streaming_content:
+                if self.cancelled or not self.put(loop, queue, chunk):
+                    break
+        except Exception as e:
+            end = e
+        finally:
+            # the event loop serves a copy of the response, so this closes the content, and with it the server
+            # side cursor of a stream which stopped early
+            response.close()
+            self.finish()
+        if not self.cancelled:
+            self.put(loop, queue, end)
+
+
+async def stream_chunks(call, queue):
+    """
+    The async streaming content of a response read by a worker
+    """
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is STREAM_END:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # the client went away before the end of the stream
+        call.cancel()
+
+
+async def call_view(view, request, *args, **kwargs):
+    """
+    Run a synchronous view in a worker thread
+    :return: the response; a streaming response is copied with async streaming content
+    """
+    loop = asyncio.get_event_loop()
+    call = ViewCall(view, request, args, kwargs)
+    response_future = loop.create_future()
+    queue = asyncio.Queue(maxsize=settings.XGDS_TIMESERIES_ASYNC_STREAM_BUFFER)
+    loop.run_in_executor(get_executor(), call.run, loop, response_future, queue)
+    try:
+        response = await response_future
+    except asyncio.CancelledError:
+        call.cancel()
+        raise
+    if not getattr(response, 'streaming', False):
+        return response
+    result = StreamingHttpResponse(stream_chunks(call, queue), status=response.status_code)
+    for header, value in response.items():
+        result[header] = value
+    return result
+
+
+def make_async_view(view):
+    """
+    :param view: a synchronous view
+    :return: an async view which runs it with call_view
+    """
+    async def async_view(request, *args, **kwargs):
+        return await call_view(view, request, *args, **kwargs)
+    return functools.wraps(view)(async_view)
+
+
+get_time_series_classes_metadata_json = make_async_view(views.get_time_series_classes_metadata_json)
+get_channel_descriptions_json = make_async_view(views.get_channel_descriptions_json)
+get_min_max_json = make_async_view(views.get_min_max_json)
+get_values_json = make_async_view(views.get_values_json)
+get_flight_values_json = make_async_view(views.get_flight_values_json)
+get_flight_values_time_json = make_async_view(views.get_flight_values_time_json)
+get_flight_values_times_json = make_async_view(views.get_flight_values_times_json)
+get_models_values_time_json = make_async_view(views.get_models_values_time_json)
@@ -0,0 +1,292 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+A benchmark suite for the query and serialization paths, run with ./manage.py benchmark_timeseries.
+
+Synthetic flights are cloned from an existing flight and filled with generated samples of the example models,
+far away in time from any real data.  Each case is timed several times and the report is a json serializable
+dictionary, so runs on different backends or versions can be compared.
+"""
+
+import datetime
+import platform
+import random
+import time
+import uuid
+from collections import OrderedDict
+
+import django
+import numpy as np
+from django.db import connections, router
+from django.utils import timezone
+
+from geocamUtil.datetimeJsonEncoder import DatetimeJsonEncoder
+
+from xgds_timeseries.encoding import encode_values
+from xgds_timeseries.importer import TimeSeriesImporter
+from xgds_timeseries.models import TimeSeriesExample, TimeSeriesDynamicExample, rebuild_flight_summary
+from xgds_timeseries.util import encode_columns
+from xgds_timeseries.views import get_packed_list, get_value_columns, iterate_values, stream_json_list
+
+# synthetic rows are written here, well away from any real data
+BENCHMARK_START = datetime.datetime(2000, 1, 1, tzinfo=timezone.utc)
+BENCHMARK_FLIGHT_PREFIX = 'benchmark_timeseries_'
+BENCHMARK_VARIANTS = ('plain', 'stateful', 'dynamic')
+# the number of random times looked up by the at time cases
+BENCHMARK_LOOKUPS = 100
+
+
+def get_variant_model(variant):
+    """
+    :param variant: plain (1 Hz samples), stateful (samples at irregular intervals) or dynamic (a row per channel)
+    :return: the example model the variant writes
+    """
+    if variant not in BENCHMARK_VARIANTS:
+        raise ValueError('Unknown variant %s' % variant)
+    if variant == 'dynamic':
+        return TimeSeriesDynamicExample
+    return TimeSeriesExample
+
+
+def create_flights(count, duration):
+    """
+    Clone the first flight count times, so the synthetic samples have flights of their own
+    :param count: the number of flights
+    :param duration: the seconds from the first to the last sample of a flight, see get_flight_duration
+    :return: the list of new flight ids
+    """
+    flight_model = TimeSeriesExample._meta.get_field('flight').related_model
+    template = flight_model.objects.order_by('pk').first()
+    if template is None:
+        raise ValueError('The benchmark copies an existing flight; load timeseries_test_fixture.json first')
+    result = []
+    for index in range(count):
+        flight = flight_model.objects.get(pk=template.pk)
+        flight.pk = None
+        flight.id = None
+        flight.name = '%s%d' % (BENCHMARK_FLIGHT_PREFIX, index)
+        if hasattr(flight, 'uuid'):
+            flight.uuid = str(uuid.uuid4())
+        flight.start_time = get_flight_start(index, duration)
+        flight.end_time = flight.start_time + datetime.timedelta(seconds=duration)
+        flight.save()
+        result.append(flight.pk)
+    return result
+
+
+def delete_flights():
+    """
+    Delete the synthetic flights and their samples
+    """
+    flight_model = TimeSeriesExample._meta.get_field('flight').related_model
+    flights = flight_model.objects.filter(name__startswith=BENCHMARK_FLIGHT_PREFIX)
+    flight_ids = list(flights.values_list('pk', flat=True))
+    for model in (TimeSeriesExample, TimeSeriesDynamicExample):
+        model.objects.filter(flight_id__in=flight_ids).delete()
+    flights.delete()
+
+
+def get_flight_start(index, duration):
+    """
+    :return: the time of the first sample of the index'th synthetic flight; flights are a day apart
+    """
+    return BENCHMARK_START + datetime.timedelta(seconds=index * (duration + 86400))
+
+
+def get_sample_offsets(variant, rows):
+    """
+    :return: the seconds from the start of the flight of each sample; stateful samples are 1 to 60 seconds apart
+    """
+    if variant == 'stateful':
+        return np.cumsum(np.random.RandomState(rows).randint(1, 61, rows)) - 1
+    return np.arange(rows)
+
+
+def get_flight_duration(variant, rows):
+    """
+    :return: the seconds from the first to the last sample of a synthetic flight
+    """
+    return int(get_sample_offsets(variant, rows)[-1])
+
+
+def generate_samples(variant, flight_ids, rows_per_flight, use_copy=False, batch_size=None, log=None):
+    """
+    Insert the synthetic samples with the importer, so the flight summaries are maintained as for real imports
+    :param variant: plain, stateful or dynamic
+    :param flight_ids: the flights to fill
+    :param rows_per_flight: the number of samples per flight; dynamic flights have two rows per sample
+    :param use_copy: True to insert with COPY on PostgreSQL
+    :param batch_size: rows inserted at once, defaults to XGDS_TIMESERIES_IMPORT_BATCH_SIZE
+    :param log: optional function called with progress messages
+    """
+    model = get_variant_model(variant)
+    offsets = get_sample_offsets(variant, rows_per_flight)
+    duration = int(offsets[-1])
+    time_field_name = model.get_time_field_name()
+    fields = OrderedDict([(time_field_name, {})] + [(name, {}) for name in model.get_channel_names()])
+    for index, flight_id in enumerate(flight_ids):
+        importer = TimeSeriesImporter({'class': model.get_model_name(), 'fields': fields}, flight_id=flight_id,
+                                      batch_size=batch_size, broadcast=False, use_copy=use_copy)
+        start = get_flight_start(index, duration)
+        complete = True
+        batch = []
+        for i, offset in enumerate(offsets):
+            timestamp = start + datetime.timedelta(seconds=int(offset))
+            if variant == 'dynamic':
+                batch.append(model(timestamp=timestamp, flight_id=flight_id, channel_name='temperature',
+                                   value=20 + (i % 100) / 10.0))
+                batch.append(model(timestamp=timestamp, flight_id=flight_id, channel_name='pressure',
+                                   value=1000 + (i % 50) / 100.0))
+            else:
+                batch.append(model(timestamp=timestamp, flight_id=flight_id, temperature=20 + (i % 100) / 10.0,
+                                   pressure=1000 + (i % 50) / 100.0, humidity=float(i % 100)))
+            if len(batch) >= importer.batch_size:
+                complete = importer.insert_instances(batch) and complete
+                batch = []
+        if batch:
+            complete = importer.insert_instances(batch) and complete
+        if not complete:
+            rebuild_flight_summary(model, flight_id)
+        if log:
+            log('Generated flight %d of %d' % (index + 1, len(flight_ids)))
+
+
+class BenchmarkSuite(object):
+    """
+    Times the manager queries and the serialization of their results over the synthetic flights
+    """
+
+    def __init__(self, variant, flight_ids, rows_per_flight, window=100000, repeat=3):
+        """
+        :param variant: plain, stateful or dynamic
+        :param flight_ids: the synthetic flights
+        :param rows_per_flight: the number of samples per flight
+        :param window: the most samples a case holds in memory at once; cases which build whole lists use the
+                       first window samples of the first flight
+        :param repeat: the number of times each case is run
+        """
+        self.variant = variant
+        self.model = get_variant_model(variant)
+        self.manager = self.model.objects
+        self.flight_ids = flight_ids
+        self.rows_per_flight = rows_per_flight
+        self.repeat = repeat
+        offsets = get_sample_offsets(variant, rows_per_flight)
+        self.window_rows = min(window, rows_per_flight)
+        self.start_time = get_flight_start(0, int(offsets[-1]))
+        self.end_time = self.start_time + datetime.timedelta(seconds=int(offsets[self.window_rows - 1]))
+        self.flight_end_time = self.start_time + datetime.timedelta(seconds=int(offsets[-1]))
+        randomizer = random.Random(rows_per_flight)
+        self.times = sorted([self.start_time + datetime.timedelta(seconds=randomizer.uniform(0, offsets[-1]))
+                             for i in range(BENCHMARK_LOOKUPS)])
+
+    def get_window_values(self):
+        if self.model.dynamic:
+            return list(self.manager.get_dynamic_values(self.start_time, self.end_time, self.flight_ids[:1]))
+        return list(self.manager.get_values(self.start_time, self.end_time, self.flight_ids[:1]))
+
+    def get_cases(self):
+        """
+        :return: a list of (name, number of rows, function)
+        """
+        manager = self.manager
+        model = self.model
+        flight_ids = self.flight_ids
+        all_rows = self.rows_per_flight * len(flight_ids)
+        window_values = self.get_window_values()
+        window_rows = len(window_values)
+        packed = get_packed_list(model, window_values, None)
+        columns = get_value_columns(model, window_values, None)
+
+        def count(iterable):
+            return sum(1 for entry in iterable)
+
+        cases = []
+        if model.dynamic:
+            cases.append(('get_dynamic_values', window_rows, lambda: list(
+                manager.get_dynamic_values(self.start_time, self.end_time, flight_ids[:1]))))
+            cases.append(('get_dynamic_flight_values', all_rows, lambda: count(
+                manager.get_dynamic_flight_values(flight_ids))))
+            cases.append(('get_dynamic_min_max', all_rows, lambda: manager.get_dynamic_min_max(
+                flight_ids=flight_ids)))
+            cases.append(('get_dynamic_min_max range', all_rows, lambda: manager.get_dynamic_min_max(
+                self.start_time, self.flight_end_time, flight_ids)))
+        else:
+            cases.append(('get_values', window_rows, lambda: list(
+                manager.get_values(self.start_time, self.end_time, flight_ids[:1]))))
+            cases.append(('get_flight_values', all_rows, lambda: count(
+                iterate_values(model, manager.get_flight_values(flight_ids), None))))
+            cases.append(('get_flight_values downsample 5', all_rows, lambda: count(
+                iterate_values(model, manager.get_flight_values(flight_ids, downsample=5), None))))
+            cases.append(('get_min_max', all_rows, lambda: manager.get_min_max(flight_ids=flight_ids)))
+            cases.append(('get_min_max range', all_rows, lambda: manager.get_min_max(
+                self.start_time, self.flight_end_time, flight_ids)))
+            cases.append(('get_values_at_time x%d' % len(self.times), len(self.times), lambda: [
+                manager.get_values_at_time(t, flight_ids[:1]).first() for t in self.times]))
+            cases.append(('get_values_at_times', len(self.times), lambda: manager.get_values_at_times(
+                self.times, flight_ids[:1])))
+        cases.append(('get_packed_list', window_rows, lambda: get_packed_list(model, window_values, None)))
+        cases.append(('get_value_columns', window_rows, lambda: get_value_columns(model, window_values, None)))
+        cases.append(('json encode packed', window_rows, lambda: DatetimeJsonEncoder().encode(packed)))
+        cases.append(('json bulk encode packed', window_rows, lambda: encode_values(packed)))
+        cases.append(('json bulk encode packed epoch_ms', window_rows, lambda: encode_values(
+            packed, time_format='epoch_ms')))
+        cases.append(('json stream packed', window_rows, lambda: ''.join(stream_json_list(iter(packed)))))
+        cases.append(('binary encode columns', window_rows, lambda: encode_columns(columns)))
+        return cases
+
+    def measure(self, function):
+        """
+        :return: the list of seconds each of the repeated runs took
+        """
+        result = []
+        for i in range(self.repeat):
+            start = time.time()
+            function()
+            result.append(time.time() - start)
+        return result
+
+    def run(self, log=None):
+        """
+        :param log: optional function called with each result as it is measured
+        :return: the report dictionary
+        """
+        connection = connections[router.db_for_read(self.model)]
+        report = OrderedDict([('created', timezone.now().isoformat()),
+                              ('variant', self.variant),
+                              ('model', self.model.get_model_name()),
+                              ('flights', len(self.flight_ids)),
+                              ('rows_per_flight', self.rows_per_flight),
+                              ('window_rows', self.window_rows),
+                              ('repeat', self.repeat),
+                              ('database', connection.vendor),
+                              ('python', platform.python_version()),
+                              ('django', django.get_version()),
+                              ('numpy', np.__version__),
+                              ('cases', [])])
+        for name, rows, function in self.get_cases():
+            seconds = self.measure(function)
+            best = min(seconds)
+            result = OrderedDict([('name', name),
+                                  ('rows', rows),
+                                  ('seconds_min', best),
+                                  ('seconds_median', float(np.median(seconds))),
+                                  ('rows_per_second', rows / best if best else None)])
+            report['cases'].append(result)
+            if log:
+                log(result)
+        return report
@@ -0,0 +1,260 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+A cache of the responses of the value and min/max endpoints.
+
+Responses are keyed by the request path, the POST contents and the Accept header, and stored in the backend named
+by XGDS_TIMESERIES_RESPONSE_CACHE: local (an in process LRU limited to XGDS_TIMESERIES_RESPONSE_CACHE_MAX_BYTES),
+the alias of a Django cache, or None to turn the cache off.
+
+Saving or deleting samples increments a version counter per model and flight, kept in the Django cache
+XGDS_TIMESERIES_CHANGE_LOG_CACHE so every process sees it; that cache must be shared, ie memcached or redis, whose
+add and incr are atomic.  A cached response is only used while the versions of its flights are the ones read before
+it was computed.  Responses for flights which have ended are kept for XGDS_TIMESERIES_RESPONSE_CACHE_ENDED_SECONDS,
+others for XGDS_TIMESERIES_RESPONSE_CACHE_SECONDS.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils import timezone
+
+# every flight, for responses which are not limited to flights
+ALL_FLIGHTS = '*'
+# caches which are not shared between processes, so a save in one would not be seen by the others
+UNSHARED_CACHES = (LocMemCache, DummyCache)
+
+
+class LocalResponseCache(object):
+    """
+    An in process, thread safe, least recently used cache which evicts by the total size of the stored content
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            value, expiration = entry
+            if expiration is not None and expiration < time.time():
+                self.size -= len(value['content'])
+                return None
+            self.entries[key] = entry
+            return value
+
+    def set(self, key, value, timeout=None):
+        size = len(value['content'])
+        if size > self.max_bytes:
+            return
+        expiration = None if timeout is None else time.time() + timeout
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0]['content'])
+            self.entries[key] = (value, expiration)
+            self.size += size
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted[0]['content'])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class DjangoResponseCache(object):
+    """
+    Stores the responses in a Django cache
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout)
+
+    def clear(self):
+        self.cache.clear()
+
+
+RESPONSE_CACHES = {}
+
+
+def get_response_cache():
+    """
+    :return: the configured response cache backend, or None if caching is off
+    """
+    name = settings.XGDS_TIMESERIES_RESPONSE_CACHE
+    if not name:
+        return None
+    if name not in RESPONSE_CACHES:
+        if name == 'local':
+            RESPONSE_CACHES[name] = LocalResponseCache(settings.XGDS_TIMESERIES_RESPONSE_CACHE_MAX_BYTES)
+        else:
+            RESPONSE_CACHES[name] = DjangoResponseCache(name)
+    return RESPONSE_CACHES[name]
+
+
+def get_change_log_cache():
+    """
+    :return: the Django cache of the change versions
+    """
+    change_log_cache = caches[settings.XGDS_TIMESERIES_CHANGE_LOG_CACHE]
+    if isinstance(change_log_cache, UNSHARED_CACHES):
+        raise ImproperlyConfigured('XGDS_TIMESERIES_CHANGE_LOG_CACHE %s is not shared between processes; '
+                                   'use memcached or redis, or set XGDS_TIMESERIES_RESPONSE_CACHE to None'
+                                   % settings.XGDS_TIMESERIES_CHANGE_LOG_CACHE)
+    return change_log_cache
+
+
+def get_change_version_key(model_name, flight_id):
+    return 'xgds_timeseries_version:%s:%s' % (model_name, flight_id)
+
+
+def get_new_version():
+    # a version key which was evicted starts again from a different number, so no old response matches it
+    return int(time.time() * 1000000)
+
+
+def record_samples_changed(model_name, flight_id):
+    """
+    Record that samples of a model were saved or deleted, so cached responses which include them are not used again
+    :param model_name: the fully qualified model name
+    :param flight_id: the id of the flight of the samples, or None
+    """
+    if not settings.XGDS_TIMESERIES_RESPONSE_CACHE:
+        return
+    change_log_cache = get_change_log_cache()
+    flights = [ALL_FLIGHTS] if flight_id is None else [flight_id, ALL_FLIGHTS]
+    for flight in flights:
+        key = get_change_version_key(model_name, flight)
+        if change_log_cache.add(key, get_new_version(), None):
+            continue
+        try:
+            change_log_cache.incr(key)
+        except ValueError:
+            # evicted since the add
+            change_log_cache.set(key, get_new_version(), None)
+
+
+def get_change_versions(model, flight_ids):
+    """
+    Read the change versions of the flights of a response, before it is computed
+    :param model: the TimeSeriesModel subclass of the response
+    :param flight_ids: the flight ids of the request, or None
+    :return: a dictionary of version key to version, or None if caching is off
+    """
+    if get_response_cache() is None or model is None:
+        return None
+    flights = list(flight_ids) if flight_ids else [ALL_FLIGHTS]
+    keys = [get_change_version_key(model.get_model_name(), flight) for flight in flights]
+    change_log_cache = get_change_log_cache()
+    versions = change_log_cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            change_log_cache.add(key, get_new_version(), None)
+            versions[key] = change_log_cache.get(key)
+    return versions
+
+
+def is_current(entry):
+    """
+    :param entry: a cached response entry
+    :return: True if no samples of its flights were saved or deleted since it was computed
+    """
+    versions = entry['versions']
+    return get_change_log_cache().get_many(list(versions.keys())) == versions
+
+
+def get_response_cache_key(request):
+    """
+    :param request: a POST request to a value or min/max endpoint
+    :return: the cache key of its response
+    """
+    description = [request.path, request.META.get('HTTP_ACCEPT', ''), sorted(request.POST.lists())]
+    return 'xgds_timeseries_response:%s' % hashlib.sha1(json.dumps(description).encode('utf-8')).hexdigest()
+
+
+def get_cached_response(key):
+    """
+    :param key: the key from get_response_cache_key
+    :return: the cached HttpResponse if there is one and it is current, otherwise None
+    """
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return None
+    entry = response_cache.get(key)
+    if entry is None or not is_current(entry):
+        return None
+    return HttpResponse(entry['content'], content_type=entry['content_type'], status=entry['status'])
+
+
+def is_flight_complete(model, flight_ids):
+    """
+    :return: True if all the flights have ended, so their samples should not change
+    """
+    if not flight_ids:
+        return False
+    try:
+        flight_model = model._meta.get_field('flight').related_model
+    except Exception:
+        return False
+    ended = flight_model.objects.filter(pk__in=flight_ids, end_time__lt=timezone.now()).count()
+    return ended == len(set([str(f) for f in flight_ids]))
+
+
+def cache_response(key, response, model, flight_ids, versions):
+    """
+    Store a successful, non streaming response
+    :param key: the key from get_response_cache_key
+    :param response: the HttpResponse
+    :param model: the TimeSeriesModel subclass of the response
+    :param flight_ids: the flight ids of the request, or None
+    :param versions: get_change_versions from before the response was computed
+    :return: the response
+    """
+    response_cache = get_response_cache()
+    if response_cache is None or response.status_code != 200 or response.streaming or not versions:
+        return response
+    entry = {'content': response.content,
+             'content_type': response['Content-Type'],
+             'status': response.status_code,
+             'versions': versions}
+    timeout = settings.XGDS_TIMESERIES_RESPONSE_CACHE_SECONDS
+    if is_flight_complete(model, flight_ids):
+        timeout = settings.XGDS_TIMESERIES_RESPONSE_CACHE_ENDED_SECONDS
+    response_cache.set(key, entry, timeout)
+    return response
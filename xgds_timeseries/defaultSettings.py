@@ -41,3 +41,72 @@ from geocamUtil.SettingsUtil import getOrCreateArray
 # If it's >= 60, it must be a multiple of 60 to skip minutes.
 # Does not support skipping > 59 minutes.
 XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS = 5
+
+# Rollup bucket widths in seconds, for TimeSeriesModels which set rollup = True.
+# A downsampled request uses the rollups when its downsample is one of these resolutions.
+# Each resolution must evenly divide the largest one.
+XGDS_TIMESERIES_ROLLUP_RESOLUTIONS = [1, 10, 60, 600]
+
+# Which value of a rollup bucket is reported for each channel: first, last, mean, min or max.
+# first matches the raw downsampled data most closely.
+XGDS_TIMESERIES_ROLLUP_VALUE = 'first'
+
+# Number of rows read from the database and json encoded at once by the streaming value endpoints
+XGDS_TIMESERIES_STREAM_CHUNK_SIZE = 2000
+
+# Number of rows converted and inserted at once by the time series importer, ./manage.py import_timeseries
+XGDS_TIMESERIES_IMPORT_BATCH_SIZE = 5000
+
+# Maintain a TimeSeriesFlightSummary (time extent, row count, channel statistics) per model and flight, and use it
+# for metadata, extent and whole flight min/max lookups.
+# A flight only has a summary once it is built with ./manage.py rebuild_timeseries_summaries (or by the importer);
+# deleted or changed samples mark it stale until it is rebuilt.
+XGDS_TIMESERIES_FLIGHT_SUMMARIES = False
+
+# Seconds to remember which time series classes have data for a set of flights, for the metadata endpoint
+XGDS_TIMESERIES_METADATA_CACHE_SECONDS = 30
+
+# Where the responses of the value and min/max endpoints are cached, see xgds_timeseries.cache:
+# 'local' for an in process LRU cache, the alias of a Django cache, or None to turn the cache off.
+XGDS_TIMESERIES_RESPONSE_CACHE = None
+XGDS_TIMESERIES_RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Seconds to keep the responses of flights which have not ended, and of flights which have ended
+XGDS_TIMESERIES_RESPONSE_CACHE_SECONDS = 60
+XGDS_TIMESERIES_RESPONSE_CACHE_ENDED_SECONDS = 24 * 60 * 60
+# The Django cache which holds the change versions of the flights.  It must be shared by all processes that save
+# samples, ie memcached or redis; a local memory cache is refused.
+XGDS_TIMESERIES_CHANGE_LOG_CACHE = 'default'
+
+# Maximum number of values returned by one poll of the since (cursor) endpoint; the client asks again for more
+XGDS_TIMESERIES_SINCE_LIMIT = 10000
+
+# Threads shared by all combined (multi model) requests, which bounds their database connections; 1 runs inline
+XGDS_TIMESERIES_COMBINED_THREADS = 4
+
+# Maximum number of grid times of one resampled (aligned) request
+XGDS_TIMESERIES_RESAMPLE_MAX_POINTS = 100000
+
+# Maximum number of histogram bins of one statistics request
+XGDS_TIMESERIES_MAX_HISTOGRAM_BINS = 1000
+
+# Directory of the memory mapped archives of completed flights written by ./manage.py archive_timeseries, which are
+# read instead of the database.  None turns archives off.
+XGDS_TIMESERIES_ARCHIVE_DIR = None
+
+# Measure the time series endpoints: query count, SQL time, encoding time, rows and response bytes.
+# See xgds_timeseries.instrumentation.  Off by default; the measurements are sent in a Server-Timing header and to
+# each of the metrics hooks, dotted paths of functions which take a dictionary of the measurements of one request.
+# record_local_metrics keeps totals for the metrics/prometheus endpoint; send_statsd sends them to StatsD.
+XGDS_TIMESERIES_INSTRUMENTATION = False
+XGDS_TIMESERIES_METRICS_HOOKS = ['xgds_timeseries.instrumentation.record_local_metrics']
+XGDS_TIMESERIES_STATSD_ADDRESS = ('localhost', 8125)
+
+# The encoder of the json lists of values, see xgds_timeseries.encoding: django is the plain DatetimeJsonEncoder;
+# python formats the times and numbers in bulk; orjson (Python 3 only) hands the rows to orjson, and auto uses
+# orjson if it is installed and otherwise python.
+XGDS_TIMESERIES_JSON_BACKEND = 'django'
+
+# See xgds_timeseries.async_views.  The number of threads which run the async views' queries, and the number of
+# chunks of a streaming response buffered between a worker and the event loop.
+XGDS_TIMESERIES_ASYNC_WORKERS = 4
+XGDS_TIMESERIES_ASYNC_STREAM_BUFFER = 4
@@ -0,0 +1,269 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+Fast json encoding of lists of values, ie the results of get_values as lists or dictionaries.
+
+Instead of passing every value through DatetimeJsonEncoder, the rows are turned into columns and each column is
+formatted in bulk: times with numpy, as the same ISO 8601 strings as datetime.isoformat() in UTC or as epoch
+milliseconds, and numbers with numpy, rounded to the precision of their ChannelDescription.  The rows are then
+joined, or handed to orjson if it is installed.  XGDS_TIMESERIES_JSON_BACKEND chooses the backend; the default,
+django, keeps the plain DatetimeJsonEncoder and only rounds the channels which have a precision.
+"""
+
+import calendar
+import datetime
+import json
+from json.encoder import encode_basestring_ascii
+
+import numpy as np
+from django.conf import settings
+
+from geocamUtil.datetimeJsonEncoder import DatetimeJsonEncoder
+
+from xgds_timeseries.util import get_epoch_microseconds
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKENDS = ('auto', 'orjson', 'python', 'django')
+TIME_FORMATS = ('iso', 'epoch_ms')
+# long is left out as its repr ends in L on Python 2
+NUMBER_TYPES = frozenset([int, float])
+STRING_TYPES = frozenset([str, type(u'')])
+NONE_TYPE = type(None)
+# the json tokens of the values whose repr is not valid json, as json.dumps writes them
+SPECIAL_TOKENS = {'None': 'null', 'nan': 'NaN', 'inf': 'Infinity', '-inf': '-Infinity'}
+
+
+def get_json_backend():
+    """
+    :return: orjson, python or django, from XGDS_TIMESERIES_JSON_BACKEND; auto is orjson when it is installed
+    """
+    backend = settings.XGDS_TIMESERIES_JSON_BACKEND
+    if backend not in JSON_BACKENDS:
+        raise ValueError('Unknown json backend %s' % backend)
+    if backend == 'auto':
+        return 'orjson' if orjson is not None else 'python'
+    if backend == 'orjson' and orjson is None:
+        raise ValueError('XGDS_TIMESERIES_JSON_BACKEND is orjson but orjson is not installed')
+    return backend
+
+
+def get_column_kind(column):
+    """
+    :param column: a sequence of values
+    :return: time, number, string or None if the column must be encoded value by value; each may have None
+    """
+    types = set(map(type, column))
+    types.discard(NONE_TYPE)
+    if not types:
+        return None
+    if all([issubclass(t, datetime.datetime) for t in types]):
+        return 'time'
+    # bool and numpy scalars are not in NUMBER_TYPES, so they keep their usual encoding
+    if types <= NUMBER_TYPES:
+        return 'number'
+    if types <= STRING_TYPES:
+        return 'string'
+    return None
+
+
+def get_time_microseconds(times):
+    """
+    :param times: a list of datetimes, without None
+    :return: a numpy int64 array of microseconds since the epoch
+    """
+    if None in set([t.tzinfo for t in times]):
+        return get_epoch_microseconds(times)
+    # much faster than numpy's conversion of aware datetimes, and exact to the microsecond
+    return np.array([calendar.timegm(t.utctimetuple()) * 1000000 + t.microsecond for t in times], dtype=np.int64)
+
+
+def format_iso_times(microseconds):
+    """
+    :param microseconds: a numpy int64 array of microseconds since the epoch
+    :return: a list of the same strings datetime.isoformat() gives for the times in UTC
+    """
+    times = microseconds.astype('datetime64[us]')
+    result = np.char.add(np.datetime_as_string(times, unit='us'), '+00:00').astype(object)
+    # isoformat() leaves out the fraction of whole seconds
+    whole = microseconds % 1000000 == 0
+    if whole.any():
+        result[whole] = np.char.add(np.datetime_as_string(times[whole], unit='s'), '+00:00')
+    return result.tolist()
+
+
+def get_time_values(column, time_format='iso'):
+    """
+    :param column: a list of datetimes or None
+    :param time_format: iso or epoch_ms
+    :return: a list of iso strings or integer milliseconds since the epoch, with None kept
+    """
+    present = [t for t in column if t is not None]
+    microseconds = get_time_microseconds(present) if present else np.zeros(0, dtype=np.int64)
+    if time_format == 'epoch_ms':
+        values = (microseconds // 1000).tolist()
+    else:
+        values = format_iso_times(microseconds)
+    if len(present) == len(column):
+        return values
+    values = iter(values)
+    return [None if t is None else next(values) for t in column]
+
+
+def round_numbers(column, precision):
+    """
+    :param column: a list of int, float or None
+    :param precision: the decimal places to round to
+    :return: a list of rounded floats, with None kept
+    """
+    array = np.array(column, dtype=np.float64)
+    result = np.round(array, precision).tolist()
+    if None in column:
+        for index in np.flatnonzero(np.isnan(array)):
+            result[index] = column[index]
+    return result
+
+
+def get_column_tokens(column, kind, precision=None, time_format='iso'):
+    """
+    :param column: a list of values
+    :param kind: from get_column_kind
+    :param precision: the decimal places to round a number column to, or None
+    :param time_format: iso or epoch_ms
+    :return: a list of the json token of each value of the column
+    """
+    if kind == 'time':
+        values = get_time_values(column, time_format)
+        if time_format == 'epoch_ms':
+            return ['null' if value is None else str(value) for value in values]
+        return ['null' if value is None else '"%s"' % value for value in values]
+    if kind == 'string':
+        return [SPECIAL_TOKENS['None'] if value is None else encode_basestring_ascii(value) for value in column]
+    if kind != 'number':
+        encoder = DatetimeJsonEncoder()
+        return list(map(encoder.encode, column))
+    if precision is not None:
+        column = round_numbers(column, precision)
+    # repr is how json formats numbers, except for None, NaN and infinities
+    tokens = list(map(repr, column))
+    if None in column or float in set(map(type, column)):
+        for index in np.flatnonzero(~np.isfinite(np.array(column, dtype=np.float64))):
+            tokens[index] = SPECIAL_TOKENS[tokens[index]]
+    return tokens
+
+
+def get_rows_layout(rows):
+    """
+    :param rows: a non empty list of lists (or tuples), or of dictionaries with the same keys
+    :return: (keys of dictionary rows or None for lists, list of columns), or None if the rows are not uniform
+    """
+    types = set(map(type, rows))
+    if len(set(map(len, rows))) != 1:
+        return None
+    if types == set([dict]):
+        keys = list(rows[0].keys())
+        try:
+            # rows of the same length which all have the keys of the first have the same keys
+            return keys, [[row[key] for row in rows] for key in keys]
+        except KeyError:
+            return None
+    if types <= set([list, tuple]):
+        return None, list(zip(*rows))
+    return None
+
+
+def encode_values_python(keys, columns, kinds, precisions, time_format):
+    """
+    Format each column in bulk and fill the rows into a template
+    """
+    token_columns = [get_column_tokens(column, kinds[index], precisions[index], time_format)
+                     for index, column in enumerate(columns)]
+    if keys is None:
+        template = '[%s]' % ','.join(['%s'] * len(columns))
+    else:
+        template = '{%s}' % ','.join(['%s:%%s' % json.dumps(key).replace('%', '%%') for key in keys])
+    return '[%s]' % ','.join(map(template.__mod__, zip(*token_columns)))
+
+
+def encode_values_django(rows, keys, columns, kinds, precisions):
+    """
+    Round the number columns which have a precision, and encode the rows with DatetimeJsonEncoder
+    """
+    rounded = [kinds[index] == 'number' and precisions[index] is not None for index in range(len(columns))]
+    if any(rounded):
+        columns = [round_numbers(column, precisions[index]) if rounded[index] else column
+                   for index, column in enumerate(columns)]
+        if keys is None:
+            rows = list(zip(*columns))
+        else:
+            rows = [dict(zip(keys, row)) for row in zip(*columns)]
+    return json.dumps(rows, cls=DatetimeJsonEncoder)
+
+
+def encode_values_orjson(keys, columns, kinds, precisions, time_format):
+    """
+    Round and convert the columns which need it, and let orjson encode the rows
+    """
+    converted = []
+    for index, column in enumerate(columns):
+        kind = kinds[index]
+        if kind == 'time' and time_format == 'epoch_ms':
+            column = get_time_values(column, time_format)
+        elif kind == 'number' and precisions[index] is not None:
+            column = round_numbers(column, precisions[index])
+        converted.append(column)
+    if keys is None:
+        rows = list(zip(*converted))
+    else:
+        rows = [dict(zip(keys, row)) for row in zip(*converted)]
+    # orjson writes aware datetimes like isoformat()
+    return orjson.dumps(rows, default=DatetimeJsonEncoder().default).decode('utf-8')
+
+
+def encode_values(rows, fields=None, precisions=None, time_format='iso'):
+    """
+    Encode a list of values as json, in bulk
+    :param rows: a list of lists or tuples (packed values) or of dictionaries, ie from get_values
+    :param fields: the names of the entries of list rows, to look up their precisions
+    :param precisions: a dictionary of field name to decimal places, see get_channel_precisions
+    :param time_format: iso (as datetime.isoformat() in UTC) or epoch_ms (integer milliseconds since the epoch)
+    :return: the json string
+    """
+    if time_format not in TIME_FORMATS:
+        raise ValueError('Unknown time format %s' % time_format)
+    backend = get_json_backend()
+    rows = list(rows)
+    layout = None
+    if rows and (backend != 'django' or time_format != 'iso' or precisions):
+        layout = get_rows_layout(rows)
+    if layout is None:
+        if time_format == 'epoch_ms' and rows:
+            raise ValueError('epoch_ms times need uniform rows')
+        return json.dumps(rows, cls=DatetimeJsonEncoder)
+    keys, columns = layout
+    names = keys if keys is not None else (fields or [None] * len(columns))
+    precisions = precisions or {}
+    column_precisions = [precisions.get(name) for name in names]
+    kinds = [get_column_kind(column) for column in columns]
+    if backend == 'django' and time_format == 'iso':
+        return encode_values_django(rows, keys, columns, kinds, column_precisions)
+    if backend == 'orjson':
+        return encode_values_orjson(keys, columns, kinds, column_precisions, time_format)
+    return encode_values_python(keys, columns, kinds, column_precisions, time_format)
@@ -0,0 +1,118 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+Compact storage for the channels of time series models.
+
+Float32Field stores a channel as a 4 byte float, for sensors with no more than about 7 significant digits.
+ScaledIntegerField stores a channel with a fixed number of decimal places as a 4 byte integer count of
+10 ** -decimal_places, ie a temperature of 8.13 with decimal_places=2 is stored as 813, and reads back as a float.
+Both halve the table and index size of the channel compared to a FloatField.
+"""
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+
+CHANNEL_DTYPES = ('float64', 'float32', 'scaled')
+
+
+class Float32Field(models.FloatField):
+    """
+    A FloatField stored in single precision
+    """
+    description = 'Single precision floating point number'
+
+    def db_type(self, connection):
+        if connection.vendor == 'mysql':
+            return 'float'
+        if connection.vendor in ('postgresql', 'sqlite'):
+            return 'real'
+        return super(Float32Field, self).db_type(connection)
+
+
+class ScaledIntegerField(models.IntegerField):
+    """
+    A number with a fixed number of decimal places, stored as an integer
+    """
+    description = 'Number with %(decimal_places)s decimal places stored as an integer'
+
+    def __init__(self, *args, **kwargs):
+        self.decimal_places = kwargs.pop('decimal_places', 2)
+        self.scale = 10 ** self.decimal_places
+        super(ScaledIntegerField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(ScaledIntegerField, self).deconstruct()
+        kwargs['decimal_places'] = self.decimal_places
+        return name, path, args, kwargs
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return int(round(float(value) * self.scale))
+
+    def get_prep_lookup(self, lookup_type, value):
+        # before Django 2.0 IntegerField rounds float bounds of gte and lt up, before they would be scaled
+        if lookup_type in ('gte', 'lt'):
+            return self.get_prep_value(value)
+        return super(ScaledIntegerField, self).get_prep_lookup(lookup_type, value)
+
+    def from_db_value(self, value, expression, connection, *args):
+        if value is None:
+            return value
+        return value / float(self.scale)
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        try:
+            return round(float(value), self.decimal_places)
+        except (TypeError, ValueError):
+            raise ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+    def formfield(self, **kwargs):
+        defaults = {'form_class': forms.FloatField}
+        defaults.update(kwargs)
+        return models.Field.formfield(self, **defaults)
+
+
+# since Django 2.0 IntegerField rounds float bounds with these lookups; the scaled bounds are rounded instead
+ScaledIntegerField.register_lookup(GreaterThanOrEqual)
+ScaledIntegerField.register_lookup(LessThan)
+
+
+def get_channel_field(spec):
+    """
+    Build the model field of a channel from its field in a YAML model spec, ie test_data/TimeSeries_Example.yaml,
+    for model builders.  A float field may have a dtype of float64 (the default), float32 or scaled; scaled needs
+    a precision, the number of decimal places.
+    :param spec: the dictionary of the field in the spec
+    :return: the unbound model field, which allows nulls, or None if the field is not a float
+    """
+    if spec.get('type') != 'float':
+        return None
+    dtype = spec.get('dtype', 'float64')
+    if dtype not in CHANNEL_DTYPES:
+        raise ValueError('Unknown dtype %s' % dtype)
+    if dtype == 'float32':
+        return Float32Field(null=True, blank=True)
+    if dtype == 'scaled':
+        if spec.get('precision') is None:
+            raise ValueError('A scaled field needs a precision')
+        return ScaledIntegerField(decimal_places=int(spec['precision']), null=True, blank=True)
+    return models.FloatField(null=True, blank=True)
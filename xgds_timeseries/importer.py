@@ -0,0 +1,270 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+Bulk import of delimited time series files described by a YAML spec, ie test_data/TimeSeries_Example.yaml.
+Rows are read, converted and inserted in batches, and the live plots get one broadcast per batch
+instead of one per row.
+"""
+
+import csv
+import logging
+from collections import OrderedDict
+
+import yaml
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils.six import StringIO
+
+from geocamUtil.loader import getModelByName
+
+from xgds_timeseries.models import get_rollup_rows, update_rollups, rebuild_rollups, get_rolled_up_flight_ids, \
+    update_flight_summaries, rebuild_flight_summary
+from xgds_timeseries.util import parse_times
+from xgds_timeseries.cache import record_samples_changed
+from xgds_timeseries.archive import delete_flight_archive
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedSpecLoader(yaml.SafeLoader):
+    """
+    Loads YAML mappings as OrderedDicts, so the fields of a spec keep the order of the file columns
+    """
+    pass
+
+
+def construct_ordered_mapping(loader, node):
+    loader.flatten_mapping(node)
+    return OrderedDict(loader.construct_pairs(node))
+
+
+OrderedSpecLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_ordered_mapping)
+
+
+def load_spec(spec_path):
+    """
+    :param spec_path: path to the YAML spec of a time series model
+    :return: the spec as an OrderedDict
+    """
+    with open(spec_path) as spec_file:
+        return yaml.load(spec_file, Loader=OrderedSpecLoader)
+
+
+def get_converter(field_type, precision=None):
+    """
+    :param field_type: the type of a field in the spec
+    :param precision: the decimal places of a float field in the spec, to round the values to, or None
+    :return: a function converting the string in the file to the python value, blank becomes None
+    """
+    if field_type == 'float':
+        if precision is not None:
+            return lambda value: round(float(value), precision) if value else None
+        return lambda value: float(value) if value else None
+    if field_type in ('int', 'integer'):
+        return lambda value: int(value) if value else None
+    if field_type in ('bool', 'boolean'):
+        return lambda value: value.lower() in ('1', 'true', 't', 'yes', 'y') if value else None
+    return lambda value: value if value else None
+
+
+class TimeSeriesImporter(object):
+    """
+    Reads a delimited file described by a YAML spec and bulk inserts it into the spec's TimeSeriesModel.
+    """
+
+    def __init__(self, spec, flight_id=None, batch_size=None, broadcast=True, use_copy=False):
+        """
+        :param spec: the spec dictionary, see load_spec
+        :param flight_id: the id of the flight the rows belong to
+        :param batch_size: number of rows to insert at once, defaults to XGDS_TIMESERIES_IMPORT_BATCH_SIZE
+        :param broadcast: True to broadcast the last row of each batch to the live plots
+        :param use_copy: True to insert with COPY on PostgreSQL, ignored on other databases
+        """
+        self.spec = spec
+        self.model = getModelByName(spec['class'])
+        self.flight_id = flight_id
+        if spec.get('flight_required', False) and flight_id is None:
+            raise ValueError('%s requires a flight' % self.model.get_model_name())
+        self.batch_size = batch_size or settings.XGDS_TIMESERIES_IMPORT_BATCH_SIZE
+        self.broadcast = broadcast
+        self.delimiter = str(spec.get('delimiter', ','))
+        self.time_field_name = self.model.get_time_field_name()
+        self.field_names = list(spec['fields'].keys())
+        if self.time_field_name not in self.field_names:
+            raise ValueError('The spec for %s has no %s field' % (self.model.get_model_name(), self.time_field_name))
+        self.converters = [get_converter(spec['fields'][name].get('type'), spec['fields'][name].get('precision'))
+                           for name in self.field_names]
+        self.using = router.db_for_write(self.model)
+        self.use_copy = use_copy and connections[self.using].vendor == 'postgresql'
+
+    def read_batches(self, data_file, skip_header=False):
+        """
+        :param data_file: an open text file
+        :param skip_header: True if the first line holds the column names
+        :return: a generator of lists of rows, each row a list of strings
+        """
+        reader = csv.reader(data_file, delimiter=self.delimiter)
+        if skip_header:
+            next(reader, None)
+        batch = []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(self.field_names):
+                raise ValueError('Line %d has %d columns, the spec has %d' %
+                                 (reader.line_num, len(row), len(self.field_names)))
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def build_instances(self, rows):
+        """
+        Convert a batch of rows into unsaved model instances; the times are parsed all at once.
+        """
+        columns = list(zip(*rows))
+        converted = []
+        for name, converter, column in zip(self.field_names, self.converters, columns):
+            if name == self.time_field_name:
+                if not all(column):
+                    raise ValueError('Missing %s' % self.time_field_name)
+                converted.append(parse_times(column))
+            else:
+                converted.append([converter(value) for value in column])
+
+        instances = []
+        for values in zip(*converted):
+            instance = self.model(**dict(zip(self.field_names, values)))
+            if self.flight_id is not None:
+                instance.flight_id = self.flight_id
+            instances.append(instance)
+        return instances
+
+    def copy_instances(self, instances):
+        """
+        Insert a batch with PostgreSQL COPY, which is faster than INSERT but does not return the primary keys
+        """
+        fields = [f for f in self.model._meta.concrete_fields if not f.primary_key]
+        connection = connections[self.using]
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        for instance in instances:
+            writer.writerow([f.get_db_prep_save(getattr(instance, f.attname), connection) for f in fields])
+        buffer.seek(0)
+        columns = ', '.join([connection.ops.quote_name(f.column) for f in fields])
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert('COPY %s (%s) FROM STDIN WITH CSV' %
+                                      (connection.ops.quote_name(self.model._meta.db_table), columns), buffer)
+
+    def insert_instances(self, instances):
+        """
+        Insert one batch of instances and bring the rollups and flight summaries up to date
+        :return: True if they were updated, False if they must be rebuilt
+        """
+        with transaction.atomic(using=self.using):
+            if self.use_copy:
+                self.copy_instances(instances)
+            else:
+                self.model.objects.using(self.using).bulk_create(instances)
+            # bulk inserts do not send post_save, and only some databases set the primary keys
+            if any(instance.pk is None for instance in instances):
+                return False
+            if self.model.get_rollup_resolutions():
+                update_rollups(self.model, get_rollup_rows(instances))
+            if settings.XGDS_TIMESERIES_FLIGHT_SUMMARIES:
+                update_flight_summaries(self.model, instances)
+        return True
+
+    def get_saved_instance(self, instance):
+        """
+        bulk_create only sets the primary keys on some databases, and COPY never does
+        :return: the instance, or the saved row with its time read back from the database if it has no pk
+        """
+        if instance.pk is not None:
+            return instance
+        filter_dict = {self.time_field_name: getattr(instance, self.time_field_name)}
+        if self.flight_id is not None:
+            filter_dict['flight_id'] = self.flight_id
+        return self.model.objects.using(self.using).filter(**filter_dict).order_by('-pk').first()
+
+    def broadcast_instance(self, instance):
+        """
+        Broadcast one instance so the live plots move forward; failures are logged but do not stop the import.
+        """
+        try:
+            instance = self.get_saved_instance(instance)
+            if instance is not None:
+                instance.broadcast()
+        except Exception:
+            logger.exception('Could not broadcast %s', self.model.get_model_name())
+
+    def import_file(self, data_file, skip_header=False):
+        """
+        Import all the rows of an open file
+        :param data_file: an open text file
+        :param skip_header: True if the first line holds the column names
+        :return: the number of rows imported
+        """
+        count = 0
+        # batches only update the rollups and summary of a flight which already has them, so a flight without them
+        # is rebuilt at the end
+        rollups_current = True
+        summary_current = True
+        if self.flight_id is not None:
+            # bulk inserts send no signals, so an archive of the flight would go on hiding the new rows
+            if delete_flight_archive(self.model, self.flight_id):
+                logger.warning('Deleted the archive of %s flight %s to import into it', self.model.get_model_name(),
+                               self.flight_id)
+            if self.model.get_rollup_resolutions():
+                rollups_current = bool(get_rolled_up_flight_ids(self.model, [self.flight_id]))
+            if settings.XGDS_TIMESERIES_FLIGHT_SUMMARIES:
+                summary_current = self.model.objects.get_flight_summaries([self.flight_id]) is not None
+        for rows in self.read_batches(data_file, skip_header):
+            instances = self.build_instances(rows)
+            inserted_current = self.insert_instances(instances)
+            rollups_current = inserted_current and rollups_current
+            summary_current = inserted_current and summary_current
+            count += len(instances)
+            record_samples_changed(self.model.get_model_name(), self.flight_id)
+            if self.broadcast:
+                self.broadcast_instance(instances[-1])
+        if self.flight_id is not None:
+            if not rollups_current:
+                rebuild_rollups(self.model, self.flight_id)
+            if not summary_current and settings.XGDS_TIMESERIES_FLIGHT_SUMMARIES:
+                rebuild_flight_summary(self.model, self.flight_id)
+        return count
+
+
+def import_timeseries(spec_path, data_path, flight_id=None, batch_size=None, broadcast=True, use_copy=False,
+                      skip_header=False):
+    """
+    Import a delimited time series file
+    :param spec_path: path to the YAML spec of the model
+    :param data_path: path to the data file
+    :param flight_id: the id of the flight the rows belong to
+    :param batch_size: number of rows to insert at once
+    :param broadcast: True to broadcast the last row of each batch
+    :param use_copy: True to use COPY on PostgreSQL
+    :param skip_header: True if the first line holds the column names
+    :return: the number of rows imported
+    """
+    importer = TimeSeriesImporter(load_spec(spec_path), flight_id, batch_size, broadcast, use_copy)
+    with open(data_path) as data_file:
+        return importer.import_file(data_file, skip_header)
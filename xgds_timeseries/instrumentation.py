@@ -0,0 +1,322 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+Opt in timing of the time series endpoints, turned on with XGDS_TIMESERIES_INSTRUMENTATION.
+
+Each call of an instrumented view records the number and total time of its SQL queries, the time spent in the
+manager methods and in encoding, the rows formatted and the bytes of the response.  They are sent in a Server-Timing
+header (for streaming responses, only what happened before the first byte) and, once the response is complete,
+to each function named in XGDS_TIMESERIES_METRICS_HOOKS.  record_local_metrics keeps totals in process for the
+Prometheus text endpoint, metrics/prometheus; send_statsd sends them to XGDS_TIMESERIES_STATSD_ADDRESS.
+
+Queries run by the combined endpoint's pool threads are not counted.
+"""
+
+import functools
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+LOCAL = threading.local()
+
+
+class RequestMetrics(object):
+    """
+    The measurements of one call of an instrumented view
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.total = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.response_bytes = 0
+        self.phases = OrderedDict()
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def get_app_seconds(self):
+        """
+        :return: the time not spent in SQL or encoding, ie building rows in Python
+        """
+        return max(self.total - self.sql_seconds - self.phases.get('encode', 0.0), 0.0)
+
+    def get_server_timing(self):
+        """
+        :return: the value of the Server-Timing header, durations in milliseconds
+        """
+        entries = ['total;dur=%.1f' % (self.total * 1000),
+                   'sql;dur=%.1f;desc="%d queries"' % (self.sql_seconds * 1000, self.queries),
+                   'app;dur=%.1f;desc="%d rows"' % (self.get_app_seconds() * 1000, self.rows)]
+        for name, seconds in self.phases.items():
+            entries.append('%s;dur=%.1f' % (name, seconds * 1000))
+        return ', '.join(entries)
+
+    def to_dict(self):
+        result = OrderedDict([('name', self.name),
+                              ('total', self.total),
+                              ('queries', self.queries),
+                              ('sql', self.sql_seconds),
+                              ('app', self.get_app_seconds()),
+                              ('rows', self.rows),
+                              ('response_bytes', self.response_bytes)])
+        result['phases'] = OrderedDict(self.phases)
+        return result
+
+
+def get_current():
+    """
+    :return: the RequestMetrics of the instrumented view running on this thread, or None
+    """
+    return getattr(LOCAL, 'metrics', None)
+
+
+class phase(object):
+    """
+    A context manager which adds the time of its block to a phase of the current metrics, if there are any
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.metrics = None
+        self.started = None
+
+    def __enter__(self):
+        self.metrics = get_current()
+        if self.metrics is not None:
+            self.started = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.add_phase(self.name, time.time() - self.started)
+        return False
+
+
+def record_rows(count):
+    """
+    Count rows formatted for the response of the current view
+    """
+    metrics = get_current()
+    if metrics is not None:
+        metrics.rows += count
+
+
+def instrument_method(method):
+    """
+    Decorate a manager method so its time is recorded as a phase named after it, when a view is instrumented
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if get_current() is None:
+            return method(*args, **kwargs)
+        with phase(method.__name__):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+class SqlRecorder(object):
+    """
+    Counts and times the queries of every database connection of this thread, with execute_wrapper where Django
+    has it (2.0 and later), otherwise from the debug cursor's connection.queries.  That log only keeps the last
+    queries (9000 in Django 1.x), so once it is full the queries are undercounted; a warning is logged when that
+    happens.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.wrappers = []
+        self.debug_connections = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.metrics.queries += 1
+            self.metrics.sql_seconds += time.time() - started
+
+    def start(self):
+        for connection in connections.all():
+            if hasattr(connection, 'execute_wrapper'):
+                wrapper = connection.execute_wrapper(self)
+                wrapper.__enter__()
+                self.wrappers.append(wrapper)
+            else:
+                self.debug_connections.append((connection, connection.force_debug_cursor,
+                                               len(connection.queries_log)))
+                connection.force_debug_cursor = True
+
+    def stop(self):
+        for wrapper in reversed(self.wrappers):
+            wrapper.__exit__(None, None, None)
+        self.wrappers = []
+        for connection, force_debug_cursor, logged in self.debug_connections:
+            queries = list(connection.queries_log)[logged:]
+            if len(connection.queries_log) == connection.queries_log.maxlen:
+                logger.warning('The query log of database %s is full, so the queries of %s are undercounted',
+                               connection.alias, self.metrics.name)
+            self.metrics.queries += len(queries)
+            self.metrics.sql_seconds += sum([float(q['time']) for q in queries])
+            connection.force_debug_cursor = force_debug_cursor
+        self.debug_connections = []
+
+
+def finish(metrics):
+    """
+    Send the complete metrics of a view to the hooks; a failing hook is logged but never fails the request
+    """
+    for path in settings.XGDS_TIMESERIES_METRICS_HOOKS:
+        try:
+            import_string(path)(metrics.to_dict())
+        except Exception:
+            logger.exception('The metrics hook %s failed for %s', path, metrics.name)
+
+
+class measure(object):
+    """
+    A context manager which makes metrics current on this thread and records the SQL of its block
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.recorder = SqlRecorder(metrics)
+        self.started = None
+
+    def __enter__(self):
+        LOCAL.metrics = self.metrics
+        self.recorder.start()
+        self.started = time.time()
+        return self.metrics
+
+    def __exit__(self, *exc_info):
+        self.metrics.total += time.time() - self.started
+        self.recorder.stop()
+        LOCAL.metrics = None
+        return False
+
+
+def stream_measured(metrics, content):
+    """
+    Measure the iteration of streaming content, and finish the metrics when it is done
+    """
+    try:
+        iterator = iter(content)
+        while True:
+            with measure(metrics):
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+            metrics.response_bytes += len(chunk)
+            yield chunk
+    finally:
+        finish(metrics)
+
+
+def instrumented(view):
+    """
+    Decorate a view so it is measured when XGDS_TIMESERIES_INSTRUMENTATION is on
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.XGDS_TIMESERIES_INSTRUMENTATION:
+            return view(request, *args, **kwargs)
+        metrics = RequestMetrics(getattr(request, 'path', view.__name__))
+        with measure(metrics):
+            response = view(request, *args, **kwargs)
+        response['Server-Timing'] = metrics.get_server_timing()
+        if getattr(response, 'streaming', False):
+            response.streaming_content = stream_measured(metrics, response.streaming_content)
+        else:
+            metrics.response_bytes = len(response.content)
+            finish(metrics)
+        return response
+    return wrapper
+
+
+# the in process stand in for a metrics server, see record_local_metrics
+LOCAL_METRICS = OrderedDict()
+LOCAL_METRICS_LOCK = threading.Lock()
+LOCAL_METRICS_FIELDS = ('total', 'sql', 'app', 'queries', 'rows', 'response_bytes')
+
+
+def record_local_metrics(metrics):
+    """
+    A metrics hook which adds the metrics of a call to in process totals by path, see get_prometheus_text
+    """
+    with LOCAL_METRICS_LOCK:
+        totals = LOCAL_METRICS.get(metrics['name'])
+        if totals is None:
+            totals = OrderedDict([('count', 0)] + [(field, 0) for field in LOCAL_METRICS_FIELDS])
+            LOCAL_METRICS[metrics['name']] = totals
+        totals['count'] += 1
+        for field in LOCAL_METRICS_FIELDS:
+            totals[field] += metrics[field]
+
+
+def get_prometheus_text():
+    """
+    :return: the local metrics totals in the Prometheus text exposition format
+    """
+    descriptions = OrderedDict([('count', ('xgds_timeseries_requests_total', 'Instrumented requests')),
+                                ('total', ('xgds_timeseries_seconds_total', 'Seconds spent in the view')),
+                                ('sql', ('xgds_timeseries_sql_seconds_total', 'Seconds spent in SQL queries')),
+                                ('app', ('xgds_timeseries_app_seconds_total',
+                                         'Seconds spent outside SQL and encoding')),
+                                ('queries', ('xgds_timeseries_queries_total', 'SQL queries')),
+                                ('rows', ('xgds_timeseries_rows_total', 'Rows formatted')),
+                                ('response_bytes', ('xgds_timeseries_response_bytes_total', 'Response bytes'))])
+    with LOCAL_METRICS_LOCK:
+        snapshot = [(name, dict(totals)) for name, totals in LOCAL_METRICS.items()]
+    lines = []
+    for field, (metric, description) in descriptions.items():
+        lines.append('# HELP %s %s' % (metric, description))
+        lines.append('# TYPE %s counter' % metric)
+        for name, totals in snapshot:
+            lines.append('%s{path="%s"} %s' % (metric, name.replace('\\', '\\\\').replace('"', '\\"'),
+                                               repr(float(totals[field]))))
+    return '\n'.join(lines) + '\n'
+
+
+def send_statsd(metrics):
+    """
+    A metrics hook which sends the metrics of a call to StatsD over UDP, as timers in milliseconds and counters
+    """
+    prefix = 'xgds_timeseries.%s' % metrics['name'].strip('/').replace('/', '.')
+    lines = ['%s.total:%d|ms' % (prefix, metrics['total'] * 1000),
+             '%s.sql:%d|ms' % (prefix, metrics['sql'] * 1000),
+             '%s.app:%d|ms' % (prefix, metrics['app'] * 1000),
+             '%s.queries:%d|c' % (prefix, metrics['queries']),
+             '%s.rows:%d|c' % (prefix, metrics['rows']),
+             '%s.response_bytes:%d|c' % (prefix, metrics['response_bytes'])]
+    statsd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        statsd.sendto('\n'.join(lines).encode('utf-8'), tuple(settings.XGDS_TIMESERIES_STATSD_ADDRESS))
+    finally:
+        statsd.close()
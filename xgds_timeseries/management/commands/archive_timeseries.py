@@ -0,0 +1,64 @@
+#__BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#__END_LICENSE__
+
+"""
+Write the samples of completed flights to memory mapped column files under XGDS_TIMESERIES_ARCHIVE_DIR, which the
+value and min/max queries then read instead of the database.  See xgds_timeseries.archive.
+
+./manage.py archive_timeseries xgds_braille_app.Environmental --flight 22
+./manage.py archive_timeseries xgds_braille_app.Environmental --flight 22 --delete
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from geocamUtil.loader import getModelByName
+
+from xgds_timeseries.archive import write_flight_archive, delete_flight_archive
+from xgds_timeseries.cache import is_flight_complete
+
+
+class Command(BaseCommand):
+    help = 'Archive the samples of completed flights to memory mapped column files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='fully qualified model name, ie xgds_braille_app.Environmental')
+        parser.add_argument('--flight', action='append', dest='flight_ids', type=int, default=[],
+                            help='id of a flight to archive')
+        parser.add_argument('--force', action='store_true', default=False,
+                            help='archive flights which have not ended; later samples will not be seen')
+        parser.add_argument('--delete', action='store_true', default=False,
+                            help='delete the archives instead, so the flights are read from the database again')
+
+    def handle(self, *args, **options):
+        model = getModelByName(options['model'])
+        if not options['flight_ids']:
+            raise CommandError('Give at least one --flight')
+        for flight_id in options['flight_ids']:
+            if options['delete']:
+                if delete_flight_archive(model, flight_id):
+                    self.stdout.write('Deleted the archive of flight %d' % flight_id)
+                continue
+            if not options['force'] and not is_flight_complete(model, [flight_id]):
+                raise CommandError('Flight %d has not ended; use --force to archive it anyway' % flight_id)
+            start = time.time()
+            try:
+                count = write_flight_archive(model, flight_id)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write('Archived %d samples of flight %d in %.2f seconds' % (count, flight_id,
+                                                                                   time.time() - start))
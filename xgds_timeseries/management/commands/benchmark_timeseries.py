@@ -0,0 +1,92 @@
+#__BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#__END_LICENSE__
+
+"""
+Time the time series queries and serialization over generated flights, and write a json report.
+The database is the one the example models use, so compare backends by running with different settings.
+
+./manage.py benchmark_timeseries --rows 1000000 --flights 3 --output report.json
+./manage.py benchmark_timeseries --variant dynamic --rows 100000
+./manage.py benchmark_timeseries --variant stateful --rows 50000000 --copy --keep
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from xgds_timeseries import benchmark
+from xgds_timeseries.models import TimeSeriesExample
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the time series queries and serialization on synthetic flights'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='samples per flight')
+        parser.add_argument('--flights', type=int, default=1, help='number of synthetic flights')
+        parser.add_argument('--variant', choices=benchmark.BENCHMARK_VARIANTS, default='plain',
+                            help='plain 1 Hz samples, stateful irregular samples or a dynamic model')
+        parser.add_argument('--window', type=int, default=100000,
+                            help='most samples any case holds in memory at once')
+        parser.add_argument('--repeat', type=int, default=3, help='runs of each case')
+        parser.add_argument('--copy', action='store_true', default=False,
+                            help='generate the samples with COPY, PostgreSQL only')
+        parser.add_argument('--output', default=None, help='path to write the json report to')
+        parser.add_argument('--keep', action='store_true', default=False,
+                            help='keep the synthetic flights; the next run with the same options reuses them')
+
+    def log(self, message):
+        if isinstance(message, dict):
+            message = '%-32s %10d rows %9.3fs %14.0f rows/sec' % (message['name'], message['rows'],
+                                                                    message['seconds_min'],
+                                                                    message['rows_per_second'] or 0)
+        self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['flights'] < 1:
+            raise CommandError('--rows and --flights must be positive')
+        model = benchmark.get_variant_model(options['variant'])
+        flight_model = TimeSeriesExample._meta.get_field('flight').related_model
+        flight_ids = list(flight_model.objects.filter(name__startswith=benchmark.BENCHMARK_FLIGHT_PREFIX)
+                          .order_by('pk').values_list('pk', flat=True))
+        expected_rows = options['rows'] * options['flights'] * (2 if model.dynamic else 1)
+        if len(flight_ids) != options['flights'] or \
+                model.objects.filter(flight_id__in=flight_ids).count() != expected_rows:
+            benchmark.delete_flights()
+            try:
+                flight_ids = benchmark.create_flights(options['flights'],
+                                                      benchmark.get_flight_duration(options['variant'],
+                                                                                    options['rows']))
+            except ValueError as e:
+                raise CommandError(str(e))
+            benchmark.generate_samples(options['variant'], flight_ids, options['rows'], options['copy'],
+                                       log=self.log)
+
+        stateful = model.stateful
+        model.stateful = options['variant'] == 'stateful'
+        try:
+            suite = benchmark.BenchmarkSuite(options['variant'], flight_ids, options['rows'], options['window'],
+                                             options['repeat'])
+            report = suite.run(log=self.log)
+        finally:
+            model.stateful = stateful
+            if not options['keep']:
+                benchmark.delete_flights()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write('Wrote %s' % options['output'])
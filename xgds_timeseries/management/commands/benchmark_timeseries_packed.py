@@ -0,0 +1,82 @@
+#__BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#__END_LICENSE__
+
+"""
+Measure how fast packed lists are built from TimeSeriesExample rows, comparing
+the dictionary loop (pack_dicts over .values()) with values_list and with numpy columns.
+
+./manage.py benchmark_timeseries_packed --rows 1000000
+"""
+
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from xgds_timeseries.models import TimeSeriesExample
+from xgds_timeseries.views import pack_dicts, get_packed_list, get_value_columns
+
+# synthetic rows are written here, well away from any real data
+BENCHMARK_START = datetime.datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark building packed time series values, in rows per second'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='number of TimeSeriesExample rows')
+        parser.add_argument('--keep', action='store_true', default=False, help='keep the synthetic rows afterwards')
+
+    def generate(self, rows, end):
+        TimeSeriesExample.objects.filter(timestamp__gte=BENCHMARK_START, timestamp__lt=end).delete()
+        batch = []
+        for i in range(rows):
+            batch.append(TimeSeriesExample(timestamp=BENCHMARK_START + datetime.timedelta(seconds=i),
+                                           temperature=20 + (i % 100) / 10.0,
+                                           pressure=1000 + (i % 50) / 100.0,
+                                           humidity=float(i % 100)))
+            if len(batch) == 10000:
+                TimeSeriesExample.objects.bulk_create(batch)
+                batch = []
+        TimeSeriesExample.objects.bulk_create(batch)
+
+    def measure(self, label, rows, function):
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+        self.stdout.write('%-30s %8.2fs %12.0f rows/sec' % (label, elapsed, rows / elapsed))
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        end = BENCHMARK_START + datetime.timedelta(seconds=rows)
+        if TimeSeriesExample.objects.filter(timestamp__gte=BENCHMARK_START, timestamp__lt=end).count() != rows:
+            self.stdout.write('Generating %d rows' % rows)
+            self.generate(rows, end)
+
+        manager = TimeSeriesExample.objects
+        fields = manager.get_fields()
+
+        def values():
+            return manager.get_values(BENCHMARK_START, end, downsample=0)
+
+        try:
+            self.measure('dictionaries (before)', rows, lambda: pack_dicts(fields, values()))
+            self.measure('values_list', rows, lambda: get_packed_list(TimeSeriesExample, values(), None))
+            self.measure('numpy columns', rows, lambda: get_value_columns(TimeSeriesExample, values(), None))
+        finally:
+            if not options['keep']:
+                TimeSeriesExample.objects.filter(timestamp__gte=BENCHMARK_START, timestamp__lt=end).delete()
@@ -0,0 +1,59 @@
+#__BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#__END_LICENSE__
+
+"""
+Bulk import a delimited time series file described by a YAML spec.
+
+./manage.py import_timeseries apps/xgds_timeseries/test_data/TimeSeries_Example.yaml \
+    apps/xgds_timeseries/test_data/example.tsv --flight 22
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from xgds_timeseries.importer import import_timeseries
+
+
+class Command(BaseCommand):
+    help = 'Bulk import a delimited time series file described by a YAML spec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('spec', help='path to the YAML spec of the time series model')
+        parser.add_argument('data', help='path to the delimited data file')
+        parser.add_argument('--flight', dest='flight_id', type=int, default=None,
+                            help='id of the flight the data belongs to')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=None,
+                            help='rows to insert at once; defaults to XGDS_TIMESERIES_IMPORT_BATCH_SIZE')
+        parser.add_argument('--header', action='store_true', default=False,
+                            help='skip the first line of the data file')
+        parser.add_argument('--copy', action='store_true', default=False,
+                            help='insert with COPY, PostgreSQL only')
+        parser.add_argument('--no-broadcast', action='store_false', dest='broadcast', default=True,
+                            help='do not broadcast to the live plots')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        try:
+            count = import_timeseries(options['spec'], options['data'],
+                                      flight_id=options['flight_id'],
+                                      batch_size=options['batch_size'],
+                                      broadcast=options['broadcast'],
+                                      use_copy=options['copy'],
+                                      skip_header=options['header'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Imported %d rows in %.2f seconds' % (count, time.time() - start))
@@ -0,0 +1,75 @@
+#__BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#__END_LICENSE__
+
+"""
+Manage the time range partitions of a TimeSeriesModel table, PostgreSQL only.
+The model should set partition_interval to day, week or month.
+
+./manage.py partition_timeseries xgds_braille_app.Environmental --convert
+./manage.py partition_timeseries xgds_braille_app.Environmental --ahead 4
+./manage.py partition_timeseries xgds_braille_app.Environmental --detach-before 2018-01-01 --drop
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from geocamUtil.loader import getModelByName
+
+from xgds_timeseries import partitions
+
+
+class Command(BaseCommand):
+    help = 'Convert a time series table to time range partitions, create future partitions or detach old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='fully qualified model name, ie xgds_braille_app.Environmental')
+        parser.add_argument('--convert', action='store_true', default=False,
+                            help='turn the existing table into a partitioned table; its rows become the first partition')
+        parser.add_argument('--ahead', type=int, default=0,
+                            help='create this many partitions from the current interval on')
+        parser.add_argument('--detach-before', dest='detach_before', default=None,
+                            help='detach the partitions which end on or before this UTC date, YYYY-MM-DD')
+        parser.add_argument('--drop', action='store_true', default=False,
+                            help='drop the detached partitions')
+        parser.add_argument('--concurrently', action='store_true', default=False,
+                            help='detach without blocking queries, PostgreSQL 14 or later')
+        parser.add_argument('--list', action='store_true', default=False,
+                            help='list the partitions')
+
+    def handle(self, *args, **options):
+        model = getModelByName(options['model'])
+        if not model.partition_interval:
+            raise CommandError('Set partition_interval on %s first' % model.get_model_name())
+        try:
+            if options['convert']:
+                legacy = partitions.convert_to_partitioned(model)
+                self.stdout.write('%s is partitioned; its existing rows are in %s' % (model._meta.db_table, legacy))
+            if options['ahead']:
+                created = partitions.create_partitions(model, timezone.now(), options['ahead'])
+                self.stdout.write('Created %d partitions %s' % (len(created), ', '.join(created)))
+            if options['detach_before']:
+                before = datetime.datetime.strptime(options['detach_before'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+                detached = partitions.detach_partitions(model, before, drop=options['drop'],
+                                                        concurrently=options['concurrently'])
+                self.stdout.write('%s %d partitions %s' % ('Dropped' if options['drop'] else 'Detached',
+                                                           len(detached), ', '.join(detached)))
+            if options['list']:
+                for name, upper in sorted(partitions.get_partitions(model), key=lambda p: p[1]):
+                    self.stdout.write('%s\tto %s' % (name, upper if upper else 'MAXVALUE'))
+        except ValueError as e:
+            raise CommandError(str(e))
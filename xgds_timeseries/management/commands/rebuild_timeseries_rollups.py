@@ -0,0 +1,57 @@
+#__BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#__END_LICENSE__
+
+"""
+Backfill the TimeSeriesRollup buckets for existing flights.
+
+./manage.py rebuild_timeseries_rollups
+./manage.py rebuild_timeseries_rollups --model xgds_braille_app.Environmental --flight 22 --flight 23
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from geocamUtil.loader import getModelByName
+
+from xgds_core.util import get_all_subclasses
+from xgds_timeseries.models import TimeSeriesModel, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the rollups for time series models which have rollup = True'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', dest='model_names', default=[],
+                            help='fully qualified model name, ie xgds_braille_app.Environmental; defaults to all')
+        parser.add_argument('--flight', action='append', dest='flight_ids', type=int, default=[],
+                            help='flight id; defaults to all flights with data')
+
+    def handle(self, *args, **options):
+        if options['model_names']:
+            models = [getModelByName(name) for name in options['model_names']]
+        else:
+            models = [m for m in get_all_subclasses(TimeSeriesModel) if not m._meta.abstract]
+
+        for model in models:
+            if not model.get_rollup_resolutions():
+                if options['model_names']:
+                    raise CommandError('%s does not have rollups' % model.get_model_name())
+                continue
+            flight_ids = options['flight_ids']
+            if not flight_ids:
+                flight_ids = model.objects.exclude(flight__isnull=True).order_by().values_list('flight_id', flat=True).distinct()
+            for flight_id in flight_ids:
+                count = rebuild_rollups(model, flight_id)
+                self.stdout.write('%s flight %s: %d rollups' % (model.get_model_name(), flight_id, count))
@@ -0,0 +1,95 @@
+#__BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#__END_LICENSE__
+
+"""
+Report, and optionally create, the indexes that the time series queries need on each TimeSeriesModel table:
+(flight, time field), and with --covering (flight, time field, channels...) so plots can be read from the index alone.
+
+./manage.py timeseries_indexes
+./manage.py timeseries_indexes --model xgds_braille_app.Environmental --covering --create
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+
+from geocamUtil.loader import getModelByName
+
+from xgds_core.util import get_all_subclasses
+from xgds_timeseries.models import TimeSeriesModel, get_flight_time_index
+
+
+class Command(BaseCommand):
+    help = 'Report or create missing (flight, time) and covering indexes of time series tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', dest='model_names', default=[],
+                            help='fully qualified model name, ie xgds_braille_app.Environmental; defaults to all')
+        parser.add_argument('--covering', action='store_true', default=False,
+                            help='also check for an index of (flight, time, channels...)')
+        parser.add_argument('--create', action='store_true', default=False,
+                            help='create the missing indexes')
+
+    def get_wanted_indexes(self, model, covering):
+        """
+        :return: a list of tuples of the field names of the indexes the model should have
+        """
+        index = get_flight_time_index(model)
+        if index is None:
+            return []
+        result = [index]
+        if covering and not model.dynamic:
+            result.append(index + tuple(model.get_channel_names()))
+        return result
+
+    def has_index(self, constraints, columns):
+        """
+        :return: True if an index, unique constraint or primary key starts with the columns
+        """
+        for constraint in constraints.values():
+            if (constraint['index'] or constraint['unique']) and constraint['columns'][:len(columns)] == columns:
+                return True
+        return False
+
+    def handle(self, *args, **options):
+        if options['model_names']:
+            models = [getModelByName(name) for name in options['model_names']]
+        else:
+            models = [m for m in get_all_subclasses(TimeSeriesModel) if not m._meta.abstract and not m._meta.proxy]
+
+        missing_count = 0
+        for model in models:
+            wanted = self.get_wanted_indexes(model, options['covering'])
+            if not wanted and options['model_names']:
+                raise CommandError('%s has no flight field to index' % model.get_model_name())
+            connection = connections[router.db_for_write(model)]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            for fields in wanted:
+                columns = [model._meta.get_field(name).column for name in fields]
+                if self.has_index(constraints, columns):
+                    self.stdout.write('%s: ok (%s)' % (model.get_model_name(), ', '.join(columns)))
+                    continue
+                missing_count += 1
+                if options['create']:
+                    with connection.schema_editor() as schema_editor:
+                        # only the new entry, so no other index is touched
+                        schema_editor.alter_index_together(model, [], [fields])
+                    self.stdout.write('%s: created (%s)' % (model.get_model_name(), ', '.join(columns)))
+                else:
+                    self.stdout.write('%s: MISSING (%s)' % (model.get_model_name(), ', '.join(columns)))
+
+        if missing_count and not options['create']:
+            self.stdout.write('%d missing indexes; run again with --create to create them' % missing_count)
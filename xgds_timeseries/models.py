@@ -14,14 +14,56 @@
 # specific language governing permissions and limitations under the License.
 # __END_LICENSE__
 
+import calendar
 import datetime
+import json
+import logging
+import math
+import numbers
+import threading
+from collections import OrderedDict
+import numpy as np
 from django.conf import settings
-from django.db import models
-from django.db.models import Min, Max
+from django.db import connections, models, router, transaction
+from django.db.models import Min, Max, Count, Avg, Sum, F, Q, Case, When, ExpressionWrapper, FloatField, Value
+from django.db.models.options import normalize_together
+from django.db.models.signals import post_save, post_delete, class_prepared
+from django.dispatch import receiver
 from django.utils import timezone
 
 
 from xgds_core.models import downsample_queryset, BroadcastMixin
+from xgds_timeseries.archive import get_flight_archive, delete_flight_archive, ArchiveValues, ARCHIVE_TIME
+from xgds_timeseries.cache import record_samples_changed
+from xgds_timeseries.fields import Float32Field, ScaledIntegerField, CHANNEL_DTYPES
+from xgds_timeseries.instrumentation import instrument_method
+from xgds_timeseries.util import get_epoch_microseconds, asof_indices, get_histogram_edges, get_percentile_key, \
+    StatisticsAccumulator, DEFAULT_PERCENTILES, DEFAULT_HISTOGRAM_BINS, Resampler
+
+logger = logging.getLogger(__name__)
+
+
+NUMERIC_FIELD_TYPES = ('FloatField', 'DecimalField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+                       'PositiveIntegerField', 'PositiveSmallIntegerField')
+
+
+def get_epoch_seconds(the_time):
+    """
+    :param the_time: a timezone aware datetime
+    :return: the whole number of seconds since the epoch
+    """
+    return calendar.timegm(the_time.utctimetuple())
+
+
+def get_bucket_start(the_time, resolution):
+    """
+    :param the_time: a timezone aware datetime
+    :param resolution: the bucket width in seconds
+    :return: the timezone aware start of the bucket containing the_time
+    """
+    epoch_seconds = get_epoch_seconds(the_time)
+    epoch_seconds -= epoch_seconds % resolution
+    return datetime.datetime.utcfromtimestamp(epoch_seconds).replace(tzinfo=timezone.utc)
 
 
 class ChannelDescription(object):
@@ -30,19 +72,26 @@ class ChannelDescription(object):
     """
 
     def __init__(self, label, units=None, global_min=None, global_max=None,
-                 interval=settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS):
+                 interval=settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS, precision=None, dtype=None):
         """
         :param label: The label will be shown with plots in the UI
         :param units: The units for the channel, ie meter
         :param global_min: The global minimum
         :param global_max: The global maximum
         :param interval: The expected time interval between samples in seconds
+        :param precision: The decimal places the json endpoints round the values to, or None for all of them
+        :param dtype: float64, float32 or scaled, how the channel is stored, see xgds_timeseries.fields; float32
+                      channels are also sent as float32 in the binary format.  None to take it from the model field.
         """
+        if dtype is not None and dtype not in CHANNEL_DTYPES:
+            raise ValueError('Unknown dtype %s' % dtype)
         self.label = label
         self.units = units
         self.global_min = global_min
         self.global_max = global_max
         self.interval = interval
+        self.precision = precision
+        self.dtype = dtype
 
     def __repr__(self):
         return '%s: [units: %s, gmin: %s, gmax: %s, interval: %s]' % (self.label, self.units, self.global_min, self.global_max, self.interval)
@@ -51,6 +100,26 @@ class ChannelDescription(object):
         return self.__repr__()
 
 
+def iterate_value_chunks(queryset, chunk_size):
+    """
+    Read the rows of a values_list QuerySet in lists of chunk_size rows, without caching them in the QuerySet.
+    On PostgreSQL this uses a server side cursor.
+    """
+    try:
+        rows = queryset.iterator(chunk_size=chunk_size)
+    except TypeError:
+        # before Django 2.0 iterator() did not take a chunk size
+        rows = queryset.iterator()
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 class TimeSeriesModelManager(models.Manager):
     """
     This is really a manager for many time series samples
@@ -104,6 +173,18 @@ class TimeSeriesModelManager(models.Manager):
         fields.extend(channel_names)
         return fields
 
+    def get_packed_fields(self, channel_names=None):
+        """
+        Get the fields of packed values, in order.  The values of a dynamic model are pivoted by time and have no pk,
+        so theirs are the timestamp and the channels.
+        :param channel_names: the names of the channels to include
+        :return: the list of field names
+        """
+        fields = self.get_fields(channel_names)
+        if self.model.dynamic:
+            fields.remove('pk')
+        return fields
+
     def get_flight_data(self, flight_ids, downsample=0):
         """
         This returns a QuerySet including the full model instances for the specified flight ids.
@@ -112,9 +193,41 @@ class TimeSeriesModelManager(models.Manager):
         :return: QuerySet with all of the model instances for the specified flight ids
         """
         result = self.filter(flight_id__in=flight_ids)
+        result = self.filter_partitions(result, flight_ids)
         result = downsample_queryset(result, downsample, self.model.get_time_field_name())
         return result
 
+    def get_flight_time_bounds(self, flight_ids):
+        """
+        This HITS THE DATABASE to get the first and last times of the samples of flights, from the (flight, time)
+        index.  The recorded start and end times of a flight are not used, since samples may fall outside them.
+        :param flight_ids: list of ids of flights (pks)
+        :return: (first time, last time), or None if the flights have no samples
+        """
+        time_field_name = self.get_time_field_name()
+        bounds = self.filter(flight_id__in=flight_ids).order_by().aggregate(first_time=Min(time_field_name),
+                                                                            last_time=Max(time_field_name))
+        if bounds['first_time'] is None:
+            return None
+        return bounds['first_time'], bounds['last_time']
+
+    def filter_partitions(self, queryset, flight_ids):
+        """
+        For a partitioned model, add the time range of the samples of the flights to a query by flight, so the
+        database only touches the partitions that hold them.  The range is read first, with one index lookup per
+        partition, so it cannot leave out any sample of the flights saved before it was read.
+        :param queryset: a QuerySet filtered by the flights
+        :param flight_ids: list of ids of flights (pks)
+        :return: the QuerySet
+        """
+        if not self.model.partition_interval or not flight_ids:
+            return queryset
+        bounds = self.get_flight_time_bounds(flight_ids)
+        if bounds is None:
+            return queryset
+        time_field_name = self.get_time_field_name()
+        return queryset.filter(**{'%s__gte' % time_field_name: bounds[0], '%s__lte' % time_field_name: bounds[1]})
+
     def get_flight_values(self, flight_ids, channel_names=None, downsample=0):
         """
         This HITS THE DATABASE to get a QuerySet of dictionaries which includes the timestamps and the
@@ -122,34 +235,59 @@ class TimeSeriesModelManager(models.Manager):
         :param flight_ids: list of ids of flights (pks)
         :param channel_names: list of names of channels
         :param downsample: number of seconds to skip between data samples
-        :return: A QuerySet of dictionaries of the values which include timestamp and selected channels
+        :return: A QuerySet (or list, if served from rollups, or ArchiveValues, if the flights are archived) of
+                 dictionaries of the values which include timestamp and selected channels
         """
+        archive_values = self.get_archive_values(flight_ids=flight_ids, channel_names=channel_names,
+                                                 downsample=downsample)
+        if archive_values is not None:
+            return archive_values
+        rollup_values = self.get_rollup_values(flight_ids=flight_ids, channel_names=channel_names,
+                                               downsample=downsample)
+        if rollup_values is not None:
+            return rollup_values
         return self.get_flight_data(flight_ids, downsample).values(*self.get_fields(channel_names))
 
+    def get_dynamic_pivot(self, queryset, channel_names=None, dynamic_value=None, dynamic_separator=None):
+        """
+        Pivot the rows of a dynamic model in the database, with conditional aggregation grouped by time.
+        A dynamic model stores one row per channel per sample; the name of the channel is in the dynamic_separator
+        field and its value is in the dynamic_value field.
+        :param queryset: the QuerySet of rows of the dynamic model
+        :param channel_names: the channels to include, defaults to all of them
+        :param dynamic_value: the name of the value field, defaults to the model's dynamic_value
+        :param dynamic_separator: the name of the channel name field, defaults to the model's dynamic_separator
+        :return: A QuerySet of dictionaries, one per time, of the time and the value of each channel
+        """
+        if not channel_names:
+            channel_names = self.get_channel_names()
+        if not dynamic_value:
+            dynamic_value = self.model.dynamic_value
+        if not dynamic_separator:
+            dynamic_separator = self.model.dynamic_separator
+        time_field_name = self.get_time_field_name()
+
+        pivot = {}
+        for name in channel_names:
+            pivot[name] = Max(Case(When(then=F(dynamic_value), **{dynamic_separator: name})))
+        # clear the ordering first so it is not added to the GROUP BY
+        queryset = queryset.filter(**{'%s__in' % dynamic_separator: channel_names}).order_by()
+        return queryset.values(time_field_name).annotate(**pivot).order_by(time_field_name)
+
     def get_dynamic_flight_values(self, flight_ids, channel_names=None, dynamic_value=None, dynamic_separator=None,
                                   downsample=0):
         """
-
-        :param flight_ids:
-        :param channel_names:
-        :param dynamic_value:
-        :param dynamic_separator:
+        This HITS THE DATABASE to get a QuerySet of dictionaries which includes the timestamps and the
+        values for the specified channels of a dynamic model, pivoted in the database.  See get_dynamic_pivot.
+        :param flight_ids: list of ids of flights (pks)
+        :param channel_names: list of names of channels
+        :param dynamic_value: the name of the value field, defaults to the model's dynamic_value
+        :param dynamic_separator: the name of the channel name field, defaults to the model's dynamic_separator
         :param downsample: number of seconds to skip between data samples
-        :return:
-        """
-        timestamps = {}
-        query = self.get_flight_data(flight_ids, downsample)
-        for q in query:
-            if q.timestamp not in timestamps:
-                timestamps[q.timestamp] = {
-                    "timestamp": q.timestamp,
-                    getattr(q, dynamic_separator): getattr(q, dynamic_value),
-                }
-            else:
-                timestamps[q.timestamp][getattr(q, dynamic_separator)] = getattr(q, dynamic_value)
-        timestamps_keys = sorted(list(timestamps.keys()))
-        timestamps_as_list = [timestamps[x] for x in timestamps_keys]
-        return timestamps_as_list
+        :return: A QuerySet of dictionaries, one per time, of the time and the value of each channel
+        """
+        return self.get_dynamic_pivot(self.get_flight_data(flight_ids, downsample), channel_names,
+                                      dynamic_value, dynamic_separator)
 
     def get_data(self, start_time=None, end_time=None, flight_ids=None, filter_dict=None, downsample=0):
         """
@@ -164,12 +302,12 @@ class TimeSeriesModelManager(models.Manager):
         result = self
         if flight_ids:
             result = result.filter(flight_id__in=flight_ids)
+            if not start_time and not end_time:
+                result = self.filter_partitions(result, flight_ids)
         if start_time:
-            filter_dict = {'%s__gte'% self.get_time_field_name():start_time}
-            result = result.filter(**filter_dict)
+            result = result.filter(**{'%s__gte' % self.get_time_field_name(): start_time})
         if end_time:
-            filter_dict = {'%s__lte'% self.get_time_field_name():end_time}
-            result = result.filter(**filter_dict)
+            result = result.filter(**{'%s__lte' % self.get_time_field_name(): end_time})
         if filter_dict:
             result = result.filter(**filter_dict)
 
@@ -178,30 +316,23 @@ class TimeSeriesModelManager(models.Manager):
         return result
 
     def get_dynamic_values(self, start_time=None, end_time=None, flight_ids=None, filter_dict=None,
-                           channel_names=None, downsample=0):
-        """
-
-        :param start_time:
-        :param end_time:
-        :param flight_ids:
-        :param filter_dict:
-        :param channel_names:
-        :param downsample:
-        :return:
-        """
-        timestamps = {}
-        query = self.get_data(start_time, end_time, flight_ids, filter_dict, downsample)
-        for q in query:
-            if q.time_stamp not in timestamps:
-                timestamps[q.time_stamp] = {
-                    "time_stamp": q.time_stamp,
-                    getattr(q, q.dynamic_separator): getattr(q, q.dynamic_value),
-                }
-            else:
-                timestamps[q.time_stamp][getattr(q, q.dynamic_separator)] = getattr(q, q.dynamic_value)
-        timestamps_keys = sorted(list(timestamps.keys()))
-        timestamps_as_list = [timestamps[x] for x in timestamps_keys]
-        return timestamps_as_list
+                           channel_names=None, downsample=0, dynamic_value=None, dynamic_separator=None):
+        """
+        This HITS THE DATABASE to get a QuerySet of dictionaries which includes the timestamps and the
+        values for the specified channels of a dynamic model which match the filter, pivoted in the database.
+        See get_dynamic_pivot.
+        :param start_time: The start time, timezone aware
+        :param end_time: The end time, timezone aware
+        :param flight_ids: the list of flight ids
+        :param filter_dict: A dictionary of other filter terms
+        :param channel_names: list of names of channels
+        :param downsample: Number of seconds to downsample or skip when filtering data
+        :param dynamic_value: the name of the value field, defaults to the model's dynamic_value
+        :param dynamic_separator: the name of the channel name field, defaults to the model's dynamic_separator
+        :return: A QuerySet of dictionaries, one per time, of the time and the value of each channel
+        """
+        return self.get_dynamic_pivot(self.get_data(start_time, end_time, flight_ids, filter_dict, downsample),
+                                      channel_names, dynamic_value, dynamic_separator)
 
     def get_values(self, start_time=None, end_time=None, flight_ids=None, filter_dict=None, channel_names=None,
                    downsample=0):
@@ -213,46 +344,151 @@ class TimeSeriesModelManager(models.Manager):
         :param flight_ids: the list of flight ids
         :param filter_dict: A dictionary of other filter terms
         :param channel_names: list of names of channels
-        :return: A QuerySet of dictionaries of the values which include timestamp and selected channels
+        :return: A QuerySet (or list, if served from rollups, or ArchiveValues, if the flights are archived) of
+                 dictionaries of the values which include timestamp and selected channels
         """
+        if not filter_dict:
+            archive_values = self.get_archive_values(start_time, end_time, flight_ids, channel_names, downsample)
+            if archive_values is not None:
+                return archive_values
+            rollup_values = self.get_rollup_values(start_time, end_time, flight_ids, channel_names, downsample)
+            if rollup_values is not None:
+                return rollup_values
         return self.get_data(start_time, end_time, flight_ids, filter_dict, downsample).values(*self.get_fields(channel_names))
 
+    def get_flight_archives(self, flight_ids):
+        """
+        Get the archives of flights, see xgds_timeseries.archive
+        :param flight_ids: the list of flight ids
+        :return: a list of FlightArchive, or None if archives are off or any flight is not archived
+        """
+        if not settings.XGDS_TIMESERIES_ARCHIVE_DIR or not flight_ids or self.model.dynamic:
+            return None
+        result = []
+        for flight_id in set([str(f) for f in flight_ids]):
+            archive = get_flight_archive(self.model.get_model_name(), flight_id)
+            if archive is None:
+                return None
+            result.append(archive)
+        return result
+
+    def get_archive_values(self, start_time=None, end_time=None, flight_ids=None, channel_names=None, downsample=0):
+        """
+        Read the values from the memory mapped archives of the flights instead of the database.
+        :param start_time: The start time, timezone aware
+        :param end_time: The end time, timezone aware
+        :param flight_ids: the list of flight ids
+        :param channel_names: list of names of channels
+        :param downsample: number of seconds to skip between data samples
+        :return: ArchiveValues, which iterate like get_values, or None if the flights are not all archived
+        """
+        archives = self.get_flight_archives(flight_ids)
+        if archives is None:
+            return None
+        if not channel_names:
+            channel_names = self.get_channel_names()
+        for archive in archives:
+            if not set(channel_names).issubset(archive.meta['channels']):
+                # the channels changed after the flight was archived
+                return None
+        return ArchiveValues(archives, self.get_time_field_name(), channel_names, start_time, end_time, downsample)
+
+    def get_rollup_resolution(self, downsample):
+        """
+        Get the rollup resolution which matches the requested downsample.  Thinning a finer level would read one rollup
+        per channel and bucket, more rows than the raw downsampled samples, so only an exact match is used.
+        :param downsample: number of seconds to skip between data samples
+        :return: the resolution in seconds, or None if no rollup level can be used
+        """
+        if downsample and downsample in self.model.get_rollup_resolutions():
+            return downsample
+        return None
+
+    @instrument_method
+    def get_rollup_values(self, start_time=None, end_time=None, flight_ids=None, channel_names=None, downsample=0):
+        """
+        This HITS THE DATABASE to read the precomputed rollups instead of the raw samples.
+        Rollups are only used when the model has a rollup level of the downsample, flight ids are given and every
+        flight has been rebuilt with rebuild_rollups since its samples last changed, since only then do its rollups
+        cover exactly its samples.
+        Each bucket is reported like a raw sample, using the value named by XGDS_TIMESERIES_ROLLUP_VALUE.
+        :param start_time: The start time, timezone aware
+        :param end_time: The end time, timezone aware
+        :param flight_ids: the list of flight ids
+        :param channel_names: list of names of channels
+        :param downsample: number of seconds to skip between data samples
+        :return: A list of dictionaries like get_values returns, or None if the rollups cannot answer this query
+        """
+        resolution = self.get_rollup_resolution(downsample)
+        if not resolution or not flight_ids:
+            return None
+        if not channel_names:
+            channel_names = self.get_channel_names()
+
+        if len(get_rolled_up_flight_ids(self.model, flight_ids)) < len(set(flight_ids)):
+            return None
+
+        rollups = TimeSeriesRollup.objects.filter(model_name=self.model.get_model_name(),
+                                                  flight_id__in=flight_ids,
+                                                  resolution=resolution,
+                                                  channel__in=channel_names)
+        if start_time:
+            rollups = rollups.filter(last_time__gte=start_time)
+        if end_time:
+            rollups = rollups.filter(first_time__lte=end_time)
+
+        value_kind = settings.XGDS_TIMESERIES_ROLLUP_VALUE
+        time_field_name = self.get_time_field_name()
+        samples = OrderedDict()
+        for rollup in rollups.order_by('bucket_start', 'flight_id'):
+            key = (rollup.bucket_start, rollup.flight_id)
+            sample = samples.get(key)
+            if sample is None:
+                sample = {'pk': rollup.last_pk if value_kind == 'last' else rollup.first_pk,
+                          time_field_name: rollup.get_time(value_kind)}
+                for name in channel_names:
+                    sample[name] = None
+                samples[key] = sample
+            sample[rollup.channel] = rollup.get_value(value_kind)
+        return list(samples.values())
+
     def get_data_at_time(self, time, flight_ids=None, filter_dict=None):
         """
-        This returns a QuerySet including the full model instances for the specified flight ids and other filters.
-        The data will be the closest value at this time or before,
-        given this setting: GEOCAM_TRACK_CLOSEST_POSITION_MAX_DIFFERENCE_SECONDS
-        Unless this is a stateful model, in which case it will take the previous value for the flight
+        This returns a QuerySet including the full model instances for the specified flight ids and other filters,
+        newest first, so the first one is the closest value at this time or before.
+        The data must be within this setting of the time: GEOCAM_TRACK_CLOSEST_POSITION_MAX_DIFFERENCE_SECONDS
+        Unless this is a stateful model, in which case it can be any previous value for the flight
         :param time: The time, timezone aware
         :param flight_ids: the list of flight ids
         :param filter_dict: A dictionary of other filter terms
-        :return: QuerySet with all of the model instances that match the filters
+        :return: QuerySet with all of the model instances that match the filters, latest first
         """
         result = self
         if not time:
             raise Exception('Time is required')
         if flight_ids:
             result = result.filter(flight_id__in=flight_ids)
+        if filter_dict:
+            result = result.filter(**filter_dict)
+        time_field_name = self.get_time_field_name()
         if self.model.stateful:
-            filter_dict = {'%s__lte' % self.get_time_field_name(): time}
+            time_filter = {'%s__lte' % time_field_name: time}
         else:
             # time must be gte the time passed in less the delta
             min_time = time - datetime.timedelta(seconds=settings.GEOCAM_TRACK_CLOSEST_POSITION_MAX_DIFFERENCE_SECONDS)
-            filter_dict = {'%s__gte' % self.get_time_field_name(): min_time,
-                           '%s__lte' % self.get_time_field_name(): time}
+            time_filter = {'%s__gte' % time_field_name: min_time,
+                           '%s__lte' % time_field_name: time}
 
-        result = result.filter(**filter_dict)
-        if not self.model.stateful:
-            result = result.order_by('-%s' % self.get_time_field_name())
-        return result
+        result = result.filter(**time_filter)
+        # descending on the (flight, time) index, so LIMIT 1 is a single index seek
+        return result.order_by('-%s' % time_field_name, '-pk')
 
     def get_values_at_time(self, time=None, flight_ids=None, filter_dict=None, channel_names=None):
         """
         This HITS THE DATABASE to get a QuerySet of dictionaries which includes the timestamps and the
-        values for the specified channels which match the filter
+        values for the specified channels which match the filter, latest first
         The data will be the closest value at this time or before,
         given this setting: GEOCAM_TRACK_CLOSEST_POSITION_MAX_DIFFERENCE_SECONDS
-        Unless this is a stateful model, in which case it will take the previous value for the flight
         :param time: The time, timezone aware
         :param flight_ids: the list of flight ids
         :param filter_dict: A dictionary of other filter terms
@@ -261,9 +497,147 @@ class TimeSeriesModelManager(models.Manager):
         """
         return self.get_data_at_time(time, flight_ids, filter_dict).values(*self.get_fields(channel_names))
 
+    @instrument_method
+    def get_nearest_values(self, time, flight_ids=None, filter_dict=None, channel_names=None):
+        """
+        This HITS THE DATABASE to get the dictionary of the values closest to this time, at or before it.
+        See get_data_at_time.  Dynamic models are pivoted at the nearest time.
+        :param time: The time, timezone aware
+        :param flight_ids: the list of flight ids
+        :param filter_dict: A dictionary of other filter terms
+        :param channel_names: list of names of channels
+        :return: a dictionary of the values which include timestamp and selected channels, or None
+        """
+        data = self.get_data_at_time(time, flight_ids, filter_dict)
+        if self.model.dynamic:
+            time_field_name = self.get_time_field_name()
+            nearest_time = data.values_list(time_field_name, flat=True).first()
+            if nearest_time is None:
+                return None
+            return self.get_dynamic_pivot(data.filter(**{time_field_name: nearest_time}), channel_names).first()
+        return data.values(*self.get_fields(channel_names)).first()
+
+    @instrument_method
+    def get_values_at_times(self, times, flight_ids=None, filter_dict=None, channel_names=None):
+        """
+        This HITS THE DATABASE at most twice to get the values closest to each of many times, at or before them,
+        with the same rules as get_data_at_time.  The samples covering the times are read in one ordered range
+        and matched to the times with a binary search, instead of one query per time.
+        :param times: a list of timezone aware times
+        :param flight_ids: the list of flight ids
+        :param filter_dict: A dictionary of other filter terms
+        :param channel_names: list of names of channels
+        :return: a list with a dictionary of values, or None, for each time in the order given
+        """
+        if not times:
+            return []
+        time_field_name = self.get_time_field_name()
+        first_time = min(times)
+        last_time = max(times)
+        data = self.get_data(flight_ids=flight_ids, filter_dict=filter_dict)
+        tolerance = None
+        if self.model.stateful:
+            # the samples from the one at or before the first time on
+            nearest = self.get_data_at_time(first_time, flight_ids, filter_dict).values_list(time_field_name,
+                                                                                             flat=True).first()
+            if nearest is not None:
+                first_time = nearest
+        else:
+            max_difference = settings.GEOCAM_TRACK_CLOSEST_POSITION_MAX_DIFFERENCE_SECONDS
+            first_time -= datetime.timedelta(seconds=max_difference)
+            tolerance = max_difference * 1000000
+        data = data.filter(**{'%s__gte' % time_field_name: first_time, '%s__lte' % time_field_name: last_time})
+
+        if self.model.dynamic:
+            samples = list(self.get_dynamic_pivot(data, channel_names))
+        else:
+            samples = list(data.order_by(time_field_name, 'pk').values(*self.get_fields(channel_names)))
+        sample_times = get_epoch_microseconds([sample[time_field_name] for sample in samples])
+        indices = asof_indices(sample_times, get_epoch_microseconds(times), tolerance)
+        return [samples[index] if index >= 0 else None for index in indices]
+
+    @instrument_method
+    def get_values_since(self, since_time=None, since_pk=None, flight_ids=None, filter_dict=None, channel_names=None,
+                         limit=None):
+        """
+        This HITS THE DATABASE to get the values saved after a (time, pk) cursor, oldest first, for polling.
+        Each poll reads forward from the cursor on the time index, so it costs only the new rows.
+        Dynamic models are pivoted by time, and the pk of each pivoted value is the largest pk of its rows; channel
+        rows saved at the time of the cursor after the poll come back as a new value at that time.
+        :param since_time: the time of the cursor, timezone aware; None to start at the beginning
+        :param since_pk: the pk of the cursor; None for every row after since_time
+        :param flight_ids: the list of flight ids
+        :param filter_dict: A dictionary of other filter terms
+        :param channel_names: list of names of channels
+        :param limit: the maximum number of values, defaults to XGDS_TIMESERIES_SINCE_LIMIT
+        :return: (a list of dictionaries of the values, the next cursor as a (time, pk) tuple)
+        """
+        if not limit:
+            limit = settings.XGDS_TIMESERIES_SINCE_LIMIT
+        time_field_name = self.get_time_field_name()
+        data = self.get_data(flight_ids=flight_ids, filter_dict=filter_dict)
+        if since_time is not None:
+            after = Q(**{'%s__gt' % time_field_name: since_time})
+            if since_pk is not None:
+                after |= Q(**{time_field_name: since_time, 'pk__gt': since_pk})
+            data = data.filter(after)
+
+        if self.model.dynamic:
+            values = list(self.get_dynamic_pivot(data, channel_names).annotate(last_pk=Max('pk'))[:limit])
+            for value in values:
+                value['pk'] = value.pop('last_pk')
+        else:
+            values = list(data.order_by(time_field_name, 'pk').values(*self.get_fields(channel_names))[:limit])
+        if not values:
+            return values, (since_time, since_pk)
+        last = values[-1]
+        return values, (last[time_field_name], last['pk'])
+
+    def get_statistics_field_names(self, channel_names=None):
+        """
+        Get the names of the channels which hold numbers, so count, mean and stddev can be computed for them
+        :param channel_names: the names of the channels to include
+        :return: the list of numeric channel names
+        """
+        if not channel_names:
+            channel_names = self.get_channel_names()
+        result = []
+        for name in channel_names:
+            try:
+                if self.model._meta.get_field(name).get_internal_type() in NUMERIC_FIELD_TYPES:
+                    result.append(name)
+            except models.FieldDoesNotExist:
+                continue
+        return result
+
+    def get_channel_scales(self, channel_names=None):
+        """
+        :param channel_names: the names of the channels to include
+        :return: a dictionary of channel name to scale, for the channels stored as ScaledIntegerFields
+        """
+        result = {}
+        for name in channel_names or self.get_channel_names() or []:
+            field = self.model.get_channel_field(name)
+            if isinstance(field, ScaledIntegerField):
+                result[name] = field.scale
+        return result
+
+    def get_channel_expression(self, channel_name):
+        """
+        Aggregates like Avg and Sum skip the conversion of ScaledIntegerFields, so they aggregate this instead
+        :param channel_name: the name of the channel
+        :return: an expression of the value of the channel, divided by its scale in SQL if it is scaled
+        """
+        scale = self.get_channel_scales([channel_name]).get(channel_name)
+        if scale is None:
+            return F(channel_name)
+        return ExpressionWrapper(F(channel_name) / Value(float(scale)), output_field=FloatField())
+
+    @instrument_method
     def get_min_max(self, start_time=None, end_time=None, flight_ids=None, filter_dict=None, channel_names=None):
         """
-        This HITS THE DATABASE to get a dictionary of min/max values for the channels.  Timestamp is always provided.
+        This HITS THE DATABASE ONCE to get a dictionary of min/max values for the channels.  Timestamp is always provided.
+        Numeric channels also include count, mean and stddev (population).
         :param start_time: The start time, timezone aware
         :param end_time: The end time, timezone aware
         :param flight_ids: the list of flight ids
@@ -271,41 +645,427 @@ class TimeSeriesModelManager(models.Manager):
         :param channel_names: list of names of channels
         :return @dictionary: A dictionary, or None
         """
+        if not filter_dict:
+            archive_values = self.get_archive_values(start_time, end_time, flight_ids, channel_names)
+            if archive_values is not None:
+                return archive_values.get_min_max()
+        if flight_ids and not (start_time or end_time or filter_dict):
+            summary = self.get_summary_min_max(flight_ids, channel_names)
+            if summary is not None:
+                return summary
+
         filtered_data = self.get_data(start_time, end_time, flight_ids, filter_dict)
-        if not filtered_data.exists():
-            return None
         fields = self.get_fields(channel_names)
+        statistics_fields = self.get_statistics_field_names(channel_names)
+
+        aggregates = {'pk__rows': Count('pk')}
+        for field in fields:
+            aggregates['%s__min' % field] = Min(field)
+            aggregates['%s__max' % field] = Max(field)
+        for field in statistics_fields:
+            value = self.get_channel_expression(field)
+            aggregates['%s__count' % field] = Count(field)
+            aggregates['%s__avg' % field] = Avg(value)
+            # stddev is derived from the mean of the squares because not every backend has STDDEV_POP
+            aggregates['%s__avgsq' % field] = Avg(value * value)
+        aggregated = filtered_data.aggregate(**aggregates)
+
+        if not aggregated['pk__rows']:
+            return None
         result = {}
         for field in fields:
-            result[field] = {'min': filtered_data.aggregate(Min(field))['%s__min' % field],
-                             'max': filtered_data.aggregate(Max(field))['%s__max' % field]}
+            result[field] = {'min': aggregated['%s__min' % field],
+                             'max': aggregated['%s__max' % field]}
+        for field in statistics_fields:
+            mean = aggregated['%s__avg' % field]
+            mean_square = aggregated['%s__avgsq' % field]
+            stddev = None
+            if mean is not None and mean_square is not None:
+                stddev = math.sqrt(max(mean_square - mean * mean, 0.0))
+            result[field].update({'count': aggregated['%s__count' % field],
+                                  'mean': mean,
+                                  'stddev': stddev})
         return result
 
+    @instrument_method
     def get_dynamic_min_max(self, start_time=None, end_time=None, flight_ids=None, filter_dict=None, channel_names=None,
                             dynamic_value=None, dynamic_separator=None):
-
-        def dynamic_aggregate(field_name, data, func):
-            custom_data = [getattr(x, dynamic_value) for x in data if getattr(x, dynamic_separator) == field_name]
-            return func(custom_data)
+        """
+        This HITS THE DATABASE TWICE to get a dictionary of min/max values for the channels of a dynamic model,
+        grouped by the dynamic_separator.  Timestamp is always provided.
+        :param start_time: The start time, timezone aware
+        :param end_time: The end time, timezone aware
+        :param flight_ids: the list of flight ids
+        :param filter_dict: A dictionary of other filter terms
+        :param channel_names: list of names of channels
+        :param dynamic_value: the name of the value field, defaults to the model's dynamic_value
+        :param dynamic_separator: the name of the channel name field, defaults to the model's dynamic_separator
+        :return @dictionary: A dictionary, or None
+        """
+        if not channel_names:
+            channel_names = self.get_channel_names()
+        if not dynamic_value:
+            dynamic_value = self.model.dynamic_value
+        if not dynamic_separator:
+            dynamic_separator = self.model.dynamic_separator
+        if flight_ids and not (start_time or end_time or filter_dict):
+            summary = self.get_summary_min_max(flight_ids, channel_names)
+            if summary is not None:
+                return summary
 
         filtered_data = self.get_data(start_time, end_time, flight_ids, filter_dict)
-        if not filtered_data.exists():
+        fields = ['pk', self.get_time_field_name()]
+        aggregates = {'pk__rows': Count('pk')}
+        for field in fields:
+            aggregates['%s__min' % field] = Min(field)
+            aggregates['%s__max' % field] = Max(field)
+        aggregated = filtered_data.aggregate(**aggregates)
+        if not aggregated['pk__rows']:
+            return None
+
+        result = {}
+        for field in fields:
+            result[field] = {'min': aggregated['%s__min' % field],
+                             'max': aggregated['%s__max' % field]}
+        for name in channel_names:
+            result[name] = {'min': None, 'max': None}
+
+        channels = filtered_data.filter(**{'%s__in' % dynamic_separator: channel_names}).order_by()
+        channels = channels.values(dynamic_separator).annotate(channel_min=Min(dynamic_value),
+                                                              channel_max=Max(dynamic_value))
+        for channel in channels:
+            result[channel[dynamic_separator]] = {'min': channel['channel_min'],
+                                                  'max': channel['channel_max']}
+        return result
+
+    @instrument_method
+    def get_statistics(self, start_time=None, end_time=None, flight_ids=None, filter_dict=None, channel_names=None,
+                       downsample=0, percentiles=DEFAULT_PERCENTILES, bins=DEFAULT_HISTOGRAM_BINS):
+        """
+        Get the count, mean, stddev (population), min, max, percentiles and a histogram of each numeric channel, with
+        the same filters as get_data.  On PostgreSQL this HITS THE DATABASE TWICE: one pass for the moments and exact
+        percentiles, and one for the histograms of every channel.  Otherwise the values are read in chunks with
+        get_min_max first and the percentiles are approximate, see StatisticsAccumulator.
+        :param start_time: The start time, timezone aware
+        :param end_time: The end time, timezone aware
+        :param flight_ids: the list of flight ids
+        :param filter_dict: A dictionary of other filter terms
+        :param channel_names: list of names of channels
+        :param downsample: Number of seconds to downsample or skip when filtering data
+        :param percentiles: the percentiles to compute, 0 to 100
+        :param bins: the number of evenly spaced histogram bins between the min and the max of each channel
+        :return: a dictionary of channel name to a dictionary of statistics, or None if there are no values
+        """
+        for percentile in percentiles:
+            if not 0 <= percentile <= 100:
+                raise ValueError('Percentiles must be between 0 and 100, not %s' % percentile)
+        if bins < 1:
+            raise ValueError('There must be at least one histogram bin')
+        if self.model.dynamic:
+            channel_names = channel_names or self.get_channel_names()
+        else:
+            channel_names = self.get_statistics_field_names(channel_names)
+        if not channel_names:
             return None
 
+        connection = connections[router.db_for_read(self.model)]
+        if connection.vendor == 'postgresql' and not self.model.dynamic and \
+                (filter_dict or self.get_flight_archives(flight_ids) is None):
+            return self.get_database_statistics(connection, self.get_data(start_time, end_time, flight_ids,
+                                                                          filter_dict, downsample),
+                                                channel_names, percentiles, bins)
+        return self.get_streaming_statistics(start_time, end_time, flight_ids, filter_dict, channel_names, downsample,
+                                             percentiles, bins)
+
+    def get_database_statistics(self, connection, queryset, channel_names, percentiles, bins):
+        """
+        Compute the statistics of get_statistics in PostgreSQL, around the SQL of the filtered queryset
+        """
+        quote_name = connection.ops.quote_name
+        sql, params = queryset.order_by().values_list(*channel_names).query.sql_with_params()
+        fractions = [p / 100.0 for p in percentiles]
+        scales = self.get_channel_scales(channel_names)
+        columns = {}
+        for name in channel_names:
+            columns[name] = 's.%s' % quote_name(name)
+            if name in scales:
+                columns[name] = '(%s / %d.0)' % (columns[name], scales[name])
+
+        selects = []
+        select_params = []
+        for name in channel_names:
+            column = columns[name]
+            selects.append('COUNT(%s), AVG(%s), STDDEV_POP(%s), MIN(%s), MAX(%s)' % ((column,) * 5))
+            selects.append('PERCENTILE_CONT(%%s::float8[]) WITHIN GROUP (ORDER BY %s)' % column)
+            select_params.append(fractions)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT %s FROM (%s) s' % (', '.join(selects), sql), select_params + list(params))
+            row = cursor.fetchone()
+
         result = {}
-        for field in self.get_fields(channel_names):
-            if field in channel_names:
-                result[field] = {
-                    'min': dynamic_aggregate(field, filtered_data, min),
-                    'max': dynamic_aggregate(field, filtered_data, max),
-                }
+        ranges = []
+        for index, name in enumerate(channel_names):
+            count, mean, stddev, minimum, maximum, values = row[index * 6:index * 6 + 6]
+            if not count:
+                result[name] = StatisticsAccumulator(0, 0, bins).get_result(percentiles)
+                continue
+            edges = get_histogram_edges(float(minimum), float(maximum), bins)
+            ranges.append((index, name, edges))
+            result[name] = {'count': count,
+                            'min': minimum if isinstance(minimum, numbers.Integral) else float(minimum),
+                            'max': maximum if isinstance(maximum, numbers.Integral) else float(maximum),
+                            'mean': float(mean),
+                            'stddev': float(stddev),
+                            'percentiles': OrderedDict([(get_percentile_key(p), v) for p, v in zip(percentiles, values)]),
+                            'histogram': {'edges': edges.tolist(), 'counts': [0] * bins}}
+        if not ranges:
+            return None
+
+        # one grouping set per channel, so one pass counts the bins of every channel
+        buckets = []
+        bucket_params = []
+        for index, name, edges in ranges:
+            buckets.append('LEAST(WIDTH_BUCKET(%s::float8, %%s, %%s, %%s), %%s) AS b%d' % (columns[name], index))
+            bucket_params.extend([float(edges[0]), float(edges[-1]), bins, bins])
+        bucket_names = ['b%d' % index for index, name, edges in ranges]
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT %s, COUNT(*) FROM (SELECT %s FROM (%s) s) h GROUP BY GROUPING SETS (%s)' %
+                           (', '.join(bucket_names), ', '.join(buckets), sql,
+                            ', '.join(['(%s)' % b for b in bucket_names])),
+                           bucket_params + list(params))
+            for bucket_row in cursor.fetchall():
+                for (index, name, edges), bucket in zip(ranges, bucket_row[:-1]):
+                    if bucket is not None:
+                        result[name]['histogram']['counts'][bucket - 1] += bucket_row[-1]
+        return result
+
+    def get_channel_bounds(self, queryset, channel_names):
+        """
+        This HITS THE DATABASE ONCE to get the min and max of each channel of a filtered queryset
+        :param queryset: the QuerySet of samples
+        :param channel_names: list of names of channels
+        :return: a dictionary of channel name to (min, max), which are None if the channel has no values
+        """
+        if self.model.dynamic:
+            rows = queryset.filter(**{'%s__in' % self.model.dynamic_separator: channel_names})
+            rows = rows.values(self.model.dynamic_separator).annotate(minimum=Min(self.model.dynamic_value),
+                                                                      maximum=Max(self.model.dynamic_value))
+            return dict([(row[self.model.dynamic_separator], (row['minimum'], row['maximum'])) for row in rows])
+        aggregates = {}
+        for name in channel_names:
+            aggregates['%s__min' % name] = Min(name)
+            aggregates['%s__max' % name] = Max(name)
+        aggregated = queryset.aggregate(**aggregates)
+        return dict([(name, (aggregated['%s__min' % name], aggregated['%s__max' % name])) for name in channel_names])
+
+    def get_streaming_statistics(self, start_time, end_time, flight_ids, filter_dict, channel_names, downsample,
+                                 percentiles, bins):
+        """
+        Compute the statistics of get_statistics by reading the values in chunks into a StatisticsAccumulator per
+        channel, from the archives of the flights if they are archived.  The min and max which bound the histograms
+        come from the same archives or samples, never from summaries, so no value falls outside them.
+        """
+        archive_values = None
+        if not filter_dict:
+            archive_values = self.get_archive_values(start_time, end_time, flight_ids, channel_names, downsample)
+        if archive_values is not None:
+            min_max = archive_values.get_min_max()
+            bounds = {}
+            if min_max:
+                bounds = dict([(name, (min_max[name]['min'], min_max[name]['max'])) for name in channel_names])
+        else:
+            # without downsampling, which can only narrow the range
+            bounds = self.get_channel_bounds(self.get_data(start_time, end_time, flight_ids, filter_dict).order_by(),
+                                             channel_names)
+        accumulators = OrderedDict()
+        for name in channel_names:
+            minimum, maximum = bounds.get(name, (None, None))
+            if minimum is not None:
+                accumulators[name] = StatisticsAccumulator(minimum, maximum, bins)
+        if not accumulators:
+            return None
+        names = list(accumulators.keys())
+        chunk_size = settings.XGDS_TIMESERIES_STREAM_CHUNK_SIZE
+        if archive_values is not None:
+            for name in names:
+                column = archive_values.get_column(name)
+                for start in range(0, len(column), chunk_size):
+                    accumulators[name].add(column[start:start + chunk_size].astype(np.float64))
+        elif self.model.dynamic:
+            data = self.get_data(start_time, end_time, flight_ids, filter_dict, downsample).order_by()
+            for name in names:
+                values = data.filter(**{self.model.dynamic_separator: name}).values_list(self.model.dynamic_value)
+                for chunk in iterate_value_chunks(values, chunk_size):
+                    accumulators[name].add(np.array(chunk, dtype=np.float64)[:, 0])
+        else:
+            values = self.get_data(start_time, end_time, flight_ids, filter_dict, downsample).order_by()
+            for chunk in iterate_value_chunks(values.values_list(*names), chunk_size):
+                chunk = np.array(chunk, dtype=np.float64)
+                for index, name in enumerate(names):
+                    accumulators[name].add(chunk[:, index])
+        result = {}
+        for name in channel_names:
+            if name in accumulators:
+                result[name] = accumulators[name].get_result(percentiles)
             else:
-                result[field] = {
-                    'min': filtered_data.aggregate(Min(field))['%s__min' % field],
-                    'max': filtered_data.aggregate(Max(field))['%s__max' % field],
-                }
+                result[name] = StatisticsAccumulator(0, 0, bins).get_result(percentiles)
+        return result
+
+    @instrument_method
+    def get_resampled_values(self, start_time, end_time, interval, flight_ids=None, filter_dict=None,
+                             channel_names=None, method='mean'):
+        """
+        Resample the channels onto the regular grid of times from start_time to end_time, every interval seconds,
+        reading the values in chunks, see util.Resampler.  Grids of different models with the same start time and
+        interval line up, so their channels can be compared directly.
+        :param start_time: The first grid time, timezone aware
+        :param end_time: The end time, timezone aware; the last grid time is at or before it
+        :param interval: the grid spacing in seconds
+        :param flight_ids: the list of flight ids
+        :param filter_dict: A dictionary of other filter terms
+        :param channel_names: list of names of channels, defaults to the numeric ones
+        :param method: mean, last or linear
+        :return: (numpy int64 array of the grid times in microseconds since the epoch,
+                  OrderedDict of channel name to numpy float64 array of its value at each grid time)
+        """
+        if self.model.dynamic:
+            channel_names = channel_names or self.get_channel_names()
+        else:
+            channel_names = self.get_statistics_field_names(channel_names)
+        start, end = get_epoch_microseconds([start_time, end_time])
+        step = int(interval * 1000000)
+        if step <= 0 or end < start:
+            raise ValueError('The interval must be positive and the end time after the start time')
+        count = int((end - start) // step) + 1
+        if count > settings.XGDS_TIMESERIES_RESAMPLE_MAX_POINTS:
+            raise ValueError('%d grid times is more than XGDS_TIMESERIES_RESAMPLE_MAX_POINTS' % count)
+        resamplers = OrderedDict([(name, Resampler(start, step, count, method)) for name in channel_names])
+
+        # linear interpolation needs the samples on either side of the grid
+        margin = datetime.timedelta(seconds=interval if method == 'linear' else 0)
+        read_start = start_time - margin
+        read_end = start_time + datetime.timedelta(microseconds=count * step) + margin
+        time_field_name = self.get_time_field_name()
+        chunk_size = settings.XGDS_TIMESERIES_STREAM_CHUNK_SIZE
+
+        archive_values = None
+        if not filter_dict and not self.model.dynamic and channel_names:
+            archive_values = self.get_archive_values(read_start, read_end, flight_ids, channel_names)
+        if archive_values is not None:
+            times = archive_values.get_column(ARCHIVE_TIME)
+            columns = [(name, archive_values.get_column(name)) for name in channel_names]
+            for chunk_start in range(0, len(times), chunk_size):
+                chunk = slice(chunk_start, chunk_start + chunk_size)
+                for name, column in columns:
+                    resamplers[name].add(times[chunk], column[chunk].astype(np.float64))
+        elif self.model.dynamic:
+            data = self.get_data(read_start, read_end, flight_ids, filter_dict).order_by(time_field_name, 'pk')
+            for name in channel_names:
+                values = data.filter(**{self.model.dynamic_separator: name}).values_list(time_field_name,
+                                                                                        self.model.dynamic_value)
+                for chunk in iterate_value_chunks(values, chunk_size):
+                    times, column = zip(*chunk)
+                    resamplers[name].add(get_epoch_microseconds(times), np.array(column, dtype=np.float64))
+        elif channel_names:
+            data = self.get_data(read_start, read_end, flight_ids, filter_dict).order_by(time_field_name, 'pk')
+            for chunk in iterate_value_chunks(data.values_list(time_field_name, *channel_names), chunk_size):
+                times = get_epoch_microseconds([row[0] for row in chunk])
+                columns = np.array([row[1:] for row in chunk], dtype=np.float64)
+                for index, name in enumerate(channel_names):
+                    resamplers[name].add(times, columns[:, index])
+
+        grid = start + step * np.arange(count, dtype=np.int64)
+        return grid, OrderedDict([(name, resampler.get_values()) for name, resampler in resamplers.items()])
+
+    def get_flight_summaries(self, flight_ids):
+        """
+        This HITS THE DATABASE ONCE to get the stored TimeSeriesFlightSummary of each flight
+        :param flight_ids: the list of flight ids
+        :return: a list of TimeSeriesFlightSummary, or None if summaries are off or any flight has no current summary
+        """
+        if not settings.XGDS_TIMESERIES_FLIGHT_SUMMARIES or not flight_ids:
+            return None
+        summaries = list(TimeSeriesFlightSummary.objects.filter(model_name=self.model.get_model_name(),
+                                                               flight_id__in=flight_ids,
+                                                               stale=False))
+        if len(summaries) != len(set([str(f) for f in flight_ids])):
+            return None
+        return summaries
+
+    @instrument_method
+    def get_summary_min_max(self, flight_ids, channel_names=None):
+        """
+        Get the same dictionary as get_min_max (or get_dynamic_min_max) for whole flights from their summaries
+        :param flight_ids: the list of flight ids
+        :param channel_names: list of names of channels
+        :return: A dictionary, or None if it cannot be answered from the summaries
+        """
+        if not channel_names:
+            channel_names = self.get_channel_names()
+        if not self.model.dynamic and len(self.get_statistics_field_names(channel_names)) != len(channel_names):
+            # only numeric channels are summarized
+            return None
+        summaries = self.get_flight_summaries(flight_ids)
+        if summaries is None:
+            return None
+        combined = TimeSeriesFlightSummary()
+        for summary in summaries:
+            combined.merge(summary)
+        if not combined.row_count:
+            return None
+
+        result = {'pk': {'min': combined.min_pk, 'max': combined.max_pk},
+                  self.get_time_field_name(): {'min': combined.first_time, 'max': combined.last_time}}
+        statistics = combined.get_channel_statistics()
+        for name in channel_names:
+            channel = statistics.get(name)
+            if not channel:
+                channel = {'count': 0, 'sum': 0.0, 'sumsq': 0.0, 'min': None, 'max': None}
+            result[name] = {'min': channel['min'], 'max': channel['max']}
+            if not self.model.dynamic:
+                mean = None
+                stddev = None
+                if channel['count']:
+                    mean = channel['sum'] / channel['count']
+                    stddev = math.sqrt(max(channel['sumsq'] / channel['count'] - mean * mean, 0.0))
+                result[name].update({'count': channel['count'], 'mean': mean, 'stddev': stddev})
         return result
 
+    @instrument_method
+    def get_flight_extent(self, flight_ids):
+        """
+        Get the time extent and number of rows of flights, from their summaries if they have them
+        :param flight_ids: the list of flight ids
+        :return: a dictionary of start_time, end_time and row_count
+        """
+        summaries = self.get_flight_summaries(flight_ids)
+        if summaries is not None:
+            combined = TimeSeriesFlightSummary()
+            for summary in summaries:
+                combined.merge(summary)
+            return {'start_time': combined.first_time,
+                    'end_time': combined.last_time,
+                    'row_count': combined.row_count}
+        time_field_name = self.get_time_field_name()
+        aggregated = self.filter(flight_id__in=flight_ids).aggregate(start_time=Min(time_field_name),
+                                                                     end_time=Max(time_field_name),
+                                                                     row_count=Count('pk'))
+        return aggregated
+
+    @instrument_method
+    def has_flight_data(self, flight_ids):
+        """
+        :param flight_ids: the list of flight ids
+        :return: True if there are values of this type for any of the given flights
+        """
+        if settings.XGDS_TIMESERIES_FLIGHT_SUMMARIES:
+            if TimeSeriesFlightSummary.objects.filter(model_name=self.model.get_model_name(),
+                                                      flight_id__in=flight_ids, row_count__gt=0,
+                                                      stale=False).exists():
+                return True
+        # flights without summaries may still have data saved before summaries were turned on
+        return self.get_flight_data(flight_ids).exists()
+
 
 class TimeSeriesModel(models.Model, BroadcastMixin):
 
@@ -317,6 +1077,22 @@ class TimeSeriesModel(models.Model, BroadcastMixin):
     # If your model is stateful, ie has data coming in itermittantly that indicates state, override stateful with true.
     stateful = False
 
+    # If your model stores one row per channel per sample, override dynamic with true and set dynamic_value to the
+    # name of the value field and dynamic_separator to the name of the field which holds the channel name.
+    dynamic = False
+
+    # If your model has lots of data, override rollup with true to maintain TimeSeriesRollup buckets for it.
+    rollup = False
+
+    # If the table is range partitioned on the time field by ./manage.py partition_timeseries, set
+    # partition_interval to day, week or month; flight queries then add the flight's time bounds so PostgreSQL only
+    # scans the partitions of that flight.
+    partition_interval = None
+
+    # Subclasses with a flight field get a composite (flight, time field) index, see add_flight_time_index.
+    # Override flight_time_index with false if you index them some other way.
+    flight_time_index = True
+
     @classmethod
     def get_channel_description(cls, channel_name):
         """
@@ -338,6 +1114,49 @@ class TimeSeriesModel(models.Model, BroadcastMixin):
         """
         return cls.channel_descriptions
 
+    @classmethod
+    def get_channel_field(cls, channel_name):
+        """
+        :return: the model field of a channel, or None for channels which are not fields, ie of dynamic models
+        """
+        try:
+            return cls._meta.get_field(channel_name)
+        except models.FieldDoesNotExist:
+            return None
+
+    @classmethod
+    def get_channel_precisions(cls):
+        """
+        :return: a dictionary of channel name to the precision of its channel description, or the decimal places of
+                 its ScaledIntegerField, for the channels which have one, see xgds_timeseries.encoding
+        """
+        result = {}
+        descriptions = cls.get_channel_descriptions()
+        for name in cls.get_channel_names() or descriptions.keys():
+            precision = getattr(descriptions.get(name), 'precision', None)
+            field = cls.get_channel_field(name)
+            if precision is None and isinstance(field, ScaledIntegerField):
+                precision = field.decimal_places
+            if precision is not None:
+                result[name] = precision
+        return result
+
+    @classmethod
+    def get_channel_dtypes(cls):
+        """
+        :return: a dictionary of channel name to the dtype of its channel description, or float32 for Float32Fields,
+                 for the channels which have one
+        """
+        result = {}
+        descriptions = cls.get_channel_descriptions()
+        for name in cls.get_channel_names() or descriptions.keys():
+            dtype = getattr(descriptions.get(name), 'dtype', None)
+            if dtype is None and isinstance(cls.get_channel_field(name), Float32Field):
+                dtype = 'float32'
+            if dtype is not None:
+                result[name] = dtype
+        return result
+
 
     @classmethod
     def get_channel_names(cls):
@@ -356,6 +1175,23 @@ class TimeSeriesModel(models.Model, BroadcastMixin):
         """
         return 'timestamp'
 
+    @classmethod
+    def get_model_name(cls):
+        """
+        :return: the fully qualified name of the model, ie xgds_timeseries.TimeSeriesExample
+        """
+        return '%s.%s' % (cls._meta.app_label, cls.__name__)
+
+    @classmethod
+    def get_rollup_resolutions(cls):
+        """
+        Override this method to use different rollup resolutions for this model
+        :return: the list of rollup bucket widths in seconds, empty if this model is not rolled up
+        """
+        if not cls.rollup:
+            return []
+        return settings.XGDS_TIMESERIES_ROLLUP_RESOLUTIONS
+
     def to_dict(self):
         time_field_name = self.get_time_field_name()
         returned_dict = {time_field_name: getattr(self, time_field_name)}
@@ -368,6 +1204,636 @@ class TimeSeriesModel(models.Model, BroadcastMixin):
         ordering = ['timestamp']
 
 
+def get_flight_time_index(model):
+    """
+    :param model: a TimeSeriesModel subclass
+    :return: the (flight, time field) index_together entry for the model, or None if it should not have one
+    """
+    if not model.flight_time_index:
+        return None
+    try:
+        model._meta.get_field('flight')
+    except models.FieldDoesNotExist:
+        return None
+    return ('flight', model.get_time_field_name())
+
+
+@receiver(class_prepared)
+def add_flight_time_index(sender, **kwargs):
+    """
+    Every hot query filters on flight and then ranges or orders on time, so add a composite (flight, time field)
+    index to each concrete TimeSeriesModel subclass.  It is added to index_together (and to the original Meta
+    attributes, which migrations read), so it is created with the table.
+    Existing tables can be checked and fixed with ./manage.py timeseries_indexes
+    """
+    if not issubclass(sender, TimeSeriesModel) or sender._meta.abstract or sender._meta.proxy:
+        return
+    index = get_flight_time_index(sender)
+    if index is None:
+        return
+    index_together = list(normalize_together(sender._meta.index_together))
+    if index not in index_together:
+        index_together.append(index)
+        sender._meta.index_together = tuple(index_together)
+        sender._meta.original_attrs['index_together'] = tuple(index_together)
+
+
+class TimeSeriesRollup(models.Model):
+    """
+    Precomputed statistics for one channel of a time series model over one bucket of time, for one flight.
+    These are built with ./manage.py rebuild_timeseries_rollups, and then maintained as samples are saved.
+    """
+    model_name = models.CharField(max_length=128)
+    flight = models.ForeignKey('xgds_core.Flight', on_delete=models.CASCADE, blank=True, null=True)
+    channel = models.CharField(max_length=128)
+    resolution = models.PositiveIntegerField()
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    sum_value = models.FloatField(default=0)
+    min_value = models.FloatField(null=True, blank=True)
+    max_value = models.FloatField(null=True, blank=True)
+    first_value = models.FloatField(null=True, blank=True)
+    first_time = models.DateTimeField()
+    first_pk = models.BigIntegerField()
+    last_value = models.FloatField(null=True, blank=True)
+    last_time = models.DateTimeField()
+    last_pk = models.BigIntegerField()
+
+    def get_value(self, value_kind):
+        """
+        :param value_kind: one of first, last, mean, min, max
+        :return: the value of this bucket of that kind
+        """
+        if value_kind == 'mean':
+            if not self.count:
+                return None
+            return self.sum_value / self.count
+        return getattr(self, '%s_value' % value_kind)
+
+    def get_time(self, value_kind):
+        """
+        :param value_kind: one of first, last, mean, min, max
+        :return: the time to report for this bucket
+        """
+        if value_kind == 'first':
+            return self.first_time
+        if value_kind == 'last':
+            return self.last_time
+        return self.bucket_start
+
+    def merge(self, other):
+        """
+        Combine the statistics of another bucket with the same key into this one
+        :param other: a TimeSeriesRollup
+        """
+        self.count += other.count
+        self.sum_value += other.sum_value
+        if other.min_value is not None and (self.min_value is None or other.min_value < self.min_value):
+            self.min_value = other.min_value
+        if other.max_value is not None and (self.max_value is None or other.max_value > self.max_value):
+            self.max_value = other.max_value
+        if other.first_time < self.first_time:
+            self.first_time = other.first_time
+            self.first_value = other.first_value
+            self.first_pk = other.first_pk
+        if other.last_time >= self.last_time:
+            self.last_time = other.last_time
+            self.last_value = other.last_value
+            self.last_pk = other.last_pk
+
+    def add_sample(self, pk, the_time, value):
+        """
+        Add one sample to this bucket
+        :param pk: the pk of the sample
+        :param the_time: the time of the sample
+        :param value: the value of the channel in the sample, may be None
+        """
+        sample = TimeSeriesRollup(first_time=the_time, first_value=value, first_pk=pk,
+                                  last_time=the_time, last_value=value, last_pk=pk)
+        if value is not None:
+            sample.count = 1
+            sample.sum_value = value
+            sample.min_value = value
+            sample.max_value = value
+        self.merge(sample)
+
+    def get_key(self):
+        return self.flight_id, self.resolution, self.channel, self.bucket_start
+
+    class Meta:
+        unique_together = ('model_name', 'flight', 'resolution', 'channel', 'bucket_start')
+        ordering = ['bucket_start']
+
+
+class TimeSeriesRollupFlight(models.Model):
+    """
+    Records that the rollups of a flight of a time series model were rebuilt from all of its samples,
+    so they can stand in for the samples from then on
+    """
+    model_name = models.CharField(max_length=128)
+    flight = models.ForeignKey('xgds_core.Flight', on_delete=models.CASCADE)
+    rebuilt = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('model_name', 'flight')
+
+
+def forget_rolled_up_flight(model, flight_id):
+    """
+    Keep the rollups of a flight from being used until it is rebuilt, after one of its samples changed or was deleted
+    :param model: the TimeSeriesModel subclass
+    :param flight_id: the id of the flight
+    """
+    if flight_id is not None:
+        TimeSeriesRollupFlight.objects.filter(model_name=model.get_model_name(), flight_id=flight_id).delete()
+
+
+def get_rolled_up_flight_ids(model, flight_ids):
+    """
+    :param model: the TimeSeriesModel subclass
+    :param flight_ids: the list of flight ids
+    :return: the set of those flight ids whose rollups were rebuilt
+    """
+    return set(TimeSeriesRollupFlight.objects.filter(model_name=model.get_model_name(),
+                                                     flight_id__in=flight_ids).values_list('flight_id', flat=True))
+
+
+def build_rollups(model, rows):
+    """
+    Accumulate rollup buckets in memory for a batch of samples
+    :param model: the TimeSeriesModel subclass
+    :param rows: an iterable of (pk, flight_id, time, channel values...) in the order of model.get_channel_names()
+    :return: an OrderedDict of unsaved TimeSeriesRollups, by key
+    """
+    model_name = model.get_model_name()
+    resolutions = model.get_rollup_resolutions()
+    channel_names = model.get_channel_names()
+    buckets = OrderedDict()
+    for row in rows:
+        pk, flight_id, the_time = row[:3]
+        for resolution in resolutions:
+            bucket_start = get_bucket_start(the_time, resolution)
+            for index, channel in enumerate(channel_names):
+                value = row[3 + index]
+                key = (flight_id, resolution, channel, bucket_start)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = TimeSeriesRollup(model_name=model_name, flight_id=flight_id, channel=channel,
+                                              resolution=resolution, bucket_start=bucket_start,
+                                              first_time=the_time, first_value=value, first_pk=pk,
+                                              last_time=the_time, last_value=value, last_pk=pk)
+                    buckets[key] = bucket
+                bucket.add_sample(pk, the_time, value)
+    return buckets
+
+
+def get_rollup_rows(instances):
+    """
+    :param instances: an iterable of saved TimeSeriesModel instances, all of the same class
+    :return: the rows that build_rollups expects
+    """
+    for instance in instances:
+        row = [instance.pk, getattr(instance, 'flight_id', None), getattr(instance, instance.get_time_field_name())]
+        row.extend([getattr(instance, name) for name in instance.get_channel_names()])
+        yield row
+
+
+def update_rollups(model, rows):
+    """
+    Merge a batch of new samples into the stored rollups.  Only flights whose rollups were rebuilt are updated; the
+    rollups of any other flight would only cover part of its samples.
+    :param model: the TimeSeriesModel subclass
+    :param rows: an iterable of (pk, flight_id, time, channel values...)
+    """
+    rows = list(rows)
+    flight_ids = get_rolled_up_flight_ids(model, set([row[1] for row in rows if row[1] is not None]))
+    buckets = build_rollups(model, [row for row in rows if row[1] in flight_ids])
+    if not buckets:
+        return
+    bucket_starts = [key[3] for key in buckets]
+    with transaction.atomic():
+        existing = TimeSeriesRollup.objects.select_for_update().filter(
+            model_name=model.get_model_name(),
+            flight_id__in=flight_ids,
+            bucket_start__gte=min(bucket_starts),
+            bucket_start__lte=max(bucket_starts))
+        for stored in existing:
+            bucket = buckets.pop(stored.get_key(), None)
+            if bucket is not None:
+                stored.merge(bucket)
+                stored.save()
+        TimeSeriesRollup.objects.bulk_create(list(buckets.values()))
+
+
+def rebuild_rollups(model, flight_id, batch_size=1000):
+    """
+    Delete and recompute the stored rollups of one flight from its raw samples.
+    Samples are read in time order and written out one coarsest bucket at a time, so memory stays bounded.
+    :param model: the TimeSeriesModel subclass
+    :param flight_id: the id of the flight to rebuild
+    :param batch_size: number of rollups to insert at once
+    :return: the number of rollups written
+    """
+    resolutions = model.get_rollup_resolutions()
+    if not resolutions:
+        return 0
+    coarsest = max(resolutions)
+    time_field_name = model.get_time_field_name()
+    fields = ['pk', 'flight_id', time_field_name]
+    fields.extend(model.get_channel_names())
+    samples = model.objects.filter(flight_id=flight_id).order_by(time_field_name, 'pk').values_list(*fields)
+
+    count = 0
+    with transaction.atomic():
+        TimeSeriesRollup.objects.filter(model_name=model.get_model_name(), flight_id=flight_id).delete()
+        TimeSeriesRollupFlight.objects.update_or_create(model_name=model.get_model_name(), flight_id=flight_id,
+                                                        defaults={'rebuilt': timezone.now()})
+        batch = []
+        batch_start = None
+        for row in samples.iterator():
+            bucket_start = get_bucket_start(row[2], coarsest)
+            if batch and bucket_start != batch_start:
+                count += save_new_rollups(model, batch, batch_size)
+                batch = []
+            batch_start = bucket_start
+            batch.append(row)
+        if batch:
+            count += save_new_rollups(model, batch, batch_size)
+    return count
+
+
+def save_new_rollups(model, rows, batch_size):
+    """
+    Insert the rollups for a batch of samples which have no stored rollups yet
+    :return: the number of rollups written
+    """
+    buckets = build_rollups(model, rows)
+    TimeSeriesRollup.objects.bulk_create(list(buckets.values()), batch_size=batch_size)
+    return len(buckets)
+
+
+class PendingRollups(object):
+    """
+    The samples saved in one transaction, merged into the rollups in one batch when it commits
+    """
+
+    def __init__(self):
+        self.rows = OrderedDict()
+
+    def add(self, model, rows):
+        self.rows.setdefault(model, []).extend(rows)
+
+    def __call__(self):
+        for model, rows in self.rows.items():
+            update_rollups(model, rows)
+
+
+PENDING_ROLLUPS = threading.local()
+
+
+def queue_rollup_rows(model, rows):
+    """
+    Merge samples into the rollups when the current transaction commits, or right away outside of a transaction
+    :param model: the TimeSeriesModel subclass
+    :param rows: the rows that build_rollups expects
+    """
+    using = router.db_for_write(model)
+    connection = transaction.get_connection(using)
+    pending_by_database = getattr(PENDING_ROLLUPS, 'pending', None)
+    if pending_by_database is None:
+        pending_by_database = PENDING_ROLLUPS.pending = {}
+    pending = pending_by_database.get(using)
+    # a batch is reused while it waits for its commit; one which ran or was rolled back is no longer waiting
+    if pending is not None and any([entry[1] is pending for entry in connection.run_on_commit]):
+        pending.add(model, rows)
+        return
+    pending = PendingRollups()
+    pending.add(model, rows)
+    pending_by_database[using] = pending
+    transaction.on_commit(pending, using=using)
+
+
+@receiver(post_save)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Keep the rollups up to date as time series samples are saved.  Fixture loading (raw) is skipped.
+    """
+    if raw or not isinstance(instance, TimeSeriesModel) or not sender.get_rollup_resolutions():
+        return
+    if created:
+        queue_rollup_rows(sender, list(get_rollup_rows([instance])))
+    else:
+        # the old values of a changed sample are not known, so its rollups cannot be corrected
+        forget_rolled_up_flight(sender, getattr(instance, 'flight_id', None))
+
+
+@receiver(post_delete)
+def forget_rolled_up_flight_on_delete(sender, instance, **kwargs):
+    """
+    A deleted sample is still counted in the rollups of its flight; stop using them until the flight is rebuilt.
+    QuerySet.update() sends no signals, so rebuild the rollups after bulk updates.
+    """
+    if isinstance(instance, TimeSeriesModel) and sender.get_rollup_resolutions():
+        forget_rolled_up_flight(sender, getattr(instance, 'flight_id', None))
+
+
+def get_empty_channel_statistics():
+    return {'count': 0, 'sum': 0.0, 'sumsq': 0.0, 'min': None, 'max': None}
+
+
+def merge_channel_statistics(statistics, other):
+    """
+    Combine the statistics of one channel into another, in place
+    :param statistics: a dictionary of count, sum, sumsq, min and max
+    :param other: another dictionary of count, sum, sumsq, min and max
+    """
+    statistics['count'] += other['count']
+    statistics['sum'] += other['sum']
+    statistics['sumsq'] += other['sumsq']
+    if other['min'] is not None and (statistics['min'] is None or other['min'] < statistics['min']):
+        statistics['min'] = other['min']
+    if other['max'] is not None and (statistics['max'] is None or other['max'] > statistics['max']):
+        statistics['max'] = other['max']
+
+
+class TimeSeriesFlightSummary(models.Model):
+    """
+    The time extent, row count and numeric channel statistics of one time series model for one flight, so metadata,
+    extent and whole flight min/max lookups read one row instead of the samples.
+    A summary is only built from all the samples of its flight, by ./manage.py rebuild_timeseries_summaries; after
+    that new samples are merged into it as they are saved.  Deleting or changing a sample marks it stale, and a stale
+    summary is not used until it is rebuilt.
+    """
+    model_name = models.CharField(max_length=128)
+    flight = models.ForeignKey('xgds_core.Flight', on_delete=models.CASCADE, blank=True, null=True)
+    row_count = models.BigIntegerField(default=0)
+    first_time = models.DateTimeField(null=True, blank=True)
+    last_time = models.DateTimeField(null=True, blank=True)
+    min_pk = models.BigIntegerField(null=True, blank=True)
+    max_pk = models.BigIntegerField(null=True, blank=True)
+    # json dictionary by channel name of count, sum, sumsq (the sum of the squares), min and max
+    channel_statistics = models.TextField(default='{}')
+    stale = models.BooleanField(default=False)
+
+    def get_channel_statistics(self):
+        if not hasattr(self, '_channel_statistics'):
+            self._channel_statistics = json.loads(self.channel_statistics)
+        return self._channel_statistics
+
+    def set_channel_statistics(self, statistics):
+        self._channel_statistics = statistics
+        self.channel_statistics = json.dumps(statistics)
+
+    def merge(self, other):
+        """
+        Combine another summary of the same model into this one
+        :param other: a TimeSeriesFlightSummary
+        """
+        if not other.row_count:
+            return
+        self.row_count += other.row_count
+        if self.first_time is None or other.first_time < self.first_time:
+            self.first_time = other.first_time
+        if self.last_time is None or other.last_time > self.last_time:
+            self.last_time = other.last_time
+        if self.min_pk is None or other.min_pk < self.min_pk:
+            self.min_pk = other.min_pk
+        if self.max_pk is None or other.max_pk > self.max_pk:
+            self.max_pk = other.max_pk
+        statistics = self.get_channel_statistics()
+        for channel, other_statistics in other.get_channel_statistics().items():
+            merge_channel_statistics(statistics.setdefault(channel, get_empty_channel_statistics()),
+                                     other_statistics)
+        self.set_channel_statistics(statistics)
+
+    def add_sample(self, pk, the_time, channel_values):
+        """
+        Add one row to this summary; call set_channel_statistics(get_channel_statistics()) before saving
+        :param pk: the pk of the row
+        :param the_time: the time of the row
+        :param channel_values: a list of (channel name, number) for the numeric channels in the row
+        """
+        self.row_count += 1
+        if self.first_time is None or the_time < self.first_time:
+            self.first_time = the_time
+        if self.last_time is None or the_time > self.last_time:
+            self.last_time = the_time
+        if self.min_pk is None or pk < self.min_pk:
+            self.min_pk = pk
+        if self.max_pk is None or pk > self.max_pk:
+            self.max_pk = pk
+        statistics = self.get_channel_statistics()
+        for channel, value in channel_values:
+            if value is None:
+                continue
+            value = float(value)
+            merge_channel_statistics(statistics.setdefault(channel, get_empty_channel_statistics()),
+                                     {'count': 1, 'sum': value, 'sumsq': value * value, 'min': value, 'max': value})
+
+    class Meta:
+        unique_together = ('model_name', 'flight')
+
+
+def get_summary_samples(model, instances):
+    """
+    :param model: the TimeSeriesModel subclass
+    :param instances: an iterable of saved instances of the model
+    :return: a generator of (flight_id, pk, time, [(channel name, number), ...])
+    """
+    time_field_name = model.get_time_field_name()
+    if model.dynamic:
+        for instance in instances:
+            yield (getattr(instance, 'flight_id', None), instance.pk, getattr(instance, time_field_name),
+                   [(getattr(instance, model.dynamic_separator), getattr(instance, model.dynamic_value))])
+    else:
+        channel_names = model.objects.get_statistics_field_names()
+        for instance in instances:
+            yield (getattr(instance, 'flight_id', None), instance.pk, getattr(instance, time_field_name),
+                   [(name, getattr(instance, name)) for name in channel_names])
+
+
+def update_flight_summaries(model, instances):
+    """
+    Merge a batch of new saved instances into the stored flight summaries.  Only current summaries are updated; a
+    flight without one keeps none until it is rebuilt, since a summary of just these instances would be partial.
+    :param model: the TimeSeriesModel subclass
+    :param instances: an iterable of saved instances of the model
+    """
+    model_name = model.get_model_name()
+    summaries = OrderedDict()
+    for flight_id, pk, the_time, channel_values in get_summary_samples(model, instances):
+        summary = summaries.get(flight_id)
+        if summary is None:
+            summary = TimeSeriesFlightSummary(model_name=model_name, flight_id=flight_id)
+            summaries[flight_id] = summary
+        summary.add_sample(pk, the_time, channel_values)
+    if not summaries:
+        return
+
+    with transaction.atomic():
+        existing = TimeSeriesFlightSummary.objects.select_for_update().filter(
+            model_name=model_name, flight_id__in=[f for f in summaries if f is not None], stale=False)
+        for stored in existing:
+            stored.merge(summaries[stored.flight_id])
+            stored.save()
+
+
+def mark_flight_summary_stale(model, flight_id):
+    """
+    Keep the summary of a flight from being used until it is rebuilt, after one of its samples changed
+    :param model: the TimeSeriesModel subclass
+    :param flight_id: the id of the flight
+    """
+    if flight_id is not None:
+        TimeSeriesFlightSummary.objects.filter(model_name=model.get_model_name(), flight_id=flight_id,
+                                               stale=False).update(stale=True)
+
+
+def rebuild_flight_summary(model, flight_id):
+    """
+    Delete and recompute the stored summary of one flight from its samples, with aggregate queries
+    :param model: the TimeSeriesModel subclass
+    :param flight_id: the id of the flight to rebuild
+    :return: the new TimeSeriesFlightSummary, or None if the flight has no samples
+    """
+    model_name = model.get_model_name()
+    time_field_name = model.get_time_field_name()
+    samples = model.objects.filter(flight_id=flight_id).order_by()
+    aggregates = {'row_count': Count('pk'),
+                  'first_time': Min(time_field_name),
+                  'last_time': Max(time_field_name),
+                  'min_pk': Min('pk'),
+                  'max_pk': Max('pk')}
+
+    def get_channel_aggregates(field, prefix=''):
+        value = F(field) if model.dynamic else model.objects.get_channel_expression(field)
+        return {'%scount' % prefix: Count(field),
+                '%ssum' % prefix: Sum(value),
+                '%ssumsq' % prefix: Sum(value * value),
+                '%smin' % prefix: Min(field),
+                '%smax' % prefix: Max(field)}
+
+    def get_statistics(aggregated, prefix=''):
+        result = {}
+        for key in ('count', 'sum', 'sumsq', 'min', 'max'):
+            result[key] = aggregated['%s%s' % (prefix, key)]
+        result['sum'] = float(result['sum'] or 0)
+        result['sumsq'] = float(result['sumsq'] or 0)
+        return result
+
+    statistics = {}
+    if model.dynamic:
+        aggregated = samples.aggregate(**aggregates)
+        channels = samples.values(model.dynamic_separator).annotate(**get_channel_aggregates(model.dynamic_value))
+        for channel in channels:
+            statistics[channel[model.dynamic_separator]] = get_statistics(channel)
+    else:
+        channel_names = model.objects.get_statistics_field_names()
+        for name in channel_names:
+            aggregates.update(get_channel_aggregates(name, '%s__' % name))
+        aggregated = samples.aggregate(**aggregates)
+        for name in channel_names:
+            statistics[name] = get_statistics(aggregated, '%s__' % name)
+
+    with transaction.atomic():
+        TimeSeriesFlightSummary.objects.filter(model_name=model_name, flight_id=flight_id).delete()
+        if not aggregated['row_count']:
+            return None
+        summary = TimeSeriesFlightSummary(model_name=model_name, flight_id=flight_id)
+        for key in ('row_count', 'first_time', 'last_time', 'min_pk', 'max_pk'):
+            setattr(summary, key, aggregated[key])
+        summary.set_channel_statistics(statistics)
+        summary.save()
+    return summary
+
+
+def get_models_with_flight_data(model_classes, flight_ids):
+    """
+    Find which time series models have data for any of the given flights, in as few queries as possible:
+    one query of the flight summaries, then one UNION ALL of a LIMIT 1 query per remaining model for each database.
+    :param model_classes: the TimeSeriesModel subclasses to check; abstract ones never have data
+    :param flight_ids: the list of flight ids
+    :return: the set of the model classes which have data
+    """
+    result = set()
+    remaining = [m for m in model_classes if not m._meta.abstract]
+    if remaining and settings.XGDS_TIMESERIES_FLIGHT_SUMMARIES:
+        summarized = set(TimeSeriesFlightSummary.objects.filter(
+            model_name__in=[m.get_model_name() for m in remaining],
+            flight_id__in=flight_ids,
+            row_count__gt=0,
+            stale=False).values_list('model_name', flat=True).distinct())
+        result.update([m for m in remaining if m.get_model_name() in summarized])
+        remaining = [m for m in remaining if m not in result]
+
+    by_database = OrderedDict()
+    for model in remaining:
+        by_database.setdefault(router.db_for_read(model), []).append(model)
+    for using, database_models in by_database.items():
+        parts = []
+        params = []
+        for index, model in enumerate(database_models):
+            queryset = model.objects.db_manager(using).get_flight_data(flight_ids).order_by().values('pk')[:1]
+            sql, model_params = queryset.query.sql_with_params()
+            parts.append('SELECT %d AS model_index FROM (%s) flight_data_%d' % (index, sql, index))
+            params.extend(model_params)
+        with connections[using].cursor() as cursor:
+            cursor.execute(' UNION ALL '.join(parts), params)
+            for row in cursor.fetchall():
+                result.add(database_models[row[0]])
+    return result
+
+
+@receiver(post_save)
+def update_flight_summaries_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Keep the flight summaries up to date as time series samples are saved.  Fixture loading (raw) is skipped.
+    """
+    if raw or not isinstance(instance, TimeSeriesModel) or not settings.XGDS_TIMESERIES_FLIGHT_SUMMARIES:
+        return
+    if created:
+        update_flight_summaries(sender, [instance])
+    else:
+        # the old values of a changed sample are not known, so its summary cannot be corrected
+        mark_flight_summary_stale(sender, getattr(instance, 'flight_id', None))
+
+
+@receiver(post_delete)
+def mark_flight_summary_stale_on_delete(sender, instance, **kwargs):
+    """
+    A deleted sample leaves its flight summary too large; mark it stale until it is rebuilt.
+    QuerySet.update() sends no signals, so rebuild the summaries after bulk updates.
+    """
+    if isinstance(instance, TimeSeriesModel) and settings.XGDS_TIMESERIES_FLIGHT_SUMMARIES:
+        mark_flight_summary_stale(sender, getattr(instance, 'flight_id', None))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def record_samples_changed_on_save(sender, instance, **kwargs):
+    """
+    Keep cached responses of the flight of a saved or deleted sample from being used again.
+    See xgds_timeseries.cache
+    """
+    if isinstance(instance, TimeSeriesModel):
+        record_samples_changed(sender.get_model_name(), getattr(instance, 'flight_id', None))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def delete_flight_archive_on_save(sender, instance, raw=False, **kwargs):
+    """
+    An archived flight is read from its archive instead of the database, so delete the archive of the flight of a
+    saved or deleted sample; archive the flight again once it is complete.  See xgds_timeseries.archive
+    """
+    if raw or not isinstance(instance, TimeSeriesModel) or not settings.XGDS_TIMESERIES_ARCHIVE_DIR:
+        return
+    flight_id = getattr(instance, 'flight_id', None)
+    if flight_id is not None and delete_flight_archive(sender, flight_id):
+        logger.warning('Deleted the archive of %s flight %s, whose samples changed', sender.get_model_name(),
+                       flight_id)
+
+
 class TimeSeriesExample(TimeSeriesModel):
     """
     This is an auto-generated Django model created from a
@@ -384,12 +1850,38 @@ class TimeSeriesExample(TimeSeriesModel):
     title = 'Time Series Example'
 
     channel_descriptions = {
-                            'temperature': ChannelDescription('Temp', units='C', global_min=0.000000, global_max=45.000000),
-                            'pressure': ChannelDescription('Pressure'),
-                            'humidity': ChannelDescription('Humidity', global_min=0.000000, global_max=100.000000),
+                            'temperature': ChannelDescription('Temp', units='C', global_min=0.000000, global_max=45.000000, precision=2),
+                            'pressure': ChannelDescription('Pressure', precision=2),
+                            'humidity': ChannelDescription('Humidity', global_min=0.000000, global_max=100.000000, precision=1),
                             }
 
     @classmethod
     def get_channel_names(cls):
         return ['temperature', 'pressure', 'humidity', ]
 
+
+
+class TimeSeriesDynamicExample(TimeSeriesModel):
+    """
+    This is an example of a dynamic time series model, which stores one row per channel per sample.
+    """
+
+    timestamp = models.DateTimeField(db_index=True, null=False, blank=False)
+    channel_name = models.CharField(max_length=64, db_index=True)
+    value = models.FloatField(null=True, blank=True)
+    flight = models.ForeignKey('xgds_core.Flight', on_delete=models.SET_NULL, blank=True, null=True)
+
+    title = 'Time Series Dynamic Example'
+
+    dynamic = True
+    dynamic_value = 'value'
+    dynamic_separator = 'channel_name'
+
+    channel_descriptions = {
+                            'temperature': ChannelDescription('Temp', units='C', global_min=0.000000, global_max=45.000000),
+                            'pressure': ChannelDescription('Pressure'),
+                            }
+
+    @classmethod
+    def get_channel_names(cls):
+        return ['temperature', 'pressure', ]
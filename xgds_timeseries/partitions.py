@@ -0,0 +1,221 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+PostgreSQL declarative range partitioning of TimeSeriesModel tables on their time field.
+A partitioned model sets partition_interval, see TimeSeriesModel, and is managed with ./manage.py partition_timeseries
+"""
+
+import datetime
+import re
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from xgds_timeseries.models import get_flight_time_index
+
+PARTITION_INTERVALS = ('day', 'week', 'month')
+LEGACY_SUFFIX = '_legacy'
+UPPER_BOUND_PATTERN = re.compile(r"TO \('([^']+)'\)")
+
+
+def get_interval_start(the_time, interval):
+    """
+    :param the_time: a timezone aware datetime
+    :param interval: day, week or month
+    :return: the UTC start of the interval which contains the time
+    """
+    the_time = the_time.astimezone(timezone.utc)
+    start = datetime.datetime(the_time.year, the_time.month, the_time.day, tzinfo=timezone.utc)
+    if interval == 'week':
+        start -= datetime.timedelta(days=start.weekday())
+    elif interval == 'month':
+        start = start.replace(day=1)
+    elif interval != 'day':
+        raise ValueError('Unknown partition interval %s' % interval)
+    return start
+
+
+def get_next_interval_start(start, interval):
+    """
+    :param start: the start of an interval, from get_interval_start
+    :param interval: day, week or month
+    :return: the start of the following interval
+    """
+    if interval == 'day':
+        return start + datetime.timedelta(days=1)
+    if interval == 'week':
+        return start + datetime.timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def get_connection(model):
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'postgresql':
+        raise ValueError('Partitioning needs PostgreSQL, %s uses %s' % (model.get_model_name(), connection.vendor))
+    return connection
+
+
+def get_partition_name(model, start):
+    return '%s_p%s' % (model._meta.db_table, start.strftime('%Y%m%d'))
+
+
+def get_partitions(model):
+    """
+    :param model: a partitioned TimeSeriesModel subclass
+    :return: a list of (partition table name, upper bound datetime or None), in no particular order
+    """
+    connection = get_connection(model)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+                       'FROM pg_inherits i '
+                       'JOIN pg_class c ON c.oid = i.inhrelid '
+                       'JOIN pg_class p ON p.oid = i.inhparent '
+                       'WHERE p.relname = %s', [model._meta.db_table])
+        rows = cursor.fetchall()
+    result = []
+    for name, bound in rows:
+        match = UPPER_BOUND_PATTERN.search(bound or '')
+        upper = None
+        if match:
+            upper = datetime.datetime.strptime(match.group(1)[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        result.append((name, upper))
+    return result
+
+
+def create_partitions(model, start, count, interval=None):
+    """
+    Create the partitions of count intervals from start, skipping ones which exist; run this ahead of the data
+    :param model: a partitioned TimeSeriesModel subclass
+    :param start: a timezone aware datetime in the first interval
+    :param count: the number of intervals
+    :param interval: day, week or month, defaults to the model's partition_interval
+    :return: the names of the partitions created
+    """
+    interval = interval or model.partition_interval
+    connection = get_connection(model)
+    quote_name = connection.ops.quote_name
+    existing = set([name for name, upper in get_partitions(model)])
+    created = []
+    start = get_interval_start(start, interval)
+    with connection.cursor() as cursor:
+        for i in range(count):
+            end = get_next_interval_start(start, interval)
+            name = get_partition_name(model, start)
+            if name not in existing:
+                cursor.execute('CREATE TABLE %s PARTITION OF %s FOR VALUES FROM (%%s) TO (%%s)' %
+                               (quote_name(name), quote_name(model._meta.db_table)), [start, end])
+                created.append(name)
+            start = end
+    return created
+
+
+def convert_to_partitioned(model, interval=None):
+    """
+    Turn the existing table of a model into a table partitioned by range on its time field.
+    The existing rows stay where they are: the old table is renamed and attached as the partition of everything
+    before the interval after next, so no rows are copied.  Its range is first added as a NOT VALID check constraint,
+    which does not scan the table, then validated in its own step, which scans it without blocking reads or writes;
+    the validated constraint lets the final transaction rename and attach the table without a scan.
+    The primary key becomes (id, time), as PostgreSQL requires the partition key in unique constraints.
+    :param model: the TimeSeriesModel subclass
+    :param interval: day, week or month, defaults to the model's partition_interval
+    :return: the name of the partition which holds the existing rows
+    """
+    interval = interval or model.partition_interval
+    if interval not in PARTITION_INTERVALS:
+        raise ValueError('Set partition_interval on %s to one of %s' % (model.get_model_name(),
+                                                                         ', '.join(PARTITION_INTERVALS)))
+    connection = get_connection(model)
+    quote_name = connection.ops.quote_name
+    table = model._meta.db_table
+    legacy = '%s%s' % (table, LEGACY_SUFFIX)
+    time_column = model._meta.get_field(model.get_time_field_name()).column
+    pk_column = model._meta.pk.column
+    # a whole interval of margin, so samples saved while the constraint is validated still fit in it
+    boundary = get_next_interval_start(get_next_interval_start(get_interval_start(timezone.now(), interval),
+                                                               interval), interval)
+    constraint = '%s_range' % legacy
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('SELECT max(%s) FROM %s' % (quote_name(time_column), quote_name(table)))
+        last_time = cursor.fetchone()[0]
+        if last_time is not None and last_time >= boundary:
+            boundary = get_next_interval_start(get_interval_start(last_time, interval), interval)
+        cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s CHECK (%s IS NOT NULL AND %s < %%s) NOT VALID' %
+                       (quote_name(table), quote_name(constraint), quote_name(time_column),
+                        quote_name(time_column)), [boundary])
+
+    # only takes a SHARE UPDATE EXCLUSIVE lock, so the table stays readable and writable while it is scanned
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE %s VALIDATE CONSTRAINT %s' % (quote_name(table), quote_name(constraint)))
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE %s RENAME TO %s' % (quote_name(table), quote_name(legacy)))
+        cursor.execute('CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMMENTS) '
+                       'PARTITION BY RANGE (%s)' % (quote_name(table), quote_name(legacy), quote_name(time_column)))
+        cursor.execute('ALTER TABLE %s ADD PRIMARY KEY (%s, %s)' %
+                       (quote_name(table), quote_name(pk_column), quote_name(time_column)))
+        for field in model._meta.concrete_fields:
+            if field.related_model is not None and getattr(field, 'db_constraint', False):
+                target = field.related_model._meta
+                cursor.execute('ALTER TABLE %s ADD FOREIGN KEY (%s) REFERENCES %s (%s) DEFERRABLE INITIALLY DEFERRED' %
+                               (quote_name(table), quote_name(field.column), quote_name(target.db_table),
+                                quote_name(target.pk.column)))
+        cursor.execute('CREATE INDEX %s ON %s (%s)' % (quote_name('%s_time' % table), quote_name(table),
+                                                       quote_name(time_column)))
+        index = get_flight_time_index(model)
+        if index is not None:
+            cursor.execute('CREATE INDEX %s ON %s (%s, %s)' % (quote_name('%s_flight_time' % table),
+                                                               quote_name(table),
+                                                               quote_name(model._meta.get_field(index[0]).column),
+                                                               quote_name(time_column)))
+
+        # the validated check constraint lets ATTACH skip its own scan of the rows
+        cursor.execute('ALTER TABLE %s ATTACH PARTITION %s FOR VALUES FROM (MINVALUE) TO (%%s)' %
+                       (quote_name(table), quote_name(legacy)), [boundary])
+        cursor.execute('ALTER TABLE %s DROP CONSTRAINT %s' % (quote_name(legacy), quote_name(constraint)))
+    create_partitions(model, boundary, 1, interval)
+    return legacy
+
+
+def detach_partitions(model, before, drop=False, concurrently=False):
+    """
+    Detach the partitions whose rows are all before a time, ie to archive or drop them.
+    Detaching only takes a short lock on the parent table, and with concurrently (PostgreSQL 14) it does not block
+    queries at all.  Detached tables keep their rows and can be dumped, moved or attached again.
+    :param model: a partitioned TimeSeriesModel subclass
+    :param before: a timezone aware datetime
+    :param drop: True to drop the detached tables
+    :param concurrently: True to use DETACH PARTITION ... CONCURRENTLY, which cannot run in a transaction
+    :return: the names of the detached partitions
+    """
+    connection = get_connection(model)
+    quote_name = connection.ops.quote_name
+    detached = []
+    for name, upper in sorted(get_partitions(model), key=lambda p: p[1]):
+        if upper is None or upper > before:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE %s DETACH PARTITION %s%s' % (quote_name(model._meta.db_table),
+                                                                   quote_name(name),
+                                                                   ' CONCURRENTLY' if concurrently else ''))
+            if drop:
+                cursor.execute('DROP TABLE %s' % quote_name(name))
+        detached.append(name)
+    return detached
@@ -28,6 +28,7 @@ urlpatterns = [url(r'^classes/metadata/json$', views.get_time_series_classes_met
                url(r'^classes/example/json$', views.get_time_series_classes_json, {'skip_example': False},
                    'timeseries_classes_json_example'),
                url(r'^min_max/json$', views.get_min_max_json, {}, 'timeseries_min_max_json'),
+               url(r'^statistics/json$', views.get_statistics_json, {}, 'timeseries_statistics_json'),
                url(r'^values/json$', views.get_values_json, {'packed': False}, 'timeseries_values_json'),
                url(r'^values/flight/json$', views.get_flight_values_json, {'packed': False}, 'timeseries_flight_values_json'),
                url(r'^values/flight/time/json$', views.get_flight_values_time_json, {'packed': False}, 'timeseries_flight_time_values_json'),
@@ -35,6 +36,21 @@ urlpatterns = [url(r'^classes/metadata/json$', views.get_time_series_classes_met
                url(r'^values/flight/time/downsample/json$', views.get_flight_values_time_json, {'packed': False, 'downsample': settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS}, 'timeseries_flight_time_values_json'),
                url(r'^values/list/json$', views.get_values_json, {}, 'timeseries_values_list_json'),
                url(r'^values/flight/list/json$', views.get_flight_values_json, {}, 'timeseries_flight_values_list_json'),
+               url(r'^values/stream/json$', views.get_values_json, {'packed': False, 'stream': True}, 'timeseries_values_stream_json'),
+               url(r'^values/list/stream/json$', views.get_values_json, {'stream': True}, 'timeseries_values_list_stream_json'),
+               url(r'^values/flight/stream/json$', views.get_flight_values_json, {'packed': False, 'stream': True}, 'timeseries_flight_values_stream_json'),
+               url(r'^values/flight/list/stream/json$', views.get_flight_values_json, {'stream': True}, 'timeseries_flight_values_list_stream_json'),
+               url(r'^values/since/json$', views.get_values_since_json, {'packed': False}, 'timeseries_values_since_json'),
+               url(r'^values/since/list/json$', views.get_values_since_json, {}, 'timeseries_values_since_list_json'),
+               url(r'^values/flight/times/json$', views.get_flight_values_times_json, {'packed': False}, 'timeseries_flight_times_values_json'),
+               url(r'^values/flight/times/list/json$', views.get_flight_values_times_json, {}, 'timeseries_flight_times_values_list_json'),
+               url(r'^values/models/time/json$', views.get_models_values_time_json, {'packed': False}, 'timeseries_models_time_values_json'),
+               url(r'^values/models/time/list/json$', views.get_models_values_time_json, {}, 'timeseries_models_time_values_list_json'),
                url(r'^values/flight/time/list/json$', views.get_flight_values_time_json, {}, 'timeseries_flight_values_time_list_json'),
+               url(r'^combined/json$', views.get_combined_json, {'packed': False}, 'timeseries_combined_json'),
+               url(r'^combined/list/json$', views.get_combined_json, {}, 'timeseries_combined_list_json'),
+               url(r'^aligned/json$', views.get_aligned_json, {'packed': False}, 'timeseries_aligned_json'),
+               url(r'^aligned/list/json$', views.get_aligned_json, {}, 'timeseries_aligned_list_json'),
+               url(r'^metrics/prometheus$', views.get_metrics_prometheus, {}, 'timeseries_metrics_prometheus'),
                url(r'^channel_descriptions/json$', views.get_channel_descriptions_json, {}, 'timeseries_channel_descriptions_json'),
                ]
@@ -15,6 +15,78 @@
 //__END_LICENSE__
 
 BLANKS = '';
+TIMESERIES_BINARY_CONTENT_TYPE = 'application/vnd.xgds.timeseries';
+
+parseTimeseriesColumns = function(buffer) {
+    // Read the binary columnar format described in xgds_timeseries/util.py into typed arrays, without copying floats.
+    // Returns a dictionary of arrays by column name; int64 columns (pk, time in epoch ms) become Float64Arrays.
+    var view = new DataView(buffer);
+    var headerLength = view.getUint32(4, true);
+    var header = JSON.parse(new TextDecoder('utf-8').decode(new Uint8Array(buffer, 8, headerLength)));
+    var offset = 8 + headerLength;
+    var result = {};
+    _.each(header.columns, function(column) {
+        var array;
+        if (column.dtype == '<f8') {
+            array = new Float64Array(buffer, offset, header.count);
+        } else if (column.dtype == '<f4') {
+            array = new Float32Array(buffer, offset, header.count);
+        } else if (column.dtype == '<i8') {
+            array = Float64Array.from(new BigInt64Array(buffer, offset, header.count), Number);
+        } else {
+            throw 'Unsupported column type ' + column.dtype;
+        }
+        result[column.name] = array;
+        var size = parseInt(column.dtype.substring(2)) * header.count;
+        offset += size + ((8 - size % 8) % 8);
+    });
+    return result;
+};
+
+parseTimeseriesFrames = function(buffer) {
+    // Read the binary frames of a combined response (see encode_frame in xgds_timeseries/util.py).
+    // Returns a dictionary by model name of the frame header, with values set to the parsed columns.
+    var view = new DataView(buffer);
+    var offset = 0;
+    var result = {};
+    while (offset < buffer.byteLength) {
+        var headerLength = view.getUint32(offset, true);
+        var dataLength = view.getUint32(offset + 4, true);
+        offset += 8;
+        var header = JSON.parse(new TextDecoder('utf-8').decode(new Uint8Array(buffer, offset, headerLength)));
+        offset += headerLength;
+        if (dataLength > 0) {
+            header.values = parseTimeseriesColumns(buffer.slice(offset, offset + dataLength));
+        }
+        offset += dataLength;
+        result[header.model_name] = header;
+    }
+    return result;
+};
+
+loadCombinedTimeseries = function(models, options, success, error) {
+    // Get the channel descriptions, min/max and values of many models in one request.
+    // models is a list of {model_name: name, channel_names: [names]}; options holds the shared flight_ids,
+    // start_time, end_time, downsample, max_points and parts; with options.format == 'binary' the values are
+    // typed arrays.  success is called with a dictionary of the results by model name.
+    var data = Object.assign({}, options, {models: JSON.stringify(models)});
+    var request = new XMLHttpRequest();
+    request.open('POST', '/timeseries/combined/json');
+    request.responseType = options.format == 'binary' ? 'arraybuffer' : 'json';
+    request.setRequestHeader('Content-Type', 'application/x-www-form-urlencoded; charset=UTF-8');
+    request.setRequestHeader('X-CSRFToken', Cookies.get('csrftoken'));
+    request.onload = function() {
+        if (request.status != 200) {
+            if (error) error(request);
+            return;
+        }
+        success(options.format == 'binary' ? parseTimeseriesFrames(request.response) : request.response);
+    };
+    request.onerror = function() {
+        if (error) error(request);
+    };
+    request.send($.param(data, true));
+};
 
 $(function() {
     app.views = app.views || {};
@@ -237,6 +309,10 @@ $(function() {
                 this.loadData();
             },
             loadData: function(){
+                if (this.postOptions.format == 'binary') {
+                    this.loadBinaryData();
+                    return;
+                }
                 $.ajax({
                     url: '/timeseries/values/flight/downsample/json',
                     dataType: 'json',
@@ -259,35 +335,137 @@ $(function() {
                                 }.bind(this));
                             }.bind(this));
 
+                            this.finishLoadData();
+                        }
+                    }, this),
+                    error: $.proxy(function(data) {
+                        this.trigger('setMessage', "Search failed.");
+                    }, this)
+                });
+            },
+            loadBinaryData: function(){
+                // same as loadData, but the values come back as typed arrays in the binary columnar format
+                var request = new XMLHttpRequest();
+                request.open('POST', '/timeseries/values/flight/downsample/json');
+                request.responseType = 'arraybuffer';
+                request.setRequestHeader('Content-Type', 'application/x-www-form-urlencoded; charset=UTF-8');
+                request.setRequestHeader('Accept', TIMESERIES_BINARY_CONTENT_TYPE);
+                request.setRequestHeader('X-CSRFToken', Cookies.get('csrftoken'));
+                request.onload = function() {
+                    if (request.status == 204) {
+                        this.trigger('setMessage', "None found.");
+                        return;
+                    } else if (request.status != 200) {
+                        this.trigger('setMessage', "Search failed.");
+                        return;
+                    }
+                    this.trigger('clearMessage');
+                    var columns = parseTimeseriesColumns(request.response);
+                    var times = columns['timestamp'];
+                    _.each(Object.keys(this.channel_descriptions), function(field_name, index, list) {
+                        var data_array = this.channel_descriptions[field_name].get('data');
+                        var values = columns[field_name];
+                        for (var i = 0; i < times.length; i++) {
+                            if (data_array.length > 1 && times[i] <= data_array[data_array.length - 1][0]) continue;
+                            data_array.push([times[i], isNaN(values[i]) ? null : values[i]]);
+                        }
+                    }.bind(this));
+                    this.finishLoadData();
+                }.bind(this);
+                request.onerror = function() {
+                    this.trigger('setMessage', "Search failed.");
+                }.bind(this);
+                request.send($.param(this.postOptions));
+            },
+            finishLoadData: function() {
+                _.each(Object.keys(this.channel_descriptions), function(field_name, index, list) {
+                    let data_array = this.channel_descriptions[field_name].get('data');
+                    let new_data_array = [data_array[0]];
+                    for (let i = 1; i < data_array.length; i++) {
+                        let current_time = data_array[i][0] / 1000.0;
+                        let previous_time = data_array[i - 1][0] / 1000.0;
+                        let interval = this.channel_descriptions[field_name].get('interval');
+                        interval = 10; // TODO: change me!
+                        if ((current_time - previous_time) > interval) {
+                            // we need to insert a null here
+                            new_data_array.push([null, null]);
+                        }
+                        new_data_array.push(data_array[i]);
+                    }
+                    this.channel_descriptions[field_name].set('data', new_data_array);
+                }.bind(this));
+
+                this.startPolling();
+
+                if ('flight_ids' in this.postOptions && this.postOptions['stateful'] == "true") {
+                    // make sure we have the last data for the flight
+                    this.loadLastFlightData();
+                } else {
+                    this.initialized = true;
+                    playback.addListener(this.playback);
+                    app.vent.trigger('data:loaded', this.postOptions.model_name);
+                }
+            },
+            startPolling: function() {
+                // during a live flight, set postOptions.poll_seconds to fetch only the new samples that often
+                if (_.isUndefined(this.postOptions.poll_seconds) || !_.isUndefined(this.pollTimer)) return;
+                if (_.isUndefined(this.cursor)) {
+                    var last_time = undefined;
+                    _.each(Object.keys(this.channel_descriptions), function(field_name, index, list) {
+                        var data_array = this.channel_descriptions[field_name].get('data');
+                        if (data_array.length > 0 && data_array[data_array.length - 1][0] !== null) {
+                            last_time = _.isUndefined(last_time) ? data_array[data_array.length - 1][0] : Math.max(last_time, data_array[data_array.length - 1][0]);
+                        }
+                    }.bind(this));
+                    if (!_.isUndefined(last_time)) {
+                        this.cursor = {time: moment(last_time).toISOString(), pk: null};
+                    }
+                }
+                this.pollTimer = setInterval(this.pollSince.bind(this), this.postOptions.poll_seconds * 1000);
+            },
+            stopPolling: function() {
+                if (!_.isUndefined(this.pollTimer)) {
+                    clearInterval(this.pollTimer);
+                    this.pollTimer = undefined;
+                }
+            },
+            pollSince: function() {
+                // get the values saved after our cursor, and the next cursor
+                if (this.polling) return;
+                var options = Object.assign({}, this.postOptions);
+                if (!_.isUndefined(this.cursor)) {
+                    options.since_time = this.cursor.time;
+                    if (this.cursor.pk !== null) {
+                        options.since_pk = this.cursor.pk;
+                    }
+                }
+                this.polling = true;
+                $.ajax({
+                    url: '/timeseries/values/since/json',
+                    dataType: 'json',
+                    data: options,
+                    type: 'POST',
+                    success: $.proxy(function(data) {
+                        this.polling = false;
+                        if (_.isUndefined(data) || data.values.length === 0){
+                            return;
+                        }
+                        this.cursor = data.cursor;
+                        _.each(data.values, function(data_block) {
+                            var the_time = moment(data_block['timestamp']).valueOf();
                             _.each(Object.keys(this.channel_descriptions), function(field_name, index, list) {
-                                let data_array = this.channel_descriptions[field_name].get('data');
-                                let new_data_array = [data_array[0]];
-                                for (let i = 1; i < data_array.length; i++) {
-                                    let current_time = data_array[i][0] / 1000.0;
-                                    let previous_time = data_array[i - 1][0] / 1000.0;
-                                    let interval = this.channel_descriptions[field_name].get('interval');
-                                    interval = 10; // TODO: change me!
-                                    if ((current_time - previous_time) > interval) {
-                                        // we need to insert a null here
-                                        new_data_array.push([null, null]);
-                                    }
-                                    new_data_array.push(data_array[i]);
-                                }
-                                this.channel_descriptions[field_name].set('data', new_data_array);
+                                var data_array = this.channel_descriptions[field_name].get('data');
+                                if (data_array.length > 0 && the_time <= data_array[data_array.length - 1][0]) return;
+                                data_array.push([the_time, data_block[field_name]]);
                             }.bind(this));
-
-                            if ('flight_ids' in this.postOptions && this.postOptions['stateful'] == "true") {
-                                // make sure we have the last data for the flight
-                                this.loadLastFlightData();
-                            } else {
-                                this.initialized = true;
-                                playback.addListener(this.playback);
-                                app.vent.trigger('data:loaded', this.postOptions.model_name);
-                            }
+                        }.bind(this));
+                        app.vent.trigger("rerenderPlot:" + this.model_name);
+                        if (data.more) {
+                            this.pollSince();
                         }
                     }, this),
                     error: $.proxy(function(data) {
-                        this.trigger('setMessage', "Search failed.");
+                        this.polling = false;
                     }, this)
                 });
             },
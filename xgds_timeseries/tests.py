@@ -22,7 +22,14 @@ from django.http import HttpResponseForbidden, Http404, JsonResponse
 
 
 from xgds_timeseries import views
-from xgds_timeseries.models import TimeSeriesExample
+from xgds_timeseries.util import decode_columns, decimate, BINARY_CONTENT_TYPE, DECIMATION_METHODS
+from xgds_timeseries.importer import import_timeseries
+import datetime
+import math
+import os
+from django.utils import timezone
+from xgds_timeseries.models import TimeSeriesExample, TimeSeriesDynamicExample, TimeSeriesRollup, rebuild_rollups, \
+    TimeSeriesFlightSummary, rebuild_flight_summary, ChannelDescription
 
 
 class xgds_timeseriesTest(TransactionTestCase):
@@ -88,6 +95,19 @@ class xgds_timeseriesTest(TransactionTestCase):
                 found_timeseries_example = True
         self.assertEqual(found_timeseries_example, True)
 
+    def test_get_timeseries_classes_metadata_flights(self):
+        """
+        Test that the classes with data for a flight are found in one batch and then remembered
+        """
+        views.FLIGHT_METADATA_MEMO.clear()
+        with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=True), self.assertNumQueries(2):
+            result = views.get_time_series_classes_metadata(skip_example=False, flight_ids=[22])
+        model_names = [entry['model_name'] for entry in result]
+        self.assertIn('xgds_timeseries.TimeSeriesExample', model_names)
+        self.assertNotIn('xgds_timeseries.TimeSeriesDynamicExample', model_names)
+        with self.assertNumQueries(0):
+            self.assertEqual(views.get_time_series_classes_metadata(skip_example=False, flight_ids=['22']), result)
+
     def test_get_timeseries_classes_and_titles(self):
         """
         Test getting the timeseries classes and titles including the example one
@@ -226,6 +246,167 @@ class xgds_timeseriesTest(TransactionTestCase):
         self.assertEqual(humidity_dict["max"], 45)
         self.assertEqual(humidity_dict["min"], 45)
 
+    def test_get_min_max_statistics(self):
+        """
+        Test that min, max, count, mean and stddev come back from a single query
+        """
+        with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=False), self.assertNumQueries(1):
+            result = TimeSeriesExample.objects.get_min_max(flight_ids=[22], channel_names=['temperature'])
+        temp_dict = result['temperature']
+        self.assertEqual(temp_dict['count'], 100)
+        self.assertTrue(temp_dict['min'] <= temp_dict['mean'] <= temp_dict['max'])
+        self.assertTrue(temp_dict['stddev'] >= 0)
+        self.assertNotIn('count', result['timestamp'])
+
+    def test_get_min_max_flight_summary(self):
+        """
+        Test that whole flight min/max and the extent come from the rebuilt flight summary
+        """
+        expected = TimeSeriesExample.objects.get_min_max(flight_ids=[22])
+        summary = rebuild_flight_summary(TimeSeriesExample, 22)
+        self.assertEqual(summary.row_count, 100)
+        with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=True), self.assertNumQueries(1):
+            result = TimeSeriesExample.objects.get_min_max(flight_ids=[22])
+        self.assertEqual(result['timestamp'], expected['timestamp'])
+        self.assertEqual(result['pk'], expected['pk'])
+        for name in ('temperature', 'pressure', 'humidity'):
+            self.assertEqual(result[name]['min'], expected[name]['min'])
+            self.assertEqual(result[name]['max'], expected[name]['max'])
+            self.assertEqual(result[name]['count'], expected[name]['count'])
+            self.assertAlmostEqual(result[name]['mean'], expected[name]['mean'])
+        extent = TimeSeriesExample.objects.get_flight_extent([22])
+        self.assertEqual(extent['row_count'], 100)
+        self.assertEqual(extent['start_time'], expected['timestamp']['min'])
+
+    def test_flight_archive(self):
+        """
+        Test that an archived flight is read from its memory mapped files, with the same values as the database
+        """
+        import shutil
+        import tempfile
+        from xgds_timeseries.archive import write_flight_archive
+        channel_names = ['temperature', 'pressure']
+        archive_dir = tempfile.mkdtemp()
+        try:
+            expected = list(TimeSeriesExample.objects.get_flight_values([22], channel_names))
+            expected_downsampled = list(TimeSeriesExample.objects.get_flight_values([22], channel_names, downsample=5))
+            with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=False):
+                expected_min_max = TimeSeriesExample.objects.get_min_max(flight_ids=[22])
+            with self.settings(XGDS_TIMESERIES_ARCHIVE_DIR=archive_dir):
+                self.assertEqual(write_flight_archive(TimeSeriesExample, 22), 100)
+                with self.assertNumQueries(0):
+                    values = list(TimeSeriesExample.objects.get_flight_values([22], channel_names))
+                    downsampled = list(TimeSeriesExample.objects.get_flight_values([22], channel_names, downsample=5))
+                    in_range = list(TimeSeriesExample.objects.get_values(expected[10]['timestamp'],
+                                                                         expected[19]['timestamp'], [22]))
+                    min_max = TimeSeriesExample.objects.get_min_max(flight_ids=[22])
+            self.assertEqual(values, expected)
+            self.assertEqual(downsampled, expected_downsampled)
+            self.assertEqual(len(in_range), 10)
+            self.assertEqual(min_max['timestamp'], expected_min_max['timestamp'])
+            self.assertEqual(min_max['temperature']['max'], expected_min_max['temperature']['max'])
+            self.assertEqual(min_max['pressure']['count'], expected_min_max['pressure']['count'])
+        finally:
+            shutil.rmtree(archive_dir)
+
+    def test_flight_archive_deleted_on_change(self):
+        """
+        Test that saving or deleting a sample of an archived flight deletes its archive, so reads see the change
+        """
+        import shutil
+        import tempfile
+        from xgds_timeseries.archive import write_flight_archive
+        archive_dir = tempfile.mkdtemp()
+        try:
+            with self.settings(XGDS_TIMESERIES_ARCHIVE_DIR=archive_dir):
+                write_flight_archive(TimeSeriesExample, 22)
+                self.assertIsNotNone(TimeSeriesExample.objects.get_flight_archives([22]))
+                sample = TimeSeriesExample.objects.get(pk=1380)
+                sample.temperature = 1000
+                sample.save()
+                self.assertIsNone(TimeSeriesExample.objects.get_flight_archives([22]))
+                values = list(TimeSeriesExample.objects.get_flight_values([22], ['temperature']))
+                self.assertIn(1000, [value['temperature'] for value in values])
+
+                write_flight_archive(TimeSeriesExample, 22)
+                sample.delete()
+                self.assertIsNone(TimeSeriesExample.objects.get_flight_archives([22]))
+                self.assertEqual(len(list(TimeSeriesExample.objects.get_flight_values([22]))), 99)
+        finally:
+            shutil.rmtree(archive_dir)
+
+    def test_get_statistics(self):
+        """
+        Test the percentiles, histogram and moments of the channels
+        """
+        with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=False):
+            expected = TimeSeriesExample.objects.get_min_max(flight_ids=[22])
+        result = TimeSeriesExample.objects.get_statistics(flight_ids=[22], channel_names=['temperature'],
+                                                          percentiles=[0, 50, 100], bins=4)
+        temperature = result['temperature']
+        self.assertEqual(temperature['count'], 100)
+        self.assertAlmostEqual(temperature['mean'], expected['temperature']['mean'])
+        self.assertAlmostEqual(temperature['stddev'], expected['temperature']['stddev'])
+        self.assertAlmostEqual(temperature['percentiles']['0'], expected['temperature']['min'], places=2)
+        self.assertAlmostEqual(temperature['percentiles']['100'], expected['temperature']['max'], places=2)
+        self.assertTrue(temperature['min'] <= temperature['percentiles']['50'] <= temperature['max'])
+        self.assertEqual(len(temperature['histogram']['edges']), 5)
+        self.assertEqual(sum(temperature['histogram']['counts']), 100)
+
+    def test_get_statistics_outdated_summary(self):
+        """
+        Test the histogram bounds come from the samples, so values outside an outdated summary are still counted
+        """
+        rebuild_flight_summary(TimeSeriesExample, 22)
+        # QuerySet.update() sends no signals, so the summary keeps the old max
+        TimeSeriesExample.objects.filter(pk=1380).update(temperature=1000)
+        with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=True):
+            result = TimeSeriesExample.objects.get_streaming_statistics(None, None, [22], None, ['temperature'], 0,
+                                                                        [100], 4)
+        temperature = result['temperature']
+        self.assertEqual(temperature['max'], 1000)
+        self.assertEqual(sum(temperature['histogram']['counts']), 100)
+
+    def test_get_statistics_json(self):
+        """
+        Test the statistics endpoint
+        """
+        response = self.client.post(reverse('timeseries_statistics_json'),
+                                    {'model_name': 'xgds_timeseries.TimeSeriesExample',
+                                     'channel_names': ['temperature', 'pressure'],
+                                     'flight_ids': [22],
+                                     'percentiles': [50, 99],
+                                     'bins': 10})
+        content = self.is_good_json_response(response)
+        self.assertEqual(sorted(content['pressure']['percentiles'].keys()), ['50', '99'])
+        self.assertEqual(len(content['pressure']['histogram']['counts']), 10)
+        response = self.client.post(reverse('timeseries_statistics_json'),
+                                    {'model_name': 'xgds_timeseries.TimeSeriesExample',
+                                     'flight_ids': [22],
+                                     'bins': 10 ** 9})
+        self.assertEqual(response.status_code, 405)
+
+    def test_flight_summary_on_save(self):
+        """
+        Test that saving a sample updates a rebuilt flight summary, and deleting one marks it stale
+        """
+        with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=True):
+            last = TimeSeriesExample.objects.filter(flight_id=22).last()
+            TimeSeriesExample.objects.create(timestamp=last.timestamp + datetime.timedelta(seconds=1), flight_id=22,
+                                             temperature=50, pressure=1, humidity=1)
+            self.assertFalse(TimeSeriesFlightSummary.objects.exists())
+            rebuild_flight_summary(TimeSeriesExample, 22)
+            added = TimeSeriesExample.objects.create(timestamp=last.timestamp + datetime.timedelta(seconds=2),
+                                                     flight_id=22, temperature=60, pressure=1, humidity=1)
+            summary = TimeSeriesFlightSummary.objects.get(model_name='xgds_timeseries.TimeSeriesExample',
+                                                          flight_id=22)
+            self.assertEqual(summary.row_count, 102)
+            self.assertEqual(summary.get_channel_statistics()['temperature']['max'], 60)
+            self.assertTrue(TimeSeriesExample.objects.has_flight_data([22]))
+            added.delete()
+            self.assertIsNone(TimeSeriesExample.objects.get_flight_summaries([22]))
+            self.assertEqual(TimeSeriesExample.objects.get_min_max(flight_ids=[22])['temperature']['max'], 50)
+
     def test_get_min_max_none(self):
         """
         Test getting the min and max values with a bad filter
@@ -339,6 +520,46 @@ class xgds_timeseriesTest(TransactionTestCase):
         self.assertEqual(first['temperature'], 8.13)
         self.assertEqual(first['pressure'], 3.98)
 
+    def test_get_flight_values_cached(self):
+        """
+        Test that a repeated request is served from the response cache until a sample is saved into it or deleted,
+        and that a change log which is not shared between processes is refused
+        """
+        import shutil
+        import tempfile
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+        from xgds_timeseries.cache import get_change_log_cache
+
+        url = reverse('timeseries_flight_values_json')
+        change_log_dir = tempfile.mkdtemp()
+        caches = dict(settings.CACHES)
+        caches['timeseries_changes'] = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                        'LOCATION': change_log_dir}
+        try:
+            with self.settings(CACHES=caches, XGDS_TIMESERIES_RESPONSE_CACHE='local',
+                               XGDS_TIMESERIES_CHANGE_LOG_CACHE='timeseries_changes'):
+                first = self.client.post(url, self.post_dict)
+                self.assertEqual(first.status_code, 200)
+                with self.assertNumQueries(0):
+                    cached = self.client.post(url, self.post_dict)
+                self.assertEqual(cached.content, first.content)
+                last = TimeSeriesExample.objects.filter(flight_id=22).last()
+                added = TimeSeriesExample.objects.create(timestamp=last.timestamp + datetime.timedelta(seconds=1),
+                                                         flight_id=22, temperature=1, pressure=1, humidity=1)
+                updated = self.client.post(url, self.post_dict)
+                self.assertEqual(len(json.loads(updated.content)), 101)
+                added.delete()
+                updated = self.client.post(url, self.post_dict)
+                self.assertEqual(len(json.loads(updated.content)), 100)
+            caches['timeseries_changes_local'] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+            with self.settings(CACHES=caches, XGDS_TIMESERIES_RESPONSE_CACHE='local',
+                               XGDS_TIMESERIES_CHANGE_LOG_CACHE='timeseries_changes_local'):
+                with self.assertRaises(ImproperlyConfigured):
+                    get_change_log_cache()
+        finally:
+            shutil.rmtree(change_log_dir)
+
     def test_get_flight_values_downsample(self):
         """
         Test getting the values downsampled
@@ -350,6 +571,33 @@ class xgds_timeseriesTest(TransactionTestCase):
         self.assertEqual(len(content), 21)
         self.post_dict['downsample'] = 0
 
+    def test_get_flight_values_max_points(self):
+        """
+        Test getting at most max_points values, keeping the humidity spikes
+        """
+        response = self.client.post(reverse('timeseries_flight_values_json'),
+                                    {'model_name': 'xgds_timeseries.TimeSeriesExample',
+                                     'channel_names': ['humidity'],
+                                     'flight_ids': [22],
+                                     'max_points': 20,
+                                     'method': 'minmax'})
+        content = self.is_good_json_response(response, is_list=True)
+        self.assertTrue(len(content) <= 20)
+        self.assertEqual(content[0]['pk'], 1375)
+        self.assertEqual(content[-1]['pk'], 1474)
+        self.assertEqual(max([entry['humidity'] for entry in content]), 100)
+
+    def test_decimate_max_points_many_channels(self):
+        """
+        Test decimating many channels never returns more than max_points samples
+        """
+        values = TimeSeriesExample.objects.get_flight_values([22])
+        times = [entry['timestamp'] for entry in values]
+        columns = [[entry[name] for entry in values] for name in TimeSeriesExample.get_channel_names()] * 2
+        for method in DECIMATION_METHODS:
+            for max_points in (3, 5, 10):
+                self.assertTrue(len(decimate(times, columns, max_points, method)) <= max_points)
+
     def test_get_packed_flight_values_all(self):
         """
         Test getting all the values, as a list of lists
@@ -364,6 +612,311 @@ class xgds_timeseriesTest(TransactionTestCase):
         self.assertEqual(first[2], 8.13)
         self.assertEqual(first[3], 3.98)
 
+    def test_get_flight_values_rollups(self):
+        """
+        Test getting downsampled values from the 10 second rollups
+        """
+        TimeSeriesExample.rollup = True
+        try:
+            rebuild_rollups(TimeSeriesExample, 22)
+            self.assertTrue(TimeSeriesRollup.objects.filter(resolution=10).exists())
+            values = TimeSeriesExample.objects.get_flight_values([22], ['temperature', 'pressure'], downsample=10)
+            self.assertIsInstance(values, list)
+            self.assertEqual(len(values), 15)
+            first = values[0]
+            self.assertEqual(first['pk'], 1375)
+            self.assertEqual(first['temperature'], 8.13)
+            self.assertEqual(first['pressure'], 3.98)
+        finally:
+            TimeSeriesExample.rollup = False
+
+    def test_rollups_only_for_rebuilt_flights(self):
+        """
+        Test a sample saved before the flight was rebuilt does not make rollups which stand in for the flight
+        """
+        TimeSeriesExample.rollup = True
+        try:
+            last = TimeSeriesExample.objects.order_by('-timestamp').first()
+            TimeSeriesExample.objects.create(timestamp=last.timestamp + datetime.timedelta(seconds=1), flight_id=22,
+                                             temperature=1.0, pressure=2.0, humidity=3.0)
+            self.assertFalse(TimeSeriesRollup.objects.exists())
+            self.assertIsNone(TimeSeriesExample.objects.get_rollup_values(flight_ids=[22], downsample=10))
+            rebuild_rollups(TimeSeriesExample, 22)
+            rollups = TimeSeriesRollup.objects.filter(resolution=10, channel='temperature')
+            count = sum(rollups.values_list('count', flat=True))
+            TimeSeriesExample.objects.create(timestamp=last.timestamp + datetime.timedelta(seconds=2), flight_id=22,
+                                             temperature=1.0, pressure=2.0, humidity=3.0)
+            self.assertEqual(sum(rollups.values_list('count', flat=True)), count + 1)
+        finally:
+            TimeSeriesExample.rollup = False
+
+    def test_rollups_not_used_after_change(self):
+        """
+        Test the rollups of a flight are not used once one of its samples is changed or deleted, until it is rebuilt,
+        and are only used for a downsample which matches a rollup level
+        """
+        TimeSeriesExample.rollup = True
+        try:
+            rebuild_rollups(TimeSeriesExample, 22)
+            self.assertIsNotNone(TimeSeriesExample.objects.get_rollup_values(flight_ids=[22], downsample=10))
+            self.assertIsNone(TimeSeriesExample.objects.get_rollup_values(flight_ids=[22], downsample=5))
+            sample = TimeSeriesExample.objects.get(pk=1380)
+            sample.temperature = 1000
+            sample.save()
+            self.assertIsNone(TimeSeriesExample.objects.get_rollup_values(flight_ids=[22], downsample=10))
+            rebuild_rollups(TimeSeriesExample, 22)
+            self.assertIsNotNone(TimeSeriesExample.objects.get_rollup_values(flight_ids=[22], downsample=10))
+            sample.delete()
+            self.assertIsNone(TimeSeriesExample.objects.get_rollup_values(flight_ids=[22], downsample=10))
+        finally:
+            TimeSeriesExample.rollup = False
+
+    def test_get_flight_values_stream(self):
+        """
+        Test streaming all the values, as a list of lists
+        """
+        response = self.client.post(reverse('timeseries_flight_values_list_stream_json'), self.post_dict)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(content), 100)
+        first = content[0]
+        self.assertEqual(first[0], 1375)
+        self.assertEqual(first[1], '2017-11-10T23:15:01.284000+00:00')
+
+    def test_get_flight_values_stream_none(self):
+        """
+        Test streaming no values because bad flight ids
+        """
+        response = self.client.post(reverse('timeseries_flight_values_stream_json'),
+                                    {'model_name': 'xgds_timeseries.TimeSeriesExample',
+                                     'flight_ids': [55, 42]})
+        self.assertEqual(response.status_code, 204)
+
+    def test_get_flight_values_binary(self):
+        """
+        Test getting all the values in the binary columnar format
+        """
+        post_dict = dict(self.post_dict)
+        post_dict['dtype'] = 'float32'
+        response = self.client.post(reverse('timeseries_flight_values_list_json'), post_dict,
+                                    HTTP_ACCEPT=BINARY_CONTENT_TYPE)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], BINARY_CONTENT_TYPE)
+        columns = decode_columns(response.content)
+        self.assertEqual(list(columns.keys()), ['pk', 'timestamp', 'temperature', 'pressure'])
+        self.assertEqual(len(columns['pk']), 100)
+        self.assertEqual(columns['pk'][0], 1375)
+        self.assertEqual(columns['timestamp'][0], 1510355701284)
+        self.assertAlmostEqual(columns['temperature'][0], 8.13, places=5)
+
+    def test_get_flight_values_precision(self):
+        """
+        Test the values are rounded to the precision of their channels with the default settings, streamed or not
+        """
+        TimeSeriesExample.objects.filter(pk=1375).update(temperature=8.13456)
+        response = self.client.post(reverse('timeseries_flight_values_list_json'), self.post_dict)
+        self.assertEqual(json.loads(response.content)[0][2], 8.13)
+        response = self.client.post(reverse('timeseries_flight_values_json'), self.post_dict)
+        self.assertEqual(json.loads(response.content)[0]['temperature'], 8.13)
+        response = self.client.post(reverse('timeseries_flight_values_list_stream_json'), self.post_dict)
+        self.assertEqual(json.loads(b''.join(response.streaming_content))[0][2], 8.13)
+
+    def test_channel_descriptions_json_keeps_descriptions(self):
+        """
+        Test getting the channel descriptions as json leaves the model's descriptions, and so its precisions, intact
+        """
+        response = self.client.post(reverse('timeseries_channel_descriptions_json'),
+                                    {'model_name': 'xgds_timeseries.TimeSeriesExample'})
+        self.assertEqual(json.loads(response.content)['temperature']['precision'], 2)
+        self.assertIsInstance(TimeSeriesExample.channel_descriptions['temperature'], ChannelDescription)
+        self.assertEqual(TimeSeriesExample.get_channel_precisions(), {'temperature': 2, 'pressure': 2, 'humidity': 1})
+
+        TimeSeriesExample.objects.filter(pk=1375).update(temperature=8.13456)
+        response = self.client.post(reverse('timeseries_flight_values_list_json'), self.post_dict)
+        self.assertEqual(json.loads(response.content)[0][2], 8.13)
+
+    def test_channel_dtypes(self):
+        """
+        Test the channel precisions, the compact fields and float32 channels in the binary format
+        """
+        from xgds_timeseries.fields import Float32Field, ScaledIntegerField, get_channel_field
+        field = ScaledIntegerField(decimal_places=2)
+        self.assertEqual(field.get_prep_value(8.13), 813)
+        self.assertEqual(field.from_db_value(813, None, None), 8.13)
+        self.assertIsInstance(get_channel_field({'type': 'float', 'dtype': 'float32'}), Float32Field)
+        self.assertEqual(get_channel_field({'type': 'float', 'dtype': 'scaled', 'precision': 1}).scale, 10)
+        self.assertEqual(TimeSeriesExample.get_channel_precisions(), {'temperature': 2, 'pressure': 2, 'humidity': 1})
+
+        description = TimeSeriesExample.channel_descriptions['pressure']
+        description.dtype = 'float32'
+        try:
+            self.assertEqual(TimeSeriesExample.get_channel_dtypes(), {'pressure': 'float32'})
+            with self.settings(XGDS_TIMESERIES_RESPONSE_CACHE=None):
+                response = self.client.post(reverse('timeseries_flight_values_list_json'), self.post_dict,
+                                            HTTP_ACCEPT=BINARY_CONTENT_TYPE)
+            columns = decode_columns(response.content)
+            self.assertEqual(columns['pressure'].dtype.name, 'float32')
+            self.assertEqual(columns['temperature'].dtype.name, 'float64')
+        finally:
+            description.dtype = None
+
+    def test_get_packed_list_from_queryset(self):
+        """
+        Test that packing a queryset matches packing its dictionaries
+        """
+        values = TimeSeriesExample.objects.get_flight_values([22], ['temperature', 'pressure'])
+        fields = TimeSeriesExample.objects.get_fields(['temperature', 'pressure'])
+        packed = views.get_packed_list(TimeSeriesExample, values, ['temperature', 'pressure'])
+        self.assertEqual([list(row) for row in packed], views.pack_dicts(fields, values))
+        fields, columns = views.get_packed_columns(TimeSeriesExample, values, ['temperature', 'pressure'])
+        self.assertEqual(len(columns), 4)
+        self.assertEqual(columns[0][0], 1375)
+        self.assertEqual(len(columns[2]), 100)
+        with self.assertRaises(KeyError):
+            views.pack_dicts(fields + ['tempurature'], values)
+
+    def test_import_timeseries(self):
+        """
+        Test bulk importing the example tsv in batches
+        """
+        test_data = os.path.join(os.path.dirname(__file__), 'test_data')
+        with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=True):
+            count = import_timeseries(os.path.join(test_data, 'TimeSeries_Example.yaml'),
+                                      os.path.join(test_data, 'example.tsv'),
+                                      flight_id=21, batch_size=30, broadcast=False)
+            self.assertEqual(count, 100)
+            self.assertEqual(TimeSeriesExample.objects.get_flight_extent([21])['row_count'], 100)
+        imported = TimeSeriesExample.objects.filter(flight_id=21)
+        self.assertEqual(imported.count(), 100)
+        first = imported.first()
+        self.assertEqual(first.timestamp, datetime.datetime(2017, 11, 10, 23, 15, 1, 284000, tzinfo=timezone.utc))
+        self.assertEqual(first.temperature, 8.13)
+        self.assertEqual(first.humidity, 45.0)
+
+    def test_get_values_since(self):
+        """
+        Test paging through a flight with the (time, pk) cursor, and that an up to date cursor gets nothing
+        """
+        cursor = (None, None)
+        pks = []
+        while True:
+            values, cursor = TimeSeriesExample.objects.get_values_since(cursor[0], cursor[1], flight_ids=[22],
+                                                                        limit=30)
+            if not values:
+                break
+            pks.extend([value['pk'] for value in values])
+        self.assertEqual(pks, list(range(1375, 1475)))
+        self.assertEqual(cursor[1], 1474)
+
+    def test_get_values_since_json(self):
+        """
+        Test the since endpoint returns only the values after the posted cursor
+        """
+        post_dict = dict(self.post_dict)
+        post_dict['since_time'] = '2017-11-10T23:15:01.284000+00:00'
+        post_dict['since_pk'] = 1375
+        response = self.client.post(reverse('timeseries_values_since_json'), post_dict)
+        content = self.is_good_json_response(response)
+        self.assertEqual(len(content['values']), 99)
+        self.assertEqual(content['values'][0]['pk'], 1376)
+        self.assertEqual(content['cursor']['pk'], 1474)
+        self.assertFalse(content['more'])
+
+    def test_get_dynamic_values_since(self):
+        """
+        Test a channel row saved at the time of a dynamic model's cursor after a poll is returned by the next poll
+        """
+        self.create_dynamic_values()
+        manager = TimeSeriesDynamicExample.objects
+        values, cursor = manager.get_values_since(flight_ids=[22])
+        self.assertEqual(len(values), 3)
+        self.assertIsNone(values[2]['pressure'])
+        TimeSeriesDynamicExample.objects.create(timestamp=cursor[0], flight_id=22, channel_name='pressure', value=1)
+        values, cursor = manager.get_values_since(cursor[0], cursor[1], flight_ids=[22])
+        self.assertEqual(len(values), 1)
+        self.assertEqual(values[0]['pressure'], 1)
+        self.assertEqual(manager.get_values_since(cursor[0], cursor[1], flight_ids=[22])[0], [])
+
+    def test_get_nearest_values(self):
+        """
+        Test the nearest value at or before a time is the latest one, for stateful models too
+        """
+        sample = TimeSeriesExample.objects.get(pk=1380)
+        value = TimeSeriesExample.objects.get_nearest_values(sample.timestamp + datetime.timedelta(milliseconds=500),
+                                                             flight_ids=[22])
+        self.assertEqual(value['pk'], 1380)
+        TimeSeriesExample.stateful = True
+        try:
+            value = TimeSeriesExample.objects.get_nearest_values(sample.timestamp + datetime.timedelta(days=1),
+                                                                 flight_ids=[22])
+        finally:
+            TimeSeriesExample.stateful = False
+        self.assertEqual(value['pk'], 1474)
+
+    def test_get_flight_values_times_json(self):
+        """
+        Test getting the values at many times in one request, in the order posted
+        """
+        sample = TimeSeriesExample.objects.get(pk=1380)
+        later = TimeSeriesExample.objects.get(pk=1390)
+        times = [(later.timestamp + datetime.timedelta(milliseconds=1)).isoformat(),
+                 sample.timestamp.isoformat(),
+                 (sample.timestamp - datetime.timedelta(days=1)).isoformat()]
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('timeseries_flight_times_values_json'),
+                                        {'model_name': 'xgds_timeseries.TimeSeriesExample',
+                                         'flight_ids': [22],
+                                         'times': times})
+        content = self.is_good_json_response(response, is_list=True)
+        self.assertEqual(content[0]['pk'], 1390)
+        self.assertEqual(content[1]['pk'], 1380)
+        self.assertIsNone(content[2])
+
+    def test_get_models_values_time_json(self):
+        """
+        Test getting the values at one time for many models in one request
+        """
+        sample = TimeSeriesExample.objects.get(pk=1380)
+        response = self.client.post(reverse('timeseries_models_time_values_json'),
+                                    {'model_names': ['xgds_timeseries.TimeSeriesExample',
+                                                     'xgds_timeseries.TimeSeriesDynamicExample'],
+                                     'flight_ids': [22],
+                                     'time': sample.timestamp.isoformat()})
+        content = self.is_good_json_response(response)
+        self.assertEqual(content['xgds_timeseries.TimeSeriesExample']['pk'], 1380)
+        self.assertIsNone(content['xgds_timeseries.TimeSeriesDynamicExample'])
+
+    def test_get_combined_json(self):
+        """
+        Test getting the channel descriptions, min/max and values of two models in one request
+        """
+        models = [{'model_name': 'xgds_timeseries.TimeSeriesExample', 'channel_names': ['temperature']},
+                  {'model_name': 'xgds_timeseries.TimeSeriesDynamicExample'}]
+        with self.settings(XGDS_TIMESERIES_COMBINED_THREADS=1):
+            response = self.client.post(reverse('timeseries_combined_json'),
+                                        {'models': json.dumps(models), 'flight_ids': [22], 'downsample': 0})
+            self.assertEqual(response.status_code, 200)
+            content = json.loads(b''.join(response.streaming_content))
+        example = content['xgds_timeseries.TimeSeriesExample']
+        self.assertEqual(list(example['channel_descriptions'].keys()), ['temperature'])
+        self.assertEqual(example['min_max']['temperature']['count'], 100)
+        self.assertEqual(len(example['values']), 100)
+        self.assertEqual(content['xgds_timeseries.TimeSeriesDynamicExample']['values'], [])
+
+    def test_get_combined_json_model_error(self):
+        """
+        Test a model which fails in a combined request gets an error entry, and the json is still complete
+        """
+        models = [{'model_name': 'xgds_timeseries.TimeSeriesExample', 'channel_names': ['bogus']},
+                  {'model_name': 'xgds_timeseries.TimeSeriesDynamicExample'}]
+        response = self.client.post(reverse('timeseries_combined_json'),
+                                    {'models': json.dumps(models), 'flight_ids': [22], 'downsample': 0})
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(b''.join(response.streaming_content))
+        self.assertIn('error', content['xgds_timeseries.TimeSeriesExample'])
+        self.assertEqual(content['xgds_timeseries.TimeSeriesDynamicExample']['values'], [])
+
     def test_get_flight_values_none(self):
         """
         Test get no values because bad flight ids
@@ -408,6 +961,218 @@ class xgds_timeseriesTest(TransactionTestCase):
         self.assertEqual(result.count(), 0)
         self.assertEqual(result.exists(), False)
 
+    def create_dynamic_values(self):
+        """
+        Create three samples of temperature and two of pressure for flight 22
+        """
+        start = datetime.datetime(2017, 11, 10, 23, 15, tzinfo=timezone.utc)
+        for i in range(3):
+            timestamp = start + datetime.timedelta(seconds=i)
+            TimeSeriesDynamicExample.objects.create(timestamp=timestamp, flight_id=22, channel_name='temperature',
+                                                    value=10 + i)
+            if i < 2:
+                TimeSeriesDynamicExample.objects.create(timestamp=timestamp, flight_id=22, channel_name='pressure',
+                                                        value=3 - i)
+
+    def test_get_dynamic_flight_values(self):
+        """
+        Test pivoting the dynamic values in the database, one dictionary per timestamp
+        """
+        self.create_dynamic_values()
+        with self.assertNumQueries(1):
+            values = list(TimeSeriesDynamicExample.objects.get_dynamic_flight_values([22]))
+        self.assertEqual(len(values), 3)
+        self.assertEqual(values[0]['temperature'], 10)
+        self.assertEqual(values[0]['pressure'], 3)
+        self.assertEqual(values[2]['temperature'], 12)
+        self.assertIsNone(values[2]['pressure'])
+
+    def test_get_dynamic_flight_values_packed(self):
+        """
+        Test the packed, streamed packed and binary values of a dynamic model, which have no pk
+        """
+        self.create_dynamic_values()
+        post_dict = {'model_name': 'xgds_timeseries.TimeSeriesDynamicExample',
+                     'channel_names': ['temperature', 'pressure'],
+                     'flight_ids': [22],
+                     'downsample': 0}
+        self.assertEqual(TimeSeriesDynamicExample.objects.get_packed_fields(['temperature', 'pressure']),
+                         ['timestamp', 'temperature', 'pressure'])
+        with self.settings(XGDS_TIMESERIES_RESPONSE_CACHE=None):
+            response = self.client.post(reverse('timeseries_flight_values_list_json'), post_dict)
+            self.assertEqual(response.status_code, 200)
+            content = json.loads(response.content)
+            self.assertEqual(content[0], ['2017-11-10T23:15:00+00:00', 10, 3])
+            self.assertEqual(content[2], ['2017-11-10T23:15:02+00:00', 12, None])
+
+            response = self.client.post(reverse('timeseries_flight_values_list_stream_json'), post_dict)
+            self.assertEqual(json.loads(b''.join(response.streaming_content)), content)
+
+            response = self.client.post(reverse('timeseries_flight_values_list_json'), post_dict,
+                                        HTTP_ACCEPT=BINARY_CONTENT_TYPE)
+            self.assertEqual(response.status_code, 200)
+            columns = decode_columns(response.content)
+        self.assertEqual(list(columns.keys()), ['timestamp', 'temperature', 'pressure'])
+        self.assertEqual(columns['timestamp'][1], 1510355701000)
+        self.assertEqual(list(columns['temperature']), [10, 11, 12])
+        self.assertTrue(math.isnan(columns['pressure'][2]))
+
+    def test_get_dynamic_min_max(self):
+        """
+        Test getting the min and max of the dynamic values, grouped by channel
+        """
+        self.create_dynamic_values()
+        with self.settings(XGDS_TIMESERIES_FLIGHT_SUMMARIES=False), self.assertNumQueries(2):
+            result = TimeSeriesDynamicExample.objects.get_dynamic_min_max(flight_ids=[22])
+        self.assertEqual(result['temperature'], {'min': 10, 'max': 12})
+        self.assertEqual(result['pressure'], {'min': 2, 'max': 3})
+        self.assertIn('timestamp', result)
+
+    def test_flight_time_index(self):
+        """
+        Test that the composite (flight, time) index is declared and created with the table
+        """
+        from django.db import connection
+        self.assertIn(('flight', 'timestamp'), TimeSeriesExample._meta.index_together)
+        self.assertIn(('flight', 'timestamp'), TimeSeriesDynamicExample._meta.index_together)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, TimeSeriesExample._meta.db_table)
+        self.assertTrue(any(c['index'] and c['columns'] == ['flight_id', 'timestamp'] for c in constraints.values()))
+
+    def test_filter_partitions(self):
+        """
+        Test that a partitioned model bounds its flight queries by the time range of the samples of the flight,
+        including samples recorded well outside the start and end of the flight
+        """
+        unbounded = str(TimeSeriesExample.objects.get_flight_data([22]).query)
+        first = TimeSeriesExample.objects.filter(flight_id=22).order_by('timestamp').first()
+        TimeSeriesExample.objects.create(timestamp=first.timestamp - datetime.timedelta(days=2), flight_id=22,
+                                         temperature=1.0, pressure=2.0, humidity=3.0)
+        TimeSeriesExample.partition_interval = 'day'
+        try:
+            result = TimeSeriesExample.objects.get_flight_data([22])
+            self.assertNotEqual(str(result.query), unbounded)
+            self.assertIn('"timestamp" >=', str(result.query))
+            self.assertEqual(result.count(), 101)
+            self.assertTrue(TimeSeriesExample.objects.has_flight_data([22]))
+        finally:
+            TimeSeriesExample.partition_interval = None
+
+    def test_get_resampled_values(self):
+        """
+        Test resampling a channel onto a regular grid with the last value of each bucket
+        """
+        first = TimeSeriesExample.objects.filter(flight_id=22).order_by('timestamp').first()
+        end = first.timestamp + datetime.timedelta(seconds=20)
+        grid, values = TimeSeriesExample.objects.get_resampled_values(first.timestamp, end, 10, flight_ids=[22],
+                                                                      channel_names=['temperature'], method='last')
+        self.assertEqual(len(grid), 3)
+        expected = TimeSeriesExample.objects.filter(flight_id=22, timestamp__gte=first.timestamp,
+                                                    timestamp__lt=first.timestamp + datetime.timedelta(seconds=10))
+        self.assertEqual(values['temperature'][0], expected.order_by('timestamp', 'pk').last().temperature)
+
+    def test_get_aligned_json(self):
+        """
+        Test aligning channels of two models onto one grid
+        """
+        self.create_dynamic_values()
+        models = [{'model_name': 'xgds_timeseries.TimeSeriesDynamicExample', 'channel_names': ['temperature']},
+                  {'model_name': 'xgds_timeseries.TimeSeriesExample', 'channel_names': ['temperature']}]
+        response = self.client.post(reverse('timeseries_aligned_list_json'),
+                                    {'models': json.dumps(models),
+                                     'flight_ids': [22],
+                                     'start_time': '2017-11-10T23:15:00Z',
+                                     'end_time': '2017-11-10T23:15:02Z',
+                                     'interval': 1,
+                                     'method': 'last'})
+        content = self.is_good_json_response(response)
+        self.assertEqual(content['fields'], ['time', 'xgds_timeseries.TimeSeriesDynamicExample:temperature',
+                                             'xgds_timeseries.TimeSeriesExample:temperature'])
+        self.assertEqual(len(content['values']), 3)
+        self.assertEqual([row[1] for row in content['values']], [10, 11, 12])
+
+    def test_benchmark_suite(self):
+        """
+        Test that the benchmark suite runs on small synthetic flights and removes them afterwards
+        """
+        from xgds_timeseries import benchmark
+        flight_ids = benchmark.create_flights(2, benchmark.get_flight_duration('plain', 50))
+        try:
+            benchmark.generate_samples('plain', flight_ids, 50)
+            self.assertEqual(TimeSeriesExample.objects.filter(flight_id__in=flight_ids).count(), 100)
+            report = benchmark.BenchmarkSuite('plain', flight_ids, 50, window=20, repeat=1).run()
+            names = [case['name'] for case in report['cases']]
+            self.assertIn('get_min_max', names)
+            self.assertIn('json encode packed', names)
+            self.assertEqual(report['window_rows'], 20)
+            json.dumps(report)
+        finally:
+            benchmark.delete_flights()
+        self.assertFalse(TimeSeriesExample.objects.filter(flight_id__in=flight_ids).exists())
+
+    def test_instrumentation(self):
+        """
+        Test the Server-Timing header and the Prometheus totals of an instrumented request
+        """
+        url = reverse('timeseries_flight_values_list_json')
+        response = self.client.post(url, self.post_dict)
+        self.assertFalse(response.has_header('Server-Timing'))
+        with self.settings(XGDS_TIMESERIES_INSTRUMENTATION=True, XGDS_TIMESERIES_RESPONSE_CACHE=None):
+            response = self.client.post(url, self.post_dict)
+            self.assertEqual(len(json.loads(response.content)), 100)
+            self.assertIn('sql;dur=', response['Server-Timing'])
+            self.assertIn('desc="100 rows"', response['Server-Timing'])
+            self.assertIn('encode;dur=', response['Server-Timing'])
+        metrics = self.client.get(reverse('timeseries_metrics_prometheus'))
+        self.assertEqual(metrics.status_code, 200)
+        self.assertIn('xgds_timeseries_requests_total{path="%s"}' % url, metrics.content.decode('utf-8'))
+
+    def test_instrumentation_failing_hook(self):
+        """
+        Test a metrics hook which cannot be imported is logged, and does not fail the request
+        """
+        import logging
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('xgds_timeseries.instrumentation')
+        logger.addHandler(handler)
+        try:
+            with self.settings(XGDS_TIMESERIES_INSTRUMENTATION=True, XGDS_TIMESERIES_RESPONSE_CACHE=None,
+                               XGDS_TIMESERIES_METRICS_HOOKS=['xgds_timeseries.instrumentation.no_such_hook']):
+                response = self.client.post(reverse('timeseries_flight_values_list_json'), self.post_dict)
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 100)
+        self.assertIn('no_such_hook', records[0].getMessage())
+
+    def test_encode_values(self):
+        """
+        Test the bulk json encoding gives the same values as DatetimeJsonEncoder, with rounding and epoch times
+        """
+        from geocamUtil.datetimeJsonEncoder import DatetimeJsonEncoder
+        from xgds_timeseries.encoding import encode_values
+        values = list(TimeSeriesExample.objects.get_flight_values([22]))
+        packed = views.get_packed_list(TimeSeriesExample, values, None)
+        for backend in ('python', 'django'):
+            with self.settings(XGDS_TIMESERIES_JSON_BACKEND=backend):
+                self.assertEqual(json.loads(encode_values(values)),
+                                 json.loads(json.dumps(values, cls=DatetimeJsonEncoder)))
+                self.assertEqual(json.loads(encode_values(packed)),
+                                 json.loads(json.dumps(packed, cls=DatetimeJsonEncoder)))
+
+        fields = TimeSeriesExample.objects.get_fields()
+        with self.settings(XGDS_TIMESERIES_JSON_BACKEND='python'):
+            result = json.loads(encode_values(packed, fields, {'temperature': 1}, 'epoch_ms'))
+        self.assertEqual(result[0][0], 1375)
+        self.assertEqual(result[0][1], 1510355701284)
+        self.assertEqual(result[0][2], round(packed[0][2], 1))
+
+        response = self.client.post(reverse('timeseries_flight_values_list_json'),
+                                    dict(self.post_dict, time_format='epoch_ms'))
+        self.assertEqual(json.loads(response.content)[0][1], 1510355701284)
+
     def test_get_version(self):
         from xgds_timeseries import get_version
         result = get_version()
@@ -0,0 +1,88 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+"""
+Tests for xgds_timeseries.async_views, which need Django 4.2 or later (and so Python 3.8 or later).
+This module has no async syntax so it still imports on Python 2, where the tests are skipped.
+"""
+
+import json
+import sys
+import unittest
+
+import django
+from django.test import TransactionTestCase, RequestFactory
+
+ASYNC_SUPPORTED = sys.version_info >= (3, 8) and django.VERSION >= (4, 2)
+
+
+def read_streaming_content(loop, response):
+    """
+    :param loop: the event loop to run on
+    :param response: an async StreamingHttpResponse
+    :return: the bytes of the response
+    """
+    iterator = response.streaming_content.__aiter__()
+    chunks = []
+    while True:
+        try:
+            chunks.append(loop.run_until_complete(iterator.__anext__()))
+        except StopAsyncIteration:
+            return b''.join(chunks)
+
+
+@unittest.skipUnless(ASYNC_SUPPORTED, 'async views need Django 4.2 or later')
+class xgds_timeseriesAsyncTest(TransactionTestCase):
+    """
+    Tests for the async views of xgds_timeseries
+    """
+    fixtures = ['timeseries_test_fixture.json']
+
+    post_dict = {'model_name': 'xgds_timeseries.TimeSeriesExample',
+                 'channel_names': ['temperature', 'pressure'],
+                 'flight_ids': [22],
+                 'downsample': 0
+                 }
+
+    def test_async_views(self):
+        """
+        Test an async view runs the view in a worker, and streams the values of a streaming one
+        """
+        import asyncio
+        from xgds_timeseries import async_views
+
+        loop = asyncio.new_event_loop()
+        try:
+            with self.settings(XGDS_TIMESERIES_RESPONSE_CACHE=None):
+                request = RequestFactory().post('/', self.post_dict)
+                response = loop.run_until_complete(async_views.get_flight_values_json(request))
+                self.assertEqual(len(json.loads(response.content)), 100)
+                request = RequestFactory().post('/', self.post_dict)
+                response = loop.run_until_complete(async_views.get_flight_values_json(request, stream=True))
+                self.assertTrue(response.streaming)
+                self.assertEqual(len(json.loads(read_streaming_content(loop, response))), 100)
+        finally:
+            loop.close()
+
+    def test_async_urls(self):
+        """
+        Test the async urls resolve to the async views
+        """
+        from django.urls import resolve
+        from xgds_timeseries import asyncUrls, async_views
+        match = resolve('/values/flight/list/stream/json', asyncUrls)
+        self.assertIs(match.func, async_views.get_flight_values_json)
+        self.assertEqual(match.kwargs, {'stream': True})
@@ -0,0 +1,502 @@
+# __BEGIN_LICENSE__
+# Copyright (c) 2015, United States Government, as represented by the
+# Administrator of the National Aeronautics and Space Administration.
+# All rights reserved.
+#
+# The xGDS platform is licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+# __END_LICENSE__
+
+import json
+import struct
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+from dateutil.parser import parse as dateparser
+from django.utils import timezone
+
+DECIMATION_METHODS = ('lttb', 'minmax', 'stride')
+
+# The binary columnar format is:
+#   the 4 byte magic, a little endian uint32 header length, the json header padded to 8 bytes,
+#   then each column as a little endian array padded to 8 bytes, in the order of the header columns.
+# The header is {"version": 1, "count": rows, "columns": [{"name": name, "dtype": numpy dtype string}, ...]}
+# Times are int64 milliseconds since the epoch, missing channel values are NaN.
+# Several results are framed one after another as: little endian uint32 header length, uint32 data length,
+# the json header padded to 8 bytes, then the data, which is empty or the binary columnar format.
+BINARY_CONTENT_TYPE = 'application/vnd.xgds.timeseries'
+BINARY_MAGIC = b'XGTS'
+BINARY_VERSION = 1
+BINARY_ALIGNMENT = 8
+
+
+def get_epoch_integers(times, unit):
+    """
+    Convert a sequence of timezone aware datetimes to integers since the epoch, in bulk
+    :param times: a sequence of datetimes
+    :param unit: a numpy datetime unit, ie ms or us
+    :return: a numpy int64 array
+    """
+    with warnings.catch_warnings():
+        # numpy converts aware datetimes to UTC but warns that it has no timezone representation
+        warnings.simplefilter('ignore')
+        result = np.array(times, dtype='datetime64[%s]' % unit)
+    return result.astype(np.int64)
+
+
+def get_epoch_milliseconds(times):
+    """
+    Convert a sequence of timezone aware datetimes to milliseconds since the epoch, in bulk
+    :param times: a sequence of datetimes
+    :return: a numpy int64 array
+    """
+    return get_epoch_integers(times, 'ms')
+
+
+def get_epoch_microseconds(times):
+    """
+    Convert a sequence of timezone aware datetimes to microseconds since the epoch, in bulk
+    :param times: a sequence of datetimes
+    :return: a numpy int64 array
+    """
+    return get_epoch_integers(times, 'us')
+
+
+def asof_indices(sample_times, times, tolerance=None):
+    """
+    For each time find the last sample at or before it, in one pass with a binary search
+    :param sample_times: numpy int64 array of the sample times, sorted
+    :param times: numpy int64 array of the times to look up, in the same unit
+    :param tolerance: the maximum age of the sample, in the same unit; None for any age
+    :return: a numpy int64 array of the sample index for each time, -1 where there is none
+    """
+    indices = np.searchsorted(sample_times, times, side='right') - 1
+    if len(sample_times):
+        missing = indices < 0
+        if tolerance is not None:
+            missing |= times - sample_times[np.maximum(indices, 0)] > tolerance
+        indices[missing] = -1
+    else:
+        indices[:] = -1
+    return indices
+
+
+def parse_times(strings):
+    """
+    Parse a sequence of ISO 8601 time strings in bulk.  Strings with an offset are converted to UTC,
+    strings without one are taken to be UTC.  Falls back to dateutil one at a time for other formats.
+    :param strings: a sequence of time strings
+    :return: a list of timezone aware UTC datetimes
+    """
+    try:
+        with warnings.catch_warnings():
+            # numpy applies the offsets but warns that it has no timezone representation
+            warnings.simplefilter('ignore')
+            parsed = np.array(strings, dtype='datetime64[us]')
+        return [t.replace(tzinfo=timezone.utc) for t in parsed.astype(object)]
+    except ValueError:
+        result = []
+        for string in strings:
+            the_time = dateparser(string)
+            if timezone.is_naive(the_time):
+                result.append(the_time.replace(tzinfo=timezone.utc))
+            else:
+                result.append(the_time.astimezone(timezone.utc))
+        return result
+
+
+def get_float_array(values):
+    """
+    :param values: a sequence of numbers, which may include None
+    :return: a numpy float64 array with NaN in place of None
+    """
+    return np.array(values, dtype=np.float64)
+
+
+def stride_indices(count, max_points):
+    """
+    Evenly spaced indices
+    :param count: the number of samples
+    :param max_points: the maximum number of indices to return
+    :return: a sorted numpy array of indices, including the first and last
+    """
+    if count <= max_points:
+        return np.arange(count)
+    return np.unique(np.linspace(0, count - 1, max_points).round().astype(np.int64))
+
+
+def minmax_indices(x, y, max_points):
+    """
+    Keep the minimum and the maximum of each of max_points / 2 equal time buckets, so spikes survive.
+    :param x: numpy array of sample times, sorted
+    :param y: numpy float array of sample values, may contain NaN
+    :param max_points: the maximum number of indices to return
+    :return: a sorted numpy array of indices
+    """
+    count = len(x)
+    if count <= max_points:
+        return np.arange(count)
+    if max_points < 4:
+        # no room for the ends and one bucket's minimum and maximum
+        return stride_indices(count, max_points)
+    bucket_count = (max_points - 2) // 2
+    span = float(x[-1] - x[0]) or 1.0
+    buckets = np.minimum(((x - x[0]) / span * bucket_count).astype(np.int64), bucket_count - 1)
+
+    # within each bucket, sorting by value puts the minimum first and the maximum last
+    low = np.lexsort((np.where(np.isnan(y), np.inf, y), buckets))
+    high = np.lexsort((np.where(np.isnan(y), -np.inf, y), buckets))
+    sorted_buckets = buckets[low]
+    starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    ends = np.r_[starts[1:], count] - 1
+    return np.unique(np.concatenate((low[starts], high[ends], [0, count - 1])))
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets downsampling, which keeps the visual shape of a line plot.
+    :param x: numpy float array of sample times, sorted
+    :param y: numpy float array of sample values, may contain NaN
+    :param max_points: the maximum number of indices to return, at least 3
+    :return: a sorted numpy array of indices
+    """
+    count = len(x)
+    if count <= max_points or max_points < 3:
+        return stride_indices(count, max_points)
+    x = x.astype(np.float64)
+    missing = np.isnan(y)
+    if missing.all():
+        return stride_indices(count, max_points)
+    y = np.where(missing, np.nanmean(y), y)
+
+    # the first and last points are always kept, the others are split into max_points - 2 buckets
+    edges = np.linspace(1, count - 1, max_points - 1).astype(np.int64)
+    result = np.empty(max_points, dtype=np.int64)
+    result[0] = 0
+    result[-1] = count - 1
+    selected = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = count - 1, count
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        areas = np.abs((x[selected] - average_x) * (y[start:end] - y[selected]) -
+                       (x[selected] - x[start:end]) * (average_y - y[selected]))
+        selected = start + int(areas.argmax())
+        result[i + 1] = selected
+    return np.unique(result)
+
+
+def decimate(times, columns, max_points, method='lttb'):
+    """
+    Choose which samples to keep so that at most max_points are returned
+    :param times: a sequence of timezone aware datetimes, sorted
+    :param columns: a list of sequences of numbers, one per channel, the same length as times
+    :param max_points: the maximum number of samples to keep
+    :param method: lttb, minmax or stride
+    :return: a sorted numpy array of the indices to keep
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError('Unknown decimation method %s' % method)
+    count = len(times)
+    if count <= max_points:
+        return np.arange(count)
+    if method == 'stride' or not columns:
+        return stride_indices(count, max_points)
+
+    # share the points between the channels, and keep every sample that any channel needs
+    x = get_epoch_milliseconds(times)
+    channel_points = max(max_points // len(columns), 3)
+    indices = []
+    for column in columns:
+        y = get_float_array(column)
+        if method == 'minmax':
+            indices.append(minmax_indices(x, y, channel_points))
+        else:
+            indices.append(lttb_indices(x, y, channel_points))
+    indices = np.unique(np.concatenate(indices))
+    if len(indices) > max_points:
+        # the channels kept the ends and more points than their share; thin their union evenly
+        indices = indices[stride_indices(len(indices), max_points)]
+    return indices
+
+
+def decimate_values(values, time_field_name, channel_names, max_points, method='lttb'):
+    """
+    Decimate a list of dictionaries of values, ie the results of get_values
+    :param values: an iterable of dictionaries, sorted by time
+    :param time_field_name: the key of the time in each dictionary
+    :param channel_names: the keys of the numeric channels to preserve the shape of
+    :param max_points: the maximum number of dictionaries to keep
+    :param method: lttb, minmax or stride
+    :return: a list of the kept dictionaries
+    """
+    values = list(values)
+    if len(values) <= max_points:
+        return values
+    times = [entry[time_field_name] for entry in values]
+    columns = [[entry.get(name) for entry in values] for name in channel_names]
+    return [values[i] for i in decimate(times, columns, max_points, method)]
+
+
+def pad_bytes(data, fill=b'\0'):
+    """
+    :return: the data padded to a multiple of BINARY_ALIGNMENT bytes, so typed arrays can view it in place
+    """
+    remainder = len(data) % BINARY_ALIGNMENT
+    if remainder:
+        data += fill * (BINARY_ALIGNMENT - remainder)
+    return data
+
+
+def encode_columns(columns):
+    """
+    Encode columns of values in the binary columnar format
+    :param columns: an ordered list of (name, numpy array) tuples, all the same length
+    :return: the bytes
+    """
+    count = len(columns[0][1]) if columns else 0
+    arrays = []
+    header = {'version': BINARY_VERSION, 'count': count, 'columns': []}
+    for name, array in columns:
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        header['columns'].append({'name': name, 'dtype': array.dtype.str})
+        arrays.append(array)
+    header_bytes = pad_bytes(json.dumps(header).encode('utf-8'), b' ')
+    parts = [BINARY_MAGIC, struct.pack('<I', len(header_bytes)), header_bytes]
+    for array in arrays:
+        parts.append(pad_bytes(array.tobytes()))
+    return b''.join(parts)
+
+
+def decode_columns(data):
+    """
+    Decode bytes in the binary columnar format
+    :param data: the bytes
+    :return: an OrderedDict of numpy arrays by column name
+    """
+    if data[:4] != BINARY_MAGIC:
+        raise ValueError('Not xgds timeseries binary data')
+    header_length = struct.unpack('<I', data[4:8])[0]
+    offset = 8 + header_length
+    header = json.loads(data[8:offset].decode('utf-8'))
+    result = OrderedDict()
+    for column in header['columns']:
+        dtype = np.dtype(column['dtype'])
+        result[column['name']] = np.frombuffer(data, dtype=dtype, count=header['count'], offset=offset)
+        size = dtype.itemsize * header['count']
+        offset += size + (-size % BINARY_ALIGNMENT)
+    return result
+
+
+def encode_frame(header, data=b''):
+    """
+    Encode one frame of a multi part binary response
+    :param header: a json serializable dictionary describing the data
+    :param data: the bytes of the data, ie from encode_columns, a multiple of BINARY_ALIGNMENT long
+    :return: the bytes
+    """
+    header_bytes = pad_bytes(json.dumps(header).encode('utf-8'), b' ')
+    return b''.join([struct.pack('<II', len(header_bytes), len(data)), header_bytes, data])
+
+
+def decode_frames(data):
+    """
+    Decode the frames of a multi part binary response
+    :param data: the bytes
+    :return: a list of (header dictionary, data bytes)
+    """
+    result = []
+    offset = 0
+    while offset < len(data):
+        header_length, data_length = struct.unpack('<II', data[offset:offset + 8])
+        offset += 8
+        header = json.loads(data[offset:offset + header_length].decode('utf-8'))
+        offset += header_length
+        result.append((header, data[offset:offset + data_length]))
+        offset += data_length
+    return result
+
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_HISTOGRAM_BINS = 20
+# Bins of the fine histogram which approximate percentiles when they are accumulated in chunks
+QUANTILE_BINS = 10000
+
+
+def get_percentile_key(percentile):
+    """
+    :return: the key of a percentile in the statistics dictionary, ie '50' or '99.9'
+    """
+    return '%g' % percentile
+
+
+def get_histogram_edges(minimum, maximum, bins):
+    """
+    :return: numpy float64 array of bins + 1 evenly spaced edges; a single value gets a bin of width one
+    """
+    if minimum == maximum:
+        minimum -= 0.5
+        maximum += 0.5
+    return np.linspace(minimum, maximum, bins + 1)
+
+
+class StatisticsAccumulator(object):
+    """
+    Accumulate the statistics of one channel from chunks of values, in memory which does not grow with the number
+    of values: count, mean and population stddev are merged per chunk, and percentiles are interpolated from a fine
+    histogram of QUANTILE_BINS bins between the known min and max, so their error is at most (max - min) / QUANTILE_BINS.
+    """
+
+    def __init__(self, minimum, maximum, bins=DEFAULT_HISTOGRAM_BINS):
+        """
+        :param minimum: the minimum of the values, ie from get_min_max
+        :param maximum: the maximum of the values
+        :param bins: the number of bins of the reported histogram
+        """
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.edges = get_histogram_edges(self.minimum, self.maximum, bins)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.fine_edges = get_histogram_edges(self.minimum, self.maximum, QUANTILE_BINS)
+        self.fine_counts = np.zeros(QUANTILE_BINS, dtype=np.int64)
+
+    def add(self, values):
+        """
+        :param values: a numpy float array of values, NaN for missing ones
+        """
+        values = values[~np.isnan(values)]
+        count = len(values)
+        if not count:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.counts += np.histogram(values, self.edges)[0]
+        self.fine_counts += np.histogram(values, self.fine_edges)[0]
+
+    def get_percentile(self, percentile):
+        """
+        :param percentile: 0 to 100
+        :return: the interpolated value at the percentile, or None if there are no values
+        """
+        if not self.count:
+            return None
+        rank = percentile / 100.0 * self.count
+        cumulative = np.cumsum(self.fine_counts)
+        index = min(int(np.searchsorted(cumulative, rank, side='left')), QUANTILE_BINS - 1)
+        below = cumulative[index - 1] if index else 0
+        in_bin = self.fine_counts[index]
+        fraction = (rank - below) / float(in_bin) if in_bin else 0.0
+        value = self.fine_edges[index] + fraction * (self.fine_edges[index + 1] - self.fine_edges[index])
+        return float(min(max(value, self.minimum), self.maximum))
+
+    def get_result(self, percentiles=DEFAULT_PERCENTILES):
+        """
+        :param percentiles: the percentiles to report, 0 to 100
+        :return: a dictionary of count, mean, stddev, min, max, percentiles and histogram
+        """
+        result = {'count': self.count,
+                  'min': self.minimum if self.count else None,
+                  'max': self.maximum if self.count else None,
+                  'mean': self.mean if self.count else None,
+                  'stddev': float(np.sqrt(self.m2 / self.count)) if self.count else None,
+                  'percentiles': OrderedDict([(get_percentile_key(p), self.get_percentile(p)) for p in percentiles]),
+                  'histogram': {'edges': self.edges.tolist(), 'counts': self.counts.tolist()}}
+        return result
+
+
+RESAMPLE_METHODS = ('mean', 'last', 'linear')
+
+
+class Resampler(object):
+    """
+    Resample one channel onto a regular grid of count times, start_time + i * interval, from chunks of samples
+    sorted by time.  Memory depends only on the size of the grid.
+      mean: the mean of the samples in [grid time, grid time + interval)
+      last: the last sample in [grid time, grid time + interval)
+      linear: linear interpolation between the samples on either side of each grid time
+    Grid times without samples (or outside the samples, for linear) are NaN.
+    """
+
+    def __init__(self, start_time, interval, count, method='mean'):
+        """
+        :param start_time: the first grid time, int microseconds since the epoch
+        :param interval: the grid spacing, int microseconds
+        :param count: the number of grid times
+        :param method: mean, last or linear
+        """
+        if method not in RESAMPLE_METHODS:
+            raise ValueError('Unknown resample method %s' % method)
+        self.start_time = start_time
+        self.interval = interval
+        self.count = count
+        self.method = method
+        self.grid = start_time + interval * np.arange(count, dtype=np.int64)
+        self.values = np.full(count, np.nan)
+        self.sums = np.zeros(count)
+        self.counts = np.zeros(count, dtype=np.int64)
+        # the last sample of the previous chunk, to interpolate across chunk boundaries
+        self.previous = None
+
+    def add(self, times, values):
+        """
+        :param times: numpy int64 array of microseconds since the epoch, sorted, after those of the previous chunk
+        :param values: numpy float array of the values, NaN for missing ones
+        """
+        present = ~np.isnan(values)
+        times = times[present]
+        values = values[present]
+        if not len(times):
+            return
+        if self.method == 'linear':
+            if self.previous is not None:
+                times = np.concatenate([[self.previous[0]], times])
+                values = np.concatenate([[self.previous[1]], values])
+            self.previous = (times[-1], values[-1])
+            first = int(np.searchsorted(self.grid, times[0], side='left'))
+            last = int(np.searchsorted(self.grid, times[-1], side='right'))
+            if last > first:
+                self.values[first:last] = np.interp(self.grid[first:last], times, values)
+            return
+
+        buckets = (times - self.start_time) // self.interval
+        inside = (buckets >= 0) & (buckets < self.count)
+        buckets = buckets[inside]
+        values = values[inside]
+        if self.method == 'mean':
+            self.sums += np.bincount(buckets, weights=values, minlength=self.count)
+            self.counts += np.bincount(buckets, minlength=self.count)
+        else:
+            # buckets are sorted, so the last of each run is the last sample of its bucket
+            ends = np.append(buckets[1:] != buckets[:-1], True)
+            self.values[buckets[ends]] = values[ends]
+
+    def get_values(self):
+        """
+        :return: numpy float64 array of the resampled value at each grid time
+        """
+        if self.method == 'mean':
+            result = np.full(self.count, np.nan)
+            filled = self.counts > 0
+            result[filled] = self.sums[filled] / self.counts[filled]
+            return result
+        return self.values
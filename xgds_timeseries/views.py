@@ -14,18 +14,32 @@
 # specific language governing permissions and limitations under the License.
 # __END_LICENSE__
 
+import itertools
 import json
+import time
 import traceback
+from multiprocessing.pool import ThreadPool
+import numpy as np
 from dateutil.parser import parse as dateparser
 
 from django.conf import settings
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponseNotAllowed
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, HttpResponseNotAllowed, \
+    StreamingHttpResponse
 
 from geocamUtil.loader import getModelByName
 from geocamUtil.datetimeJsonEncoder import DatetimeJsonEncoder
 
 from xgds_core.util import get_all_subclasses
-from xgds_timeseries.models import TimeSeriesModel
+from xgds_timeseries.models import TimeSeriesModel, get_models_with_flight_data
+from xgds_timeseries.archive import ArchiveValues, get_datetimes, to_python
+from xgds_timeseries.cache import get_response_cache_key, get_cached_response, get_change_versions, \
+    cache_response
+from xgds_timeseries.encoding import encode_values, get_json_backend, TIME_FORMATS
+from xgds_timeseries.instrumentation import instrumented, phase, record_rows, get_prometheus_text
+from xgds_timeseries.util import decimate_values, get_epoch_milliseconds, get_float_array, encode_columns, \
+    encode_frame, parse_times, BINARY_CONTENT_TYPE, DEFAULT_PERCENTILES, DEFAULT_HISTOGRAM_BINS
 
 
 def get_time_series_classes(skip_example=True):
@@ -51,37 +65,64 @@ def get_time_series_classes_json(request, skip_example=True):
     return JsonResponse(get_time_series_classes(skip_example), safe=False)
 
 
+# The metadata of the time series classes, which does not change while the process runs, by skip_example
+TIME_SERIES_CLASSES_METADATA = {}
+
+# Which classes have data for a set of flights: {(skip_example, flight ids): (expiration time, metadata list)}
+FLIGHT_METADATA_MEMO = {}
+FLIGHT_METADATA_MEMO_SIZE = 256
+
+
+def get_time_series_class_metadata(the_class):
+    """
+    :param the_class: a TimeSeriesModel subclass
+    :return: a dictionary of the model name, title, stateful and sse type of the class
+    """
+    return {'model_name': '%s.%s' % (the_class._meta.app_label, the_class.__name__),
+            'title': str(the_class.title),
+            'stateful': 'true' if the_class.stateful else 'false',
+            'sse_type': the_class.getSseType(),
+            }
+
+
 def get_time_series_classes_metadata(skip_example=True, flight_ids=None):
     """
     Return a list of dictionaries of time series classes and their titles
+    The classes and their metadata are looked up once per process.  Which classes have data for a set of flights
+    is checked in a batch (see get_models_with_flight_data) and remembered for
+    XGDS_TIMESERIES_METADATA_CACHE_SECONDS.
     :param skip_example: True to skip the example classes, false otherwise
     :param flight_ids: an optional list of flight ids; this will check for each timeseries data type for the given flights
     :return: a list of dictionaries
     """
-    result = []
+    if skip_example not in TIME_SERIES_CLASSES_METADATA:
+        classes = []
+        for the_class in get_all_subclasses(TimeSeriesModel):
+            if skip_example and 'xample' in the_class.__name__:  # skip example classes
+                continue
+            classes.append((the_class, get_time_series_class_metadata(the_class)))
+        TIME_SERIES_CLASSES_METADATA[skip_example] = classes
+    classes = TIME_SERIES_CLASSES_METADATA[skip_example]
 
-    for the_class in get_all_subclasses(TimeSeriesModel):
-        if skip_example and 'xample' in the_class.__name__:  # skip example classes
-            continue
+    if not flight_ids:
+        # no flight ids do not filter
+        return [dict(metadata) for the_class, metadata in classes]
 
-        if flight_ids:
-            if check_flight_values_exist(the_class, flight_ids):
-                result.append({'model_name': '%s.%s' % (the_class._meta.app_label, the_class.__name__),
-                               'title': str(the_class.title),
-                               'stateful': 'true' if the_class.stateful else 'false',
-                               'sse_type': the_class.getSseType(),
-                               })
-        else:
-            # no flight ids do not filter
-            result.append({'model_name': '%s.%s' % (the_class._meta.app_label, the_class.__name__),
-                           'title': str(the_class.title),
-                           'stateful': 'true' if the_class.stateful else 'false',
-                           'sse_type': the_class.getSseType(),
-                           })
+    memo_key = (skip_example, tuple(sorted(set([str(f) for f in flight_ids]))))
+    now = time.time()
+    memo = FLIGHT_METADATA_MEMO.get(memo_key)
+    if memo and memo[0] > now:
+        return [dict(metadata) for metadata in memo[1]]
 
-    return result
+    with_data = get_models_with_flight_data([the_class for the_class, metadata in classes], flight_ids)
+    result = [metadata for the_class, metadata in classes if the_class in with_data]
+    if len(FLIGHT_METADATA_MEMO) >= FLIGHT_METADATA_MEMO_SIZE:
+        FLIGHT_METADATA_MEMO.clear()
+    FLIGHT_METADATA_MEMO[memo_key] = (now + settings.XGDS_TIMESERIES_METADATA_CACHE_SECONDS, result)
+    return [dict(metadata) for metadata in result]
 
 
+@instrumented
 def get_time_series_classes_metadata_json(request, skip_example=True):
     """
     Return a json response with the list of time series classes metadata
@@ -112,6 +153,17 @@ def unravel_post(post_dict):
         filter_dict = None
         time = None
         downsample = None
+        max_points = None
+        method = 'lttb'
+        stream = None
+        format = None
+        dtype = None
+        since_time = None
+        since_pk = None
+        times = None
+        percentiles = DEFAULT_PERCENTILES
+        bins = DEFAULT_HISTOGRAM_BINS
+        time_format = 'iso'
 
     result = PostData()
     model_name = post_dict.get('model_name', None)
@@ -133,6 +185,16 @@ def unravel_post(post_dict):
     if time_string:
         result.time = dateparser(time_string)
 
+    time_strings = post_dict.getlist('times', None) or post_dict.getlist('times[]', None)
+    if time_strings:
+        result.times = parse_times(time_strings)
+    since_time_string = post_dict.get('since_time', None)
+    if since_time_string:
+        result.since_time = dateparser(since_time_string)
+    since_pk = post_dict.get('since_pk', None)
+    if since_pk:
+        result.since_pk = int(since_pk)
+
     filter_json = post_dict.get('filter', None)
     if filter_json:
         result.filter_dict = json.loads(filter_json)
@@ -141,9 +203,46 @@ def unravel_post(post_dict):
     if result.downsample is not None:
         result.downsample = int(result.downsample)
 
+    max_points = post_dict.get('max_points', None)
+    if max_points:
+        result.max_points = int(max_points)
+        result.method = post_dict.get('method', result.method)
+
+    stream = post_dict.get('stream', None)
+    if stream is not None:
+        result.stream = stream.lower() in ('true', '1')
+
+    percentiles = post_dict.getlist('percentiles', None) or post_dict.getlist('percentiles[]', None)
+    if percentiles:
+        result.percentiles = [float(p) for p in percentiles]
+    bins = post_dict.get('bins', None)
+    if bins:
+        result.bins = int(bins)
+        if not 1 <= result.bins <= settings.XGDS_TIMESERIES_MAX_HISTOGRAM_BINS:
+            raise ValueError('bins must be between 1 and %d' % settings.XGDS_TIMESERIES_MAX_HISTOGRAM_BINS)
+
+    result.format = post_dict.get('format', None)
+    dtype = post_dict.get('dtype', None)
+    if dtype:
+        if dtype not in ('float32', 'float64'):
+            raise ValueError('Unsupported dtype %s' % dtype)
+        result.dtype = dtype
+    time_format = post_dict.get('time_format', None)
+    if time_format:
+        if time_format not in TIME_FORMATS:
+            raise ValueError('Unsupported time format %s' % time_format)
+        result.time_format = time_format
+
     return result
 
 
+def is_binary_request(request, post_values):
+    """
+    :return: True if the client asked for the binary columnar format, with format=binary or the Accept header
+    """
+    return post_values.format == 'binary' or BINARY_CONTENT_TYPE in request.META.get('HTTP_ACCEPT', '')
+
+
 def get_min_max(model, start_time=None, end_time=None, flight_ids=None, filter_dict=None, channel_names=None):
     """
     Returns a dict with the min max values
@@ -173,6 +272,7 @@ def get_min_max(model, start_time=None, end_time=None, flight_ids=None, filter_d
                                      channel_names=channel_names)
 
 
+@instrumented
 def get_min_max_json(request):
     """
     Returns a JsonResponse with min and max values
@@ -182,6 +282,11 @@ def get_min_max_json(request):
     if request.method == 'POST':
         try:
             post_values = unravel_post(request.POST)
+            cache_key = get_response_cache_key(request)
+            response = get_cached_response(cache_key)
+            if response:
+                return response
+            versions = get_change_versions(post_values.model, post_values.flight_ids)
 
             values = get_min_max(model=post_values.model,
                                  start_time=post_values.start_time,
@@ -191,7 +296,8 @@ def get_min_max_json(request):
                                  channel_names=post_values.channel_names)
 
             if values:
-                return JsonResponse(values, encoder=DatetimeJsonEncoder)
+                return cache_response(cache_key, get_json_response(values),
+                                      post_values.model, post_values.flight_ids, versions)
             else:
                 return JsonResponse({'status': 'error', 'message': 'No min/max values were found.'}, status=204)
         except Exception as e:
@@ -199,26 +305,304 @@ def get_min_max_json(request):
     return HttpResponseForbidden()
 
 
-def get_packed_list(model, values, channel_names):
+@instrumented
+def get_statistics_json(request):
+    """
+    Returns a JsonResponse with the count, mean, stddev, min, max, percentiles and histogram of each numeric channel.
+    Post percentiles (a list, 0 to 100) and bins to override the defaults.
+    :param request:
+    :return:
+    """
+    if request.method == 'POST':
+        try:
+            post_values = unravel_post(request.POST)
+            cache_key = get_response_cache_key(request)
+            response = get_cached_response(cache_key)
+            if response:
+                return response
+            versions = get_change_versions(post_values.model, post_values.flight_ids)
+
+            values = post_values.model.objects.get_statistics(start_time=post_values.start_time,
+                                                              end_time=post_values.end_time,
+                                                              flight_ids=post_values.flight_ids,
+                                                              filter_dict=post_values.filter_dict,
+                                                              channel_names=post_values.channel_names,
+                                                              downsample=post_values.downsample or 0,
+                                                              percentiles=post_values.percentiles,
+                                                              bins=post_values.bins)
+            if values:
+                return cache_response(cache_key, get_json_response(values),
+                                      post_values.model, post_values.flight_ids, versions)
+            else:
+                return JsonResponse({'status': 'error', 'message': 'No statistics were found.'}, status=204)
+        except Exception as e:
+            return HttpResponseNotAllowed(["POST"], content=traceback.format_exc())
+    return HttpResponseForbidden()
+
+
+class EncodedJsonResponse(JsonResponse):
+    """
+    A JsonResponse of content which is already json encoded
+    """
+
+    def __init__(self, content, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super(JsonResponse, self).__init__(content=content, **kwargs)
+
+
+def get_json_response(data, safe=True, fields=None, precisions=None, time_format='iso'):
+    """
+    Returns a JsonResponse of data encoded with DatetimeJsonEncoder, counting the rows of a list as the rows of the
+    response and timing the encoding, see xgds_timeseries.instrumentation.
+    Lists of values are encoded by xgds_timeseries.encoding, which rounds the channels which have a precision, unless
+    there are no precisions and XGDS_TIMESERIES_JSON_BACKEND is django.
+    :param data: the dictionary, or with safe=False the list, to encode
+    :param fields: the names of the entries of packed values, to look up their precisions
+    :param precisions: a dictionary of field name to decimal places, ie from the model's get_channel_precisions
+    :param time_format: iso or epoch_ms, for lists of values
+    :return: the JsonResponse
+    """
+    if isinstance(data, list):
+        record_rows(len(data))
+        if get_json_backend() != 'django' or time_format != 'iso' or precisions:
+            with phase('encode'):
+                return EncodedJsonResponse(encode_values(data, fields, precisions, time_format))
+    with phase('encode'):
+        return JsonResponse(data, encoder=DatetimeJsonEncoder, safe=safe)
+
+
+def get_metrics_prometheus(request):
+    """
+    Returns the totals of the instrumented endpoints kept by the record_local_metrics hook, in the Prometheus text
+    format, for a Prometheus server to scrape.  Turn on XGDS_TIMESERIES_INSTRUMENTATION to collect them.
+    """
+    return HttpResponse(get_prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def pack_dicts(fields, values):
     """
     Returns a list of lists with the values in the same order as the fields
-    :param model: the model
+    :param fields: the keys to read from each value
     :param values: the iterable values, each value is a dictionary
     :return: a list of lists
     """
-    fields = model.objects.get_fields(channel_names)
     packed = []
     for entry in values:
         packed_entry = []
         for f in fields:
             packed_entry.append(entry[f])
         packed.append(packed_entry)
-
     return packed
 
 
+def get_packed_list(model, values, channel_names):
+    """
+    Returns a list of lists with the values in the same order as the fields
+    :param model: the model
+    :param values: the iterable values, each value is a dictionary.  If this is a QuerySet of a model which is not
+                   dynamic, the rows are read as tuples with values_list and no dictionaries are built.
+    :param channel_names: The list of channel names you are interested in
+    :return: a list of lists (or tuples)
+    """
+    fields = model.objects.get_packed_fields(channel_names)
+    if isinstance(values, QuerySet) and not model.dynamic:
+        return list(values.values_list(*fields))
+    return pack_dicts(fields, values)
+
+
+def get_packed_columns(model, values, channel_names):
+    """
+    Returns the values as one tuple per field, in the same order as the fields
+    :param model: the model
+    :param values: the iterable values, each value is a dictionary, or a QuerySet
+    :param channel_names: The list of channel names you are interested in
+    :return: the list of fields and the list of columns
+    """
+    fields = model.objects.get_packed_fields(channel_names)
+    if isinstance(values, QuerySet) and not model.dynamic:
+        rows = list(values.values_list(*fields))
+    else:
+        rows = pack_dicts(fields, values)
+    if not rows:
+        return fields, [()] * len(fields)
+    return fields, list(zip(*rows))
+
+
+def iterate_queryset(queryset, chunk_size=settings.XGDS_TIMESERIES_STREAM_CHUNK_SIZE):
+    """
+    Iterate over a queryset without caching the results.  On PostgreSQL this uses a server side cursor.
+    :param queryset: the QuerySet
+    :param chunk_size: the number of rows to fetch from the database at once
+    :return: an iterator
+    """
+    try:
+        return queryset.iterator(chunk_size=chunk_size)
+    except TypeError:
+        # before Django 2.0 iterator() did not take a chunk size
+        return queryset.iterator()
+
+
+def iterate_values(model, values, channel_names, packed=True):
+    """
+    Lazily iterate over the values, so the whole result is never in memory at once
+    :param model: the model
+    :param values: the iterable values, each value is a dictionary
+    :param channel_names: The list of channel names you are interested in
+    :param packed: true to iterate over lists (no keys), false to iterate over dicts
+    :return: an iterator
+    """
+    if packed:
+        fields = model.objects.get_packed_fields(channel_names)
+        if isinstance(values, QuerySet) and not model.dynamic:
+            return iterate_queryset(values.values_list(*fields))
+        return ([entry[f] for f in fields] for entry in values)
+    if isinstance(values, QuerySet):
+        return iterate_queryset(values)
+    return iter(values)
+
+
+def stream_json_list(values, chunk_size=settings.XGDS_TIMESERIES_STREAM_CHUNK_SIZE, fields=None, precisions=None,
+                     time_format='iso'):
+    """
+    Encode an iterable as a json list, chunk_size entries at a time
+    :param values: an iterable of anything DatetimeJsonEncoder can encode
+    :param chunk_size: the number of entries to encode at once
+    :param fields: the names of the entries of packed values, to look up their precisions
+    :param precisions: a dictionary of field name to decimal places, see xgds_timeseries.encoding
+    :param time_format: iso or epoch_ms
+    :return: a generator of strings
+    """
+    yield '['
+    separator = ''
+    chunk = []
+    for entry in values:
+        chunk.append(entry)
+        if len(chunk) == chunk_size:
+            # encode the whole chunk at once and drop its brackets
+            record_rows(len(chunk))
+            with phase('encode'):
+                encoded = encode_values(chunk, fields, precisions, time_format)[1:-1]
+            yield separator + encoded
+            separator = ','
+            chunk = []
+    if chunk:
+        record_rows(len(chunk))
+        with phase('encode'):
+            encoded = encode_values(chunk, fields, precisions, time_format)[1:-1]
+        yield separator + encoded
+    yield ']'
+
+
+def get_streaming_json_response(values, fields=None, precisions=None, time_format='iso'):
+    """
+    Returns a StreamingHttpResponse of a json list of the values
+    :param values: an iterable of anything DatetimeJsonEncoder can encode
+    :param fields: the names of the entries of packed values, to look up their precisions
+    :param precisions: a dictionary of field name to decimal places, see xgds_timeseries.encoding
+    :param time_format: iso or epoch_ms
+    :return: the StreamingHttpResponse, or None if there are no values
+    """
+    values = iter(values)
+    try:
+        first = next(values)
+    except StopIteration:
+        return None
+    return StreamingHttpResponse(stream_json_list(itertools.chain([first], values), fields=fields,
+                                                  precisions=precisions, time_format=time_format),
+                                 content_type='application/json')
+
+
+def get_encoding_options(model, channel_names, packed, post_values):
+    """
+    :return: the keyword arguments of get_json_response and get_streaming_json_response for values of a model
+    """
+    return {'fields': model.objects.get_packed_fields(channel_names) if packed else None,
+            'precisions': model.get_channel_precisions(),
+            'time_format': post_values.time_format}
+
+
+def get_value_columns(model, values, channel_names, dtype='float64'):
+    """
+    Returns the values as numpy columns for the binary format: pk (except for dynamic models), the time in epoch
+    milliseconds and the channels
+    :param model: the model
+    :param values: the iterable values, each value is a dictionary, or a QuerySet
+    :param channel_names: The list of channel names you are interested in
+    :param dtype: float32 or float64, the type of the channel columns, or None for float32 for the float32 channels
+                  (see TimeSeriesModel.get_channel_dtypes) and float64 for the others
+    :return: a list of (name, numpy array) tuples
+    """
+    if not channel_names:
+        channel_names = model.get_channel_names()
+    channel_dtypes = model.get_channel_dtypes()
+    if isinstance(values, ArchiveValues):
+        return values.get_columns(dtype, channel_dtypes)
+    fields, packed_columns = get_packed_columns(model, values, channel_names)
+    columns = []
+    if fields[0] == 'pk':
+        columns.append(('pk', np.array(packed_columns[0], dtype=np.int64)))
+    time_index = len(columns)
+    columns.append((fields[time_index], get_epoch_milliseconds(packed_columns[time_index])))
+    for name, column in zip(fields[time_index + 1:], packed_columns[time_index + 1:]):
+        column_dtype = dtype or ('float32' if channel_dtypes.get(name) == 'float32' else 'float64')
+        columns.append((name, get_float_array(column).astype(column_dtype)))
+    return columns
+
+
+def get_binary_response(columns):
+    """
+    :param columns: a list of (name, numpy array) tuples
+    :return: an HttpResponse with the columns in the binary columnar format, or None if there are no values
+    """
+    if not len(columns[-1][1]):
+        return None
+    record_rows(len(columns[-1][1]))
+    with phase('encode'):
+        return HttpResponse(encode_columns(columns), content_type=BINARY_CONTENT_TYPE)
+
+
+def format_values(model, values, channel_names, packed=True, stream=False, columns=False, dtype='float64'):
+    """
+    Read the values in the requested form
+    :param model: the model
+    :param values: the iterable values, each value is a dictionary, or a QuerySet
+    :param channel_names: The list of channel names you are interested in
+    :param packed: true for lists (no keys), false for dicts
+    :param stream: true to return a lazy iterator instead of a list
+    :param columns: true to return numpy columns, see get_value_columns
+    :param dtype: float32 or float64, the type of the channel columns
+    :return: a list, an iterator or a list of columns
+    """
+    if columns:
+        return get_value_columns(model, values, channel_names, dtype)
+    if stream:
+        return iterate_values(model, values, channel_names, packed)
+    if not packed:
+        return list(values)
+    return get_packed_list(model, values, channel_names)
+
+
+def decimate_model_values(model, values, channel_names, max_points, method='lttb'):
+    """
+    Reduce the values to at most max_points, keeping the shape of the numeric channels
+    :param model: The model to use
+    :param values: the iterable values, each value is a dictionary
+    :param channel_names: The list of channel names you are interested in
+    :param max_points: the maximum number of values to return
+    :param method: lttb, minmax or stride
+    :return: a list of dicts
+    """
+    time_field_name = model.get_time_field_name()
+    if hasattr(model, 'dynamic') and model.dynamic:
+        numeric_channel_names = channel_names or model.get_channel_names()
+    else:
+        numeric_channel_names = model.objects.get_statistics_field_names(channel_names)
+    return decimate_values(values, time_field_name, numeric_channel_names, max_points, method)
+
+
 def get_values_list(model, channel_names, flight_ids, start_time, end_time, filter_dict, packed=True,
-                    downsample=settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS):
+                    downsample=settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS, max_points=None, method='lttb',
+                    stream=False, columns=False, dtype='float64'):
     """
     Returns a list of dicts of the data values
     :param model: The model to use
@@ -229,6 +613,11 @@ def get_values_list(model, channel_names, flight_ids, start_time, end_time, filt
     :param filter_dict: a dictionary of any other filter
     :param packed: true to return a list of lists (no keys), false to return a list of dicts
     :param downsample: Number of seconds to downsample or skip when filtering data
+    :param max_points: optional maximum number of values to return, see decimate_model_values
+    :param method: the decimation method, lttb, minmax or stride
+    :param stream: true to return a lazy iterator instead of a list
+    :param columns: true to return a list of (name, numpy array) columns instead of a list
+    :param dtype: float32 or float64, the type of the channel columns
     :return: a list of dicts with the results.
     """
     if hasattr(model, 'dynamic') and model.dynamic:
@@ -237,14 +626,15 @@ def get_values_list(model, channel_names, flight_ids, start_time, end_time, filt
     else:
         values = model.objects.get_values(start_time, end_time, flight_ids, filter_dict, channel_names, downsample)
 
-    if not packed:
-        return list(values)
-    else:
-        return get_packed_list(model, values, channel_names)
+    if max_points:
+        values = decimate_model_values(model, values, channel_names, max_points, method)
+
+    return format_values(model, values, channel_names, packed, stream, columns, dtype)
 
 
+@instrumented
 def get_values_json(request, packed=True,
-                    downsample=settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS):
+                    downsample=settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS, stream=False):
     """
     Returns a JsonResponse of the data values described by the filters in the POST dictionary
     :param request: the request
@@ -255,8 +645,16 @@ def get_values_json(request, packed=True,
     : start_time: Isoformat start time
     : end_time: Isoformat end time
     : filter: Json string of a dictionary to further filter the data
+    : max_points: optional maximum number of values to return; replaces downsample unless it is posted too
+    : method: optional decimation method for max_points, lttb (default), minmax or stride
+    : stream: optional true or false, overrides the stream parameter
+    : format: optional, binary for the binary columnar format in xgds_timeseries.util; so does an Accept header
+    :         of application/vnd.xgds.timeseries
+    : dtype: optional float32 or float64, the type of the channel columns in the binary format; by default
+    :         float32 channels are float32 and the others float64
     :param packed: true to return a list of lists (no keys), false to return a list of dicts
     :param downsample: Number of seconds to downsample or skip when filtering data
+    :param stream: true to return a StreamingHttpResponse which encodes the values as they are read
     :return: a JsonResponse with a list of dicts with all the results
     """
     if request.method == 'POST':
@@ -264,13 +662,33 @@ def get_values_json(request, packed=True,
             post_values = unravel_post(request.POST)
             if post_values.downsample is not None:
                 downsample = int(post_values.downsample)
+            elif post_values.max_points:
+                downsample = 0
+            if post_values.stream is not None:
+                stream = post_values.stream
+            binary = is_binary_request(request, post_values)
+            cache_key = get_response_cache_key(request)
+            response = get_cached_response(cache_key)
+            if response:
+                return response
+            versions = get_change_versions(post_values.model, post_values.flight_ids)
             values = get_values_list(post_values.model, post_values.channel_names, post_values.flight_ids,
                                      post_values.start_time, post_values.end_time, post_values.filter_dict,
-                                     packed, downsample)
-            if values:
-                return JsonResponse(values, encoder=DatetimeJsonEncoder, safe=False)
-            else:
-                return JsonResponse({'status': 'error', 'message': 'No values were found.'}, status=204)
+                                     packed, downsample, post_values.max_points, post_values.method, stream,
+                                     columns=binary, dtype=post_values.dtype)
+            options = get_encoding_options(post_values.model, post_values.channel_names, packed, post_values)
+            if binary:
+                response = get_binary_response(values)
+                if response:
+                    return cache_response(cache_key, response, post_values.model, post_values.flight_ids, versions)
+            elif stream:
+                response = get_streaming_json_response(values, **options)
+                if response:
+                    return response
+            elif values:
+                return cache_response(cache_key, get_json_response(values, safe=False, **options),
+                                      post_values.model, post_values.flight_ids, versions)
+            return JsonResponse({'status': 'error', 'message': 'No values were found.'}, status=204)
         except Exception as e:
             return HttpResponseNotAllowed(e.message)
     return HttpResponseForbidden()
@@ -282,17 +700,22 @@ def check_flight_values_exist(model, flight_ids):
     :param flight_ids: list of flight ids to check
     :return: Returns true if there are values of this type for all the given flight ids
     """
-    values = model.objects.get_flight_data(flight_ids)
-    return values.exists()
+    return model.objects.has_flight_data(flight_ids)
 
 
-def get_flight_values_list(model, flight_ids, channel_names, packed=True, downsample=0):
+def get_flight_values_list(model, flight_ids, channel_names, packed=True, downsample=0, max_points=None,
+                           method='lttb', stream=False, columns=False, dtype='float64'):
     """
     Returns a list of dicts of the data values
     :param model: The model to use
     :param flight_ids: The list of channel names you are interested in
     :param packed: true to return a list of lists, false to return a list of dicts
     :param downsample: number of seconds to skip between data samples
+    :param max_points: optional maximum number of values to return, see decimate_model_values
+    :param method: the decimation method, lttb, minmax or stride
+    :param stream: true to return a lazy iterator instead of a list
+    :param columns: true to return a list of (name, numpy array) columns instead of a list
+    :param dtype: float32 or float64, the type of the channel columns
     :return: a list of dicts with the results.
     """
     if hasattr(model, 'dynamic') and model.dynamic:
@@ -305,11 +728,9 @@ def get_flight_values_list(model, flight_ids, channel_names, packed=True, downsa
         )
     else:
         values = model.objects.get_flight_values(flight_ids, channel_names, downsample)
-    if not packed:
-        return list(values)
-    else:
-        result = get_packed_list(model, values, channel_names)
-        return result
+    if max_points:
+        values = decimate_model_values(model, values, channel_names, max_points, method)
+    return format_values(model, values, channel_names, packed, stream, columns, dtype)
 
 
 def get_flight_values_time_list(model, flight_ids, channel_names, packed=True, time=None):
@@ -323,19 +744,90 @@ def get_flight_values_time_list(model, flight_ids, channel_names, packed=True, t
     """
     if not time:
         raise Exception('Time is required')
-    values = model.objects.get_values_at_time(time, flight_ids, channel_names)
-    if not values:
+    value = model.objects.get_nearest_values(time, flight_ids, channel_names=channel_names)
+    if not value:
         return None
     if not packed:
-        # print 'values time for %s:' % str(model)
-        # print str([values.first()])
-        return [values.first()]
+        return [value]
     else:
-        result = get_packed_list(model, [values.first()], channel_names)
+        result = get_packed_list(model, [value], channel_names)
         return result
 
 
-def get_flight_values_json(request, packed=True, downsample=0):
+@instrumented
+def get_flight_values_times_json(request, packed=True):
+    """
+    Returns a JsonResponse of the values closest to each of many times, at or before them, ie for playback.
+    See TimeSeriesModelManager.get_values_at_times
+    :param request: the request
+    :request.POST:
+    : model_name: The fully qualified name of the model, ie xgds_braille_app.Environmental
+    : channel_names: The list of channel names you are interested in
+    : flight_ids: The list of flight ids to filter by
+    : filter: Json string of a dictionary to further filter the data
+    : times: The list of isoformat times
+    :param packed: true to return lists of values, false to return dicts
+    :return: a JsonResponse with a list of the values, or null, for each time in the order posted
+    """
+    if request.method == 'POST':
+        try:
+            post_values = unravel_post(request.POST)
+            if not post_values.times:
+                raise Exception('Times are required')
+            model = post_values.model
+            values = model.objects.get_values_at_times(post_values.times, post_values.flight_ids,
+                                                       post_values.filter_dict, post_values.channel_names)
+            if packed:
+                fields = model.objects.get_packed_fields(post_values.channel_names)
+                values = [[value[f] for f in fields] if value else None for value in values]
+            return get_json_response(values, safe=False)
+        except Exception as e:
+            return HttpResponseNotAllowed(["POST"], content=traceback.format_exc())
+    return HttpResponseForbidden()
+
+
+def get_models_values_time(models, flight_ids, time, packed=True):
+    """
+    Returns the values closest to a time, at or before it, for many models at once
+    :param models: the list of models
+    :param flight_ids: the list of flight ids
+    :param time: the time for which we are looking for the data
+    :param packed: true for lists of values, false for dicts
+    :return: a dictionary of the values by model name; None for models without a value
+    """
+    result = {}
+    for model in models:
+        values = get_flight_values_time_list(model, flight_ids, None, packed=packed, time=time)
+        result[model.get_model_name()] = values[0] if values else None
+    return result
+
+
+@instrumented
+def get_models_values_time_json(request, packed=True):
+    """
+    Returns a JsonResponse of the values closest to a time for many models, ie for scrubbing the timeline
+    :param request: the request
+    :request.POST:
+    : model_names: The list of fully qualified names of the models, ie xgds_braille_app.Environmental
+    : flight_ids: The list of flight ids to filter by
+    : time: Isoformat time
+    :param packed: true to return lists of values, false to return dicts
+    :return: a JsonResponse of a dictionary of the values by model name
+    """
+    if request.method == 'POST':
+        try:
+            post_values = unravel_post(request.POST)
+            model_names = request.POST.getlist('model_names', None) or request.POST.getlist('model_names[]', None)
+            models = [getModelByName(model_name) for model_name in model_names]
+            result = get_models_values_time(models, post_values.flight_ids, post_values.time, packed)
+            return get_json_response(result)
+        except Exception as e:
+            return HttpResponseNotAllowed(["POST"], content=traceback.format_exc())
+    return HttpResponseForbidden()
+
+
+@instrumented
+def get_flight_values_json(request, packed=True, downsample=0, stream=False):
     """
     Returns a JsonResponse of the data values described by the filters in the POST dictionary
     :param request: the request
@@ -344,8 +836,16 @@ def get_flight_values_json(request, packed=True, downsample=0):
     : channel_names: The list of channel names you are interested in
     : flight_ids: The list of flight ids to filter by
     : downsample: number of seconds to downsample by, takes priority
+    : max_points: optional maximum number of values to return; replaces downsample unless it is posted too
+    : method: optional decimation method for max_points, lttb (default), minmax or stride
+    : stream: optional true or false, overrides the stream parameter
+    : format: optional, binary for the binary columnar format in xgds_timeseries.util; so does an Accept header
+    :         of application/vnd.xgds.timeseries
+    : dtype: optional float32 or float64, the type of the channel columns in the binary format; by default
+    :         float32 channels are float32 and the others float64
     :param packed: true to return a list of lists, false to return a list of dicts
     :param downsample: number of seconds to skip when getting data samples
+    :param stream: true to return a StreamingHttpResponse which encodes the values as they are read
     :return: a JsonResponse with a list of dicts with all the results
     """
     if request.method == 'POST':
@@ -353,17 +853,39 @@ def get_flight_values_json(request, packed=True, downsample=0):
             post_values = unravel_post(request.POST)
             if post_values.downsample is not None:
                 downsample = int(post_values.downsample)
+            elif post_values.max_points:
+                downsample = 0
+            if post_values.stream is not None:
+                stream = post_values.stream
+            binary = is_binary_request(request, post_values)
+            cache_key = get_response_cache_key(request)
+            response = get_cached_response(cache_key)
+            if response:
+                return response
+            versions = get_change_versions(post_values.model, post_values.flight_ids)
             values = get_flight_values_list(post_values.model, post_values.flight_ids, post_values.channel_names,
-                                            packed=packed, downsample=downsample)
-            if values:
-                return JsonResponse(values, encoder=DatetimeJsonEncoder, safe=False)
-            else:
-                return JsonResponse({'status': 'error', 'message': 'No values were found.'}, status=204)
+                                            packed=packed, downsample=downsample,
+                                            max_points=post_values.max_points, method=post_values.method,
+                                            stream=stream, columns=binary, dtype=post_values.dtype)
+            options = get_encoding_options(post_values.model, post_values.channel_names, packed, post_values)
+            if binary:
+                response = get_binary_response(values)
+                if response:
+                    return cache_response(cache_key, response, post_values.model, post_values.flight_ids, versions)
+            elif stream:
+                response = get_streaming_json_response(values, **options)
+                if response:
+                    return response
+            elif values:
+                return cache_response(cache_key, get_json_response(values, safe=False, **options),
+                                      post_values.model, post_values.flight_ids, versions)
+            return JsonResponse({'status': 'error', 'message': 'No values were found.'}, status=204)
         except Exception as e:
             return HttpResponseNotAllowed(["POST"], content=traceback.format_exc())
     return HttpResponseForbidden()
 
 
+@instrumented
 def get_flight_values_time_json(request, packed=True, downsample=0):
     """
     Returns a JsonResponse of the data values described by the filters in the POST dictionary
@@ -383,9 +905,10 @@ def get_flight_values_time_json(request, packed=True, downsample=0):
             if post_values.downsample is not None:
                 downsample = int(post_values.downsample)
             values = get_flight_values_time_list(post_values.model, post_values.flight_ids, post_values.channel_names,
-                                                 packed=packed, time=post_values.time, downsample=downsample)
+                                                 packed=packed, time=post_values.time)
             if values:
-                return JsonResponse(values, encoder=DatetimeJsonEncoder, safe=False)
+                return get_json_response(values, safe=False, **get_encoding_options(
+                    post_values.model, post_values.channel_names, packed, post_values))
             else:
                 return JsonResponse({'status': 'error', 'message': 'No values were found.'}, status=204)
         except Exception as e:
@@ -393,6 +916,293 @@ def get_flight_values_time_json(request, packed=True, downsample=0):
     return HttpResponseForbidden()
 
 
+@instrumented
+def get_values_since_json(request, packed=True):
+    """
+    Returns a JsonResponse of the data values saved after a cursor, for polling during a live flight.
+    Post the cursor of each response back as since_time and since_pk to get the next values.
+    :param request: the request
+    :request.POST:
+    : model_name: The fully qualified name of the model, ie xgds_braille_app.Environmental
+    : channel_names: The list of channel names you are interested in
+    : flight_ids: The list of flight ids to filter by
+    : filter: Json string of a dictionary to further filter the data
+    : since_time: Isoformat time of the cursor; omit it to start at the beginning
+    : since_pk: pk of the cursor; omit it to get every value after since_time
+    :param packed: true to return a list of lists (no keys), false to return a list of dicts
+    :return: a JsonResponse of {'values': the values, 'cursor': {'time': time, 'pk': pk},
+             'more': true if there are more values after the cursor}
+    """
+    if request.method == 'POST':
+        try:
+            post_values = unravel_post(request.POST)
+            model = post_values.model
+            limit = settings.XGDS_TIMESERIES_SINCE_LIMIT
+            values, cursor = model.objects.get_values_since(post_values.since_time, post_values.since_pk,
+                                                            post_values.flight_ids, post_values.filter_dict,
+                                                            post_values.channel_names, limit)
+            if not values:
+                return JsonResponse({'status': 'error', 'message': 'No values were found.'}, status=204)
+            more = len(values) == limit
+            if packed:
+                values = get_packed_list(model, values, post_values.channel_names)
+            return get_json_response({'values': values,
+                                      'cursor': {'time': cursor[0], 'pk': cursor[1]},
+                                      'more': more})
+        except Exception as e:
+            return HttpResponseNotAllowed(["POST"], content=traceback.format_exc())
+    return HttpResponseForbidden()
+
+
+COMBINED_PARTS = ('channel_descriptions', 'min_max', 'values')
+COMBINED_POOL = []
+
+
+def get_combined_pool():
+    """
+    :return: the thread pool shared by all combined requests, so the database sees a bounded number of connections
+    """
+    if not COMBINED_POOL:
+        COMBINED_POOL.append(ThreadPool(settings.XGDS_TIMESERIES_COMBINED_THREADS))
+    return COMBINED_POOL[0]
+
+
+def get_combined_model_result(model, channel_names, post_values, parts, packed, downsample, binary):
+    """
+    Look up the parts for one model of a combined request
+    :return: a dictionary of the parts; with binary, values are (name, numpy array) columns
+    """
+    result = {}
+    if 'channel_descriptions' in parts:
+        descriptions = {}
+        for key, value in get_channel_descriptions(model).items():
+            if channel_names and key not in channel_names:
+                continue
+            descriptions[key] = value if isinstance(value, dict) else value.__dict__
+        result['channel_descriptions'] = descriptions
+    if 'min_max' in parts:
+        result['min_max'] = get_min_max(model, post_values.start_time, post_values.end_time, post_values.flight_ids,
+                                        post_values.filter_dict, channel_names)
+    if 'values' in parts:
+        result['values'] = get_values_list(model, channel_names, post_values.flight_ids, post_values.start_time,
+                                           post_values.end_time, post_values.filter_dict, packed, downsample,
+                                           post_values.max_points, post_values.method, columns=binary,
+                                           dtype=post_values.dtype)
+    return result
+
+
+def get_combined_model_entry(arguments):
+    """
+    Run get_combined_model_result, so a failing model does not stop the others once the response has started
+    :return: (model name, result dictionary), with the result {'error': traceback} if the lookup failed
+    """
+    model_name = arguments[0].get_model_name()
+    try:
+        return model_name, get_combined_model_result(*arguments)
+    except Exception:
+        return model_name, {'error': traceback.format_exc()}
+
+
+def get_combined_model_entry_in_thread(arguments):
+    """
+    Run get_combined_model_entry in a pool thread, and close the thread's database connections afterwards
+    :return: (model name, result dictionary)
+    """
+    try:
+        return get_combined_model_entry(arguments)
+    finally:
+        connections.close_all()
+
+
+def iterate_combined_results(specs, post_values, parts, packed, downsample, binary):
+    """
+    :return: an iterator of (model name, result dictionary) in the order of the specs, as each one is ready; the
+             result of a model which failed is {'error': traceback}
+    """
+    arguments = [(model, channel_names, post_values, parts, packed, downsample, binary)
+                 for model, channel_names in specs]
+    if settings.XGDS_TIMESERIES_COMBINED_THREADS <= 1 or len(arguments) <= 1:
+        return (get_combined_model_entry(a) for a in arguments)
+    return get_combined_pool().imap(get_combined_model_entry_in_thread, arguments)
+
+
+def stream_combined_json(results):
+    """
+    Encode the combined results as one json dictionary by model name, a model at a time
+    """
+    yield '{'
+    for index, (model_name, result) in enumerate(results):
+        if index:
+            yield ','
+        try:
+            encoded = json.dumps(result, cls=DatetimeJsonEncoder)
+        except Exception:
+            encoded = json.dumps({'error': traceback.format_exc()})
+        yield '%s:%s' % (json.dumps(model_name), encoded)
+    yield '}'
+
+
+def stream_combined_frames(results):
+    """
+    Encode the combined results as binary frames, see util.encode_frame.  Each header has the model name and the
+    other parts, and the data holds the values in the binary columnar format.
+    """
+    for model_name, result in results:
+        try:
+            columns = result.pop('values', None)
+            result['model_name'] = model_name
+            data = encode_columns(columns) if columns else b''
+            header = json.loads(json.dumps(result, cls=DatetimeJsonEncoder))
+        except Exception:
+            header = {'model_name': model_name, 'error': traceback.format_exc()}
+            data = b''
+        yield encode_frame(header, data)
+
+
+@instrumented
+def get_combined_json(request, packed=True, downsample=settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS):
+    """
+    Returns a StreamingHttpResponse with the channel descriptions, min/max and values of many models at once,
+    looked up concurrently on a bounded thread pool, so a dashboard opens with one request.
+    :param request: the request
+    :request.POST:
+    : models: Json string of a list of {"model_name": name, "channel_names": [names]}; channel_names is optional
+    : parts: optional list of channel_descriptions, min_max and values; defaults to all of them
+    : flight_ids, start_time, end_time, filter, downsample, max_points, method: shared by all the models,
+    :   as for get_values_json
+    : format: optional, binary for binary frames (see util.encode_frame); so does an Accept header
+    :         of application/vnd.xgds.timeseries
+    : dtype: optional float32 or float64, the type of the channel columns in the binary format; by default
+    :         float32 channels are float32 and the others float64
+    :param packed: true to return values as lists of lists (no keys), false as lists of dicts
+    :param downsample: Number of seconds to downsample or skip when filtering data
+    :return: a json dictionary of the parts by model name, or binary frames; a model which failed has an error
+             (its traceback) instead of its parts
+    """
+    if request.method == 'POST':
+        try:
+            post_values = unravel_post(request.POST)
+            if post_values.downsample is not None:
+                downsample = int(post_values.downsample)
+            elif post_values.max_points:
+                downsample = 0
+            parts = request.POST.getlist('parts', None) or request.POST.getlist('parts[]', None) or COMBINED_PARTS
+            specs = []
+            for spec in json.loads(request.POST.get('models', '[]')):
+                specs.append((getModelByName(spec['model_name']), spec.get('channel_names', None)))
+            binary = is_binary_request(request, post_values)
+            results = iterate_combined_results(specs, post_values, parts, packed, downsample, binary)
+            if binary:
+                return StreamingHttpResponse(stream_combined_frames(results), content_type=BINARY_CONTENT_TYPE)
+            return StreamingHttpResponse(stream_combined_json(results), content_type='application/json')
+        except Exception as e:
+            return HttpResponseNotAllowed(["POST"], content=traceback.format_exc())
+    return HttpResponseForbidden()
+
+
+def get_default_resample_interval(specs):
+    """
+    :param specs: a list of (model, channel names)
+    :return: the longest ChannelDescription interval of the channels, so no channel is interpolated more finely than
+             it is sampled
+    """
+    intervals = []
+    for model, channel_names in specs:
+        descriptions = model.get_channel_descriptions() or {}
+        for name in channel_names or model.get_channel_names():
+            description = descriptions.get(name)
+            if description is not None and getattr(description, 'interval', None):
+                intervals.append(float(description.interval))
+    if intervals:
+        return max(intervals)
+    return float(settings.XGDS_TIMESERIES_DOWNSAMPLE_DATA_SECONDS)
+
+
+def get_aligned_values(specs, start_time, end_time, interval, flight_ids=None, filter_dict=None, method='mean'):
+    """
+    Resample channels of several models onto one grid, see TimeSeriesModelManager.get_resampled_values
+    :param specs: a list of (model, channel names)
+    :param start_time: The first grid time, timezone aware; defaults to the start of the flights
+    :param end_time: The end time, timezone aware; defaults to the end of the flights
+    :param interval: the grid spacing in seconds
+    :param flight_ids: the list of flight ids
+    :param filter_dict: A dictionary of other filter terms
+    :param method: mean, last or linear
+    :return: the numpy int64 array of grid times in microseconds, and a list of (model name:channel name, numpy
+             float64 array), or None if there is no time range
+    """
+    if (start_time is None or end_time is None) and flight_ids:
+        extents = [model.objects.get_flight_extent(flight_ids) for model, channel_names in specs]
+        starts = [e['start_time'] for e in extents if e['start_time'] is not None]
+        ends = [e['end_time'] for e in extents if e['end_time'] is not None]
+        if start_time is None and starts:
+            start_time = min(starts)
+        if end_time is None and ends:
+            end_time = max(ends)
+    if start_time is None or end_time is None:
+        return None
+    grid = None
+    columns = []
+    for model, channel_names in specs:
+        grid, values = model.objects.get_resampled_values(start_time, end_time, interval, flight_ids, filter_dict,
+                                                          channel_names, method)
+        for name, column in values.items():
+            columns.append(('%s:%s' % (model.get_model_name(), name), column))
+    return grid, columns
+
+
+@instrumented
+def get_aligned_json(request, packed=True):
+    """
+    Returns one table of the channels of several models resampled onto the same regular time grid, so they can be
+    overlaid and compared without aligning them in the browser.
+    :param request: the request
+    :request.POST:
+    : models: Json string of a list of {"model_name": name, "channel_names": [names]}; channel_names is optional
+    : flight_ids, start_time, end_time, filter: shared by all the models; without start or end times the extent of
+    :   the flights is used
+    : interval: optional grid spacing in seconds; defaults to the longest interval of the channel descriptions
+    : method: optional mean (default), last or linear
+    : format: optional, binary for the binary columnar format; so does an Accept header of
+    :         application/vnd.xgds.timeseries
+    : dtype: optional float32 or float64 (default), the type of the channel columns in the binary format
+    :param packed: true to return the rows as lists, false as dicts
+    :return: a json dictionary of fields (time, then model name:channel name) and values, one row per grid time
+    """
+    if request.method == 'POST':
+        try:
+            post_values = unravel_post(request.POST)
+            specs = []
+            for spec in json.loads(request.POST.get('models', '[]')):
+                specs.append((getModelByName(spec['model_name']), spec.get('channel_names', None)))
+            interval = request.POST.get('interval', None)
+            interval = float(interval) if interval else get_default_resample_interval(specs)
+            aligned = get_aligned_values(specs, post_values.start_time, post_values.end_time, interval,
+                                         post_values.flight_ids, post_values.filter_dict,
+                                         request.POST.get('method', 'mean'))
+            if aligned is None:
+                return JsonResponse({'status': 'error', 'message': 'No time range was found.'}, status=204)
+            grid, columns = aligned
+
+            if is_binary_request(request, post_values):
+                binary_columns = [('time', grid // 1000)]
+                binary_columns.extend([(name, column.astype(post_values.dtype or 'float64'))
+                                       for name, column in columns])
+                return get_binary_response(binary_columns)
+
+            fields = ['time'] + [name for name, column in columns]
+            rows = zip(get_datetimes(grid), *[to_python(column) for name, column in columns])
+            if packed:
+                values = [list(row) for row in rows]
+            else:
+                values = [dict(zip(fields, row)) for row in rows]
+            record_rows(len(values))
+            return get_json_response({'fields': fields, 'values': values, 'interval': interval})
+        except Exception as e:
+            return HttpResponseNotAllowed(["POST"], content=traceback.format_exc())
+    return HttpResponseForbidden()
+
+
 def get_channel_descriptions(model, channel_name=None):
     """
     Returns a dictionary of channel descriptions for the given model
@@ -424,10 +1234,11 @@ def get_channel_descriptions_json(request):
                     channel_name = request.POST.get('channel_name', None)
                     result = get_channel_descriptions(model, channel_name)
                     if result:
-                        for key, value in result.iteritems():
-                            if not isinstance(value, dict):
-                                result[key] = value.__dict__
-                        return JsonResponse(result)
+                        # serialize a copy; the descriptions are the model's own, which hold its precisions and dtypes
+                        descriptions = {}
+                        for key, value in result.items():
+                            descriptions[key] = value if isinstance(value, dict) else value.__dict__
+                        return JsonResponse(descriptions)
                 return JsonResponse({'error': 'bad parameters'}, status=204)
         except Exception as e:
             return HttpResponseNotAllowed(["POST"], content=traceback.format_exc())